@@ -25,9 +25,15 @@ module FunctionalProfileUtil {
       optional arguments:
       staging_file - profile_file_path provided in ProfileTable is a staging file path. default: False
       build_report - build report for narrative. default: False
+      background_report - with build_report, return as soon as the FunctionalProfile is saved and
+                          build the report in a background worker. only used by services with
+                          background-reports enabled, otherwise the report is built before
+                          returning. default: False
       data_epistemology - how was data acquired. one of: measured, asserted, predicted
       epistemology_method - method/program to be used to acquired data. e.g. FAPROTAX, PICRUSt2
       description - description for the profile
+      value_precision - round profile values to this many significant digits (1 to 15).
+                        default: values are kept as parsed
     */
     typedef structure {
       int workspace_id;
@@ -39,17 +45,44 @@ module FunctionalProfileUtil {
 
       bool staging_file;
       bool build_report;
+      bool background_report;
       string data_epistemology;
       string epistemology_method;
       string description;
+      int value_precision;
     } ImportFuncProfileParams;
 
+    /*
+      report_job_id - id of the background report job, see get_report_status
+      report_error - why the report was skipped, the FunctionalProfile is saved regardless
+    */
     typedef structure {
       WSRef func_profile_ref;
       string report_name;
       WSRef report_ref;
+      string report_job_id;
+      string report_error;
     } ImportFuncProfileResults;
 
     funcdef import_func_profile(ImportFuncProfileParams params) returns (ImportFuncProfileResults returnVal) authentication required;
 
+    typedef structure {
+      string report_job_id;
+    } GetReportStatusParams;
+
+    /*
+      state - one of queued, running, done, error
+      report_name, report_ref - the report, once state is done
+      error - error message, if state is error
+    */
+    typedef structure {
+      string report_job_id;
+      string state;
+      string report_name;
+      WSRef report_ref;
+      string error;
+    } ReportStatus;
+
+    funcdef get_report_status(GetReportStatusParams params) returns (ReportStatus returnVal) authentication required;
+
 };
@@ -14,15 +14,29 @@ module KBaseProfile {
     */
     typedef string WSRef;
 
+    /* Ref to a handle of a file in the blobstore
+      @id handle
+    */
+    typedef string HandleRef;
+
     /*
       A simple 2D matrix of values with labels/ids for rows and
       columns.  The matrix is stored as a list of lists, with the outer list
       containing rows, and the inner lists containing values for each column of
       that row.  Row/Col ids should be unique.
 
+      Matrices too large for a workspace object (over 1GB of JSON) keep their values in a
+      binary file in the blobstore, values is then an empty list and values_handle_ref points
+      to the file. The type has to be registered with these fields before such objects are
+      saved.
+
       row_ids - unique ids for rows.
       col_ids - unique ids for columns.
       values - two dimensional array indexed as: values[row][col]
+      values_handle_ref - handle to the file holding the values matrix when values is empty
+      values_format - format of the values_handle_ref file. e.g. npy.gz (gzip compressed NPY)
+
+      @optional values_handle_ref values_format
 
       @metadata ws length(row_ids) as n_rows
       @metadata ws length(col_ids) as n_cols
@@ -31,6 +45,8 @@ module KBaseProfile {
       list<string> row_ids;
       list<string> col_ids;
       list<list<float>> values;
+      HandleRef values_handle_ref;
+      string values_format;
     } FloatMatrix2D;
 
     /*
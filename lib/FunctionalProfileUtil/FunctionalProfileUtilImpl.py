@@ -3,7 +3,8 @@
 import logging
 import os
 
-from FunctionalProfileUtil.Utils.ProfileImporter import ProfileImporter
+from FunctionalProfileUtil.Utils.LazyLoader import lazy_property, preload
+from FunctionalProfileUtil.Utils.RequestProfiler import RequestProfiler
 #END_HEADER
 
 
@@ -27,6 +28,19 @@ class FunctionalProfileUtil:
     GIT_COMMIT_HASH = "2ddd55d742f5e462e8f4e1f7908e661786437d73"
 
     #BEGIN_CLASS_HEADER
+    @lazy_property
+    def profile_importer(self):
+        # importing ProfileImporter loads pandas, numpy and scipy, so it waits for the first call
+        from FunctionalProfileUtil.Utils.ProfileImporter import ProfileImporter
+        return ProfileImporter(self.config)
+
+    def warm_up(self):
+        """
+        warm_up: load the importer and its service clients ahead of the first call, e.g. in a
+                 uwsgi worker right after fork
+        """
+        preload(self)
+        self.profile_importer.warm_up()
     #END_CLASS_HEADER
 
     # config contains contents of config file in a hash or None if it couldn't
@@ -37,8 +51,10 @@ class FunctionalProfileUtil:
         self.config['SDK_CALLBACK_URL'] = os.environ['SDK_CALLBACK_URL']
         self.config['KB_AUTH_TOKEN'] = os.environ['KB_AUTH_TOKEN']
         self.scratch = config['scratch']
+        self.request_profiler = RequestProfiler(os.path.join(self.scratch, 'profiles'),
+                                                allowed_users=config.get('profile-users'),
+                                                mode=config.get('profiler'))
 
-        self.profile_importer = ProfileImporter(self.config)
         logging.basicConfig(format='%(created)s %(levelname)s: %(message)s',
                             level=logging.INFO)
         #END_CONSTRUCTOR
@@ -56,28 +72,43 @@ class FunctionalProfileUtil:
            organism optional arguments: staging_file - profile_file_path
            provided in ProfileTable is a staging file path. default: False
            build_report - build report for narrative. default: False
+           background_report - with build_report, return as soon as the
+           FunctionalProfile is saved and build the report in a background
+           worker. only used by services with background-reports enabled,
+           otherwise the report is built before returning. default: False
            data_epistemology - how was data acquired. one of: measured,
            asserted, predicted epistemology_method - method/program to be
            used to acquired data. e.g. FAPROTAX, PICRUSt2 description -
-           description for the profile) -> structure: parameter
-           "workspace_id" of Long, parameter "func_profile_obj_name" of
-           String, parameter "base_object_ref" of type "WSRef" (Ref to a WS
-           object @id ws), parameter "profile_file_path" of String, parameter
-           "profile_type" of String, parameter "profile_category" of String,
-           parameter "staging_file" of type "bool" (A boolean - 0 for false,
-           1 for true. @range (0, 1)), parameter "build_report" of type
-           "bool" (A boolean - 0 for false, 1 for true. @range (0, 1)),
-           parameter "data_epistemology" of String, parameter
-           "epistemology_method" of String, parameter "description" of String
-        :returns: instance of type "ImportFuncProfileResults" -> structure:
-           parameter "func_profile_ref" of type "WSRef" (Ref to a WS object
-           @id ws), parameter "report_name" of String, parameter "report_ref"
-           of type "WSRef" (Ref to a WS object @id ws)
+           description for the profile value_precision - round profile
+           values to this many significant digits (1 to 15). default: values
+           are kept as parsed) ->
+           structure: parameter "workspace_id" of
+           Long, parameter "func_profile_obj_name" of String, parameter
+           "base_object_ref" of type "WSRef" (Ref to a WS object @id ws),
+           parameter "profile_file_path" of String, parameter "profile_type"
+           of String, parameter "profile_category" of String, parameter
+           "staging_file" of type "bool" (A boolean - 0 for false, 1 for
+           true. @range (0, 1)), parameter "build_report" of type "bool" (A
+           boolean - 0 for false, 1 for true. @range (0, 1)), parameter
+           "background_report" of type "bool" (A boolean - 0 for false, 1
+           for true. @range (0, 1)), parameter "data_epistemology" of
+           String, parameter "epistemology_method" of String, parameter
+           "description" of String, parameter "value_precision" of Long
+        :returns: instance of type "ImportFuncProfileResults" (report_job_id
+           - id of the background report job, see get_report_status
+           report_error - why the report was skipped, the FunctionalProfile
+           is saved regardless) -> structure: parameter "func_profile_ref" of
+           type "WSRef" (Ref to a WS object @id ws), parameter "report_name"
+           of String, parameter "report_ref" of type "WSRef" (Ref to a WS
+           object @id ws), parameter "report_job_id" of String, parameter
+           "report_error" of String
         """
         # ctx is the context object
         # return variables are: returnVal
         #BEGIN import_func_profile
-        returnVal = self.profile_importer.import_func_profile(params)
+        returnVal = self.request_profiler.run(ctx, 'import_func_profile',
+                                              self.profile_importer.import_func_profile,
+                                              params, user_id=ctx.get('user_id'))
         #END import_func_profile
 
         # At some point might do deeper type checking...
@@ -86,6 +117,31 @@ class FunctionalProfileUtil:
                              'returnVal is not type dict as required.')
         # return the results
         return [returnVal]
+
+    def get_report_status(self, ctx, params):
+        """
+        :param params: instance of type "GetReportStatusParams" -> structure:
+           parameter "report_job_id" of String
+        :returns: instance of type "ReportStatus" (state - one of queued,
+           running, done, error report_name, report_ref - the report, once
+           state is done error - error message, if state is error) ->
+           structure: parameter "report_job_id" of String, parameter "state"
+           of String, parameter "report_name" of String, parameter
+           "report_ref" of type "WSRef" (Ref to a WS object @id ws),
+           parameter "error" of String
+        """
+        # ctx is the context object
+        # return variables are: returnVal
+        #BEGIN get_report_status
+        returnVal = self.profile_importer.get_report_status(params)
+        #END get_report_status
+
+        # At some point might do deeper type checking...
+        if not isinstance(returnVal, dict):
+            raise ValueError('Method get_report_status return value ' +
+                             'returnVal is not type dict as required.')
+        # return the results
+        return [returnVal]
     def status(self, ctx):
         #BEGIN_STATUS
         returnVal = {'state': "OK",
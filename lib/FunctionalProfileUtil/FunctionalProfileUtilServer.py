@@ -5,11 +5,11 @@ import json
 import os
 import random as _random
 import sys
+import threading
 import traceback
 from getopt import getopt, GetoptError
 from multiprocessing import Process
 from os import environ
-from wsgiref.simple_server import make_server
 
 import requests as _requests
 from jsonrpcbase import JSONRPCService, InvalidParamsError, KeywordError, \
@@ -17,7 +17,17 @@ from jsonrpcbase import JSONRPCService, InvalidParamsError, KeywordError, \
 from jsonrpcbase import ServerError as JSONServerError
 
 from biokbase import log
-from FunctionalProfileUtil.authclient import KBaseAuth as _KBaseAuth
+from FunctionalProfileUtil.Utils.AsyncLogWriter import AsyncLogWriter
+from FunctionalProfileUtil.Utils.BatchRunner import BatchRunner
+from FunctionalProfileUtil.Utils.MemoryBudget import MemoryBudget
+from FunctionalProfileUtil.Utils.ResponseEncoder import (RequestTooLarge, ResponseEncoder,
+                                                         iterencode_json, read_request_body)
+from FunctionalProfileUtil.Utils.ServiceMetrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE,
+                                                        REGISTRY as METRICS,
+                                                        track_request)
+from FunctionalProfileUtil.Utils.ThreadPoolServer import (ThreadPoolServer,
+                                                          serve_until_signal)
+from FunctionalProfileUtil.Utils.AuthClient import KBaseAuth as _KBaseAuth
 
 try:
     from ConfigParser import ConfigParser
@@ -83,6 +93,19 @@ class JSONRPCServiceCustom(JSONRPCService):
 
         return None
 
+    def call_chunks(self, ctx, jsondata):
+        """
+        Calls jsonrpc service's method and returns its return value as an
+        iterator of JSON string chunks or None if there is none. The values
+        of the result are encoded one at a time with json.dumps while the
+        response is sent.
+        """
+        result = self.call_py(ctx, jsondata)
+        if result is not None:
+            return iterencode_json(result, cls=JSONObjectEncoder)
+
+        return None
+
     def _call_method(self, ctx, request):
         """Calls given method with given params and returns it value."""
         method = self.method_data[request['method']]['method']
@@ -197,6 +220,15 @@ class JSONRPCServiceCustom(JSONRPCService):
         return respond
 
 
+# the user and server logs are shared by all request threads
+_log_lock = threading.RLock()
+# request threads enqueue log records, a background thread writes them
+_log_writer = AsyncLogWriter(
+    lock=_log_lock,
+    enabled=(config or {}).get('async-logging', 'true') == 'true',
+    max_queue=(config or {}).get('log-queue-size'))
+
+
 class MethodContext(dict):
 
     def __init__(self, logger):
@@ -229,18 +261,25 @@ class MethodContext(dict):
         self._log(level, message)
 
     def set_log_level(self, level):
-        self._logger.set_log_level(level)
+        # records logged before the change are written at the old level
+        _log_writer.flush()
+        with _log_lock:
+            self._logger.set_log_level(level)
 
     def get_log_level(self):
-        return self._logger.get_log_level()
+        with _log_lock:
+            return self._logger.get_log_level()
 
     def clear_log_level(self):
-        self._logger.clear_user_log_level()
+        # records logged before the change are written at the old level
+        _log_writer.flush()
+        with _log_lock:
+            self._logger.clear_user_log_level()
 
     def _log(self, level, message):
-        self._logger.log_message(level, message, self['client_ip'],
-                                 self['user_id'], self['module'],
-                                 self['method'], self['call_id'])
+        _log_writer.submit(level, self._logger.log_message, level, message,
+                           self['client_ip'], self['user_id'], self['module'],
+                           self['method'], self['call_id'])
 
     def provenance(self):
         callbackURL = os.environ.get('SDK_CALLBACK_URL')
@@ -322,9 +361,10 @@ class Application(object):
         self.serverlog.set_log_file(self.userlog.get_log_file())
 
     def log(self, level, context, message):
-        self.serverlog.log_message(level, message, context['client_ip'],
-                                   context['user_id'], context['module'],
-                                   context['method'], context['call_id'])
+        _log_writer.submit(level, self.serverlog.log_message, level, message,
+                           context['client_ip'], context['user_id'],
+                           context['module'], context['method'],
+                           context['call_id'])
 
     def __init__(self):
         submod = get_service_name() or 'FunctionalProfileUtil'
@@ -342,11 +382,18 @@ class Application(object):
                              name='FunctionalProfileUtil.import_func_profile',
                              types=[dict])
         self.method_authentication['FunctionalProfileUtil.import_func_profile'] = 'required'  # noqa
+        self.rpc_service.add(impl_FunctionalProfileUtil.get_report_status,
+                             name='FunctionalProfileUtil.get_report_status',
+                             types=[dict])
+        self.method_authentication['FunctionalProfileUtil.get_report_status'] = 'required'  # noqa
         self.rpc_service.add(impl_FunctionalProfileUtil.status,
                              name='FunctionalProfileUtil.status',
                              types=[dict])
         authurl = config.get(AUTH) if config else None
         self.auth_client = _KBaseAuth(authurl)
+        self.max_request_size = MemoryBudget.parse_size(
+            (config or {}).get('max-request-size') or '64M')
+        self.response_encoder = ResponseEncoder()
 
     def __call__(self, environ, start_response):
         # Context object, equivalent to the perl impl CallContext
@@ -354,18 +401,30 @@ class Application(object):
         ctx['client_ip'] = getIPAddress(environ)
         status = '500 Internal Server Error'
 
-        try:
-            body_size = int(environ.get('CONTENT_LENGTH', 0))
-        except (ValueError):
-            body_size = 0
+        if (environ['REQUEST_METHOD'] == 'GET' and
+                environ.get('PATH_INFO') == '/metrics'):
+            metrics = METRICS.render().encode('utf8')
+            start_response('200 OK', [('content-type', METRICS_CONTENT_TYPE),
+                                      ('content-length', str(len(metrics)))])
+            return [metrics]
+
         if environ['REQUEST_METHOD'] == 'OPTIONS':
             # we basically do nothing and just return headers
             status = '200 OK'
             rpc_result = ""
         else:
-            request_body = environ['wsgi.input'].read(body_size)
             try:
+                request_body = read_request_body(environ,
+                                                 self.max_request_size)
                 req = json.loads(request_body)
+            except RequestTooLarge as rtl:
+                status = '413 Request Entity Too Large'
+                err = {'error': {'code': -32600,
+                                 'name': "Request too large",
+                                 'message': str(rtl),
+                                 }
+                       }
+                rpc_result = self.process_error(err, ctx, {'version': '1.1'})
             except ValueError as ve:
                 err = {'error': {'code': -32700,
                                  'name': "Parse error",
@@ -381,6 +440,10 @@ class Application(object):
                                     'method': req['method']}
                                    ]
                 }
+                # callers ask for a profile of the request with the context
+                # {"profile": 1}, see RequestProfiler
+                if (req.get('context') or {}).get('profile'):
+                    ctx['rpc_context']['profile'] = 1
                 prov_action = {'service': ctx['module'],
                                'method': ctx['method'],
                                'method_params': req['params']
@@ -419,7 +482,8 @@ class Application(object):
                         self.log(log.INFO, ctx, 'X-Forwarded-For: ' +
                                  environ.get('HTTP_X_FORWARDED_FOR'))
                     self.log(log.INFO, ctx, 'start method')
-                    rpc_result = self.rpc_service.call(ctx, req)
+                    with track_request(self.metrics_method(method_name)):
+                        rpc_result = self.rpc_service.call_chunks(ctx, req)
                     self.log(log.INFO, ctx, 'end method')
                     status = '200 OK'
                 except JSONRPCError as jre:
@@ -450,15 +514,41 @@ class Application(object):
             response_body = rpc_result
         else:
             response_body = ''
+        if isinstance(response_body, str):
+            response_body = [response_body]
+
+        accept_encoding = environ.get('HTTP_ACCEPT_ENCODING')
+        try:
+            # results up to the encoder's buffer size are encoded here, larger
+            # ones stream and can only fail while they are sent
+            encoding_headers, response_chunks = self.response_encoder.encode(
+                response_body, accept_encoding)
+        except Exception:
+            status = '500 Internal Server Error'
+            err = {'error': {'code': 0,
+                             'name': 'Unexpected Server Error',
+                             'message': 'An unexpected server error ' +
+                                        'occurred',
+                             }
+                   }
+            encoding_headers, response_chunks = self.response_encoder.encode(
+                [self.process_error(err, ctx, {'version': '1.1'},
+                                    traceback.format_exc())],
+                accept_encoding)
 
         response_headers = [
             ('Access-Control-Allow-Origin', '*'),
             ('Access-Control-Allow-Headers', environ.get(
                 'HTTP_ACCESS_CONTROL_REQUEST_HEADERS', 'authorization')),
-            ('content-type', 'application/json'),
-            ('content-length', str(len(response_body)))]
+            ('content-type', 'application/json')] + encoding_headers
         start_response(status, response_headers)
-        return [response_body.encode('utf8')]
+        return response_chunks
+
+    def metrics_method(self, method_name):
+        # unknown method names would make one metric label per typo
+        if method_name in self.rpc_service.method_data:
+            return method_name
+        return 'unknown'
 
     def process_error(self, error, context, request, trace=None):
         if trace:
@@ -514,6 +604,14 @@ try:
         from gevent import monkey
         monkey.patch_all()
     uwsgi.applications = {'': application}
+    # the uwsgi master loads this file before it forks the workers, which then share their
+    # metrics through metrics-dir so that GET /metrics of any worker reports all of them
+    if config is not None:
+        METRICS.set_multiprocess_dir(config.get('metrics-dir') or
+                                     os.path.join(config['scratch'], 'metrics'), clear=True)
+    # load the importer in every worker after fork instead of on its first request
+    if config is not None and config.get('warm-up-workers', 'false') == 'true':
+        uwsgi.post_fork_hook = impl_FunctionalProfileUtil.warm_up
 except ImportError:
     # Not available outside of wsgi, ignore
     pass
@@ -521,39 +619,54 @@ except ImportError:
 _proc = None
 
 
-def start_server(host='localhost', port=0, newprocess=False):
+def start_server(host='localhost', port=0, newprocess=False, threads=None,
+                 max_queue=None):
     '''
     By default, will start the server on localhost on a system assigned port
     in the main thread. Excecution of the main thread will stay in the server
     main loop until interrupted. To run the server in a separate process, and
     thus allow the stop_server method to be called, set newprocess = True. This
-    will also allow returning of the port number.'''
+    will also allow returning of the port number.
+
+    Requests are handled by a pool of threads workers (deploy.cfg
+    server-threads, default 4) with up to max_queue more requests waiting
+    (server-max-queue, default 16); further requests get a 503 response.
+    SIGTERM or SIGINT stop the server after the accepted requests finish.'''
 
     global _proc
     if _proc:
         raise RuntimeError('server is already running')
-    httpd = make_server(host, port, application)
+    if threads is None:
+        threads = int(config.get('server-threads') or 4) if config else 4
+    if max_queue is None:
+        max_queue = int(config.get('server-max-queue') or 16) if config else 16
+    httpd = ThreadPoolServer((host, port), application, threads=threads,
+                             max_queue=max_queue,
+                             max_request_size=application.max_request_size)
     port = httpd.server_address[1]
-    print("Listening on port %s" % port)
+    print("Listening on port %s with %s worker threads" % (port, threads))
     if newprocess:
-        _proc = Process(target=httpd.serve_forever)
+        _proc = Process(target=serve_until_signal, args=(httpd,))
         _proc.daemon = True
         _proc.start()
     else:
-        httpd.serve_forever()
+        serve_until_signal(httpd)
     return port
 
 
 def stop_server():
     global _proc
+    # SIGTERM, the server finishes its accepted requests before exiting
     _proc.terminate()
+    _proc.join()
     _proc = None
 
 
-def process_async_cli(input_file_path, output_file_path, token):
+def run_async_request(req, token):
+    '''
+    Runs one JSON-RPC request outside of the server and returns its response
+    and exit code.'''
     exit_code = 0
-    with open(input_file_path) as data_file:
-        req = json.load(data_file)
     if 'version' not in req:
         req['version'] = '1.1'
     if 'id' not in req:
@@ -573,7 +686,8 @@ def process_async_cli(input_file_path, output_file_path, token):
     ctx['provenance'] = [prov_action]
     resp = None
     try:
-        resp = application.rpc_service.call_py(ctx, req)
+        with track_request(application.metrics_method(req['method'])):
+            resp = application.rpc_service.call_py(ctx, req)
     except JSONRPCError as jre:
         trace = jre.trace if hasattr(jre, 'trace') else None
         resp = {'id': req['id'],
@@ -594,8 +708,37 @@ def process_async_cli(input_file_path, output_file_path, token):
                 }
     if 'error' in resp:
         exit_code = 500
+    return resp, exit_code
+
+
+def process_async_cli(input_file_path, output_file_path, token):
+    with open(input_file_path) as data_file:
+        req = json.load(data_file)
+    resp, exit_code = run_async_request(req, token)
     with open(output_file_path, "w") as f:
         f.write(json.dumps(resp, cls=JSONObjectEncoder))
+    if config and config.get('metrics-file'):
+        METRICS.write(config['metrics-file'])
+    return exit_code
+
+
+def process_async_batch(input_path, output_file_path, token, workers=None):
+    '''
+    Runs the requests of a directory of JSON request files or of a JSONL file
+    in this process with a pool of workers (deploy.cfg batch-workers, default
+    1). Every response is appended to the JSONL output file as soon as its
+    request finishes, with the request's exit code; requests that already
+    succeeded in the output file are skipped and failed ones are run again.
+    Returns 0 if all requests succeeded.'''
+    if workers is None:
+        workers = int(config.get('batch-workers') or 1) if config else 1
+    impl_FunctionalProfileUtil.warm_up()
+    runner = BatchRunner(lambda req: run_async_request(req, token),
+                         workers=workers)
+    exit_code = runner.run(input_path, output_file_path,
+                           encoder=JSONObjectEncoder)
+    if config and config.get('metrics-file'):
+        METRICS.write(config['metrics-file'])
     return exit_code
 
 if __name__ == "__main__":
@@ -610,23 +753,55 @@ if __name__ == "__main__":
                 token = sys.argv[3]
         sys.exit(process_async_cli(sys.argv[1], sys.argv[2], token))
     try:
-        opts, args = getopt(sys.argv[1:], "", ["port=", "host="])
+        opts, args = getopt(sys.argv[1:], "", ["port=", "host=", "threads=",
+                                               "max-queue=", "batch=",
+                                               "output=", "workers=",
+                                               "token="])
     except GetoptError as err:
         # print help information and exit:
         print(str(err))  # will print something like "option -a not recognized"
         sys.exit(2)
     port = 9999
     host = 'localhost'
+    threads = None
+    max_queue = None
+    batch = None
+    output = None
+    workers = None
+    token = None
     for o, a in opts:
         if o == '--port':
             port = int(a)
         elif o == '--host':
             host = a
             print("Host set to %s" % host)
+        elif o == '--threads':
+            threads = int(a)
+        elif o == '--max-queue':
+            max_queue = int(a)
+        elif o == '--batch':
+            batch = a
+        elif o == '--output':
+            output = a
+        elif o == '--workers':
+            workers = int(a)
+        elif o == '--token':
+            if os.path.isfile(a):
+                with open(a) as token_file:
+                    token = token_file.read().strip()
+            else:
+                token = a
         else:
             assert False, "unhandled option"
 
-    start_server(host=host, port=port)
+    if batch:
+        # e.g. --batch requests.jsonl --output results.jsonl --workers 4
+        if not output:
+            print("--batch needs an --output file")
+            sys.exit(2)
+        sys.exit(process_async_batch(batch, output, token, workers=workers))
+
+    start_server(host=host, port=port, threads=threads, max_queue=max_queue)
 #    print("Listening on port %s" % port)
 #    httpd = make_server( host, port, application)
 #
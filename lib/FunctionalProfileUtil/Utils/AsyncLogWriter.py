@@ -0,0 +1,139 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from FunctionalProfileUtil.Utils.ServiceMetrics import LOG_RECORDS_DROPPED
+
+_STOP = object()
+
+
+class AsyncLogWriter:
+    """
+    AsyncLogWriter: log records written by a background thread in batches, off the request
+                    threads
+
+    records are enqueued as a logging call and its arguments. when the queue is full, records
+    at or above block_level severity (syslog levels, lower is more severe) wait up to
+    put_timeout seconds for space, other records are dropped right away. dropped records are
+    counted and reported by the writer once the queue has room again.
+    without a background writer (enabled False) records are written on the calling thread.
+    """
+
+    MAX_QUEUE = 10000
+    BATCH_SIZE = 256
+    FLUSH_INTERVAL = 0.5
+    PUT_TIMEOUT = 1.0
+    BLOCK_LEVEL = 3  # syslog ERR
+
+    def __init__(self, lock=None, enabled=True, max_queue=None, put_timeout=None,
+                 block_level=None):
+        self.lock = lock or threading.RLock()
+        self.enabled = enabled
+        self.max_queue = int(max_queue or self.MAX_QUEUE)
+        self.put_timeout = self.PUT_TIMEOUT if put_timeout is None else float(put_timeout)
+        self.block_level = self.BLOCK_LEVEL if block_level is None else block_level
+        self.dropped = 0
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._drop_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _ensure_started(self):
+        # a writer thread started before uwsgi forks its workers does not run in them
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                            name='AsyncLogWriter', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, level, log_method, *args):
+        """
+        submit: write log_method(*args), a record of level, on the writer thread
+        """
+        if not self.enabled:
+            with self.lock:
+                log_method(*args)
+            return
+
+        self._ensure_started()
+        try:
+            if level <= self.block_level and self.put_timeout > 0:
+                self._queue.put((log_method, args), timeout=self.put_timeout)
+            else:
+                self._queue.put_nowait((log_method, args))
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+    def _write(self, batch):
+        with self.lock:
+            for log_method, args in batch:
+                try:
+                    log_method(*args)
+                except Exception:
+                    logging.exception('failed to write log record')
+
+    def _report_dropped(self):
+        with self._drop_lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            logging.warning('log queue was full, dropped {} log records'.format(dropped))
+
+    def _run(self, records):
+        while True:
+            record = records.get()
+            batch = list()
+            done = list()
+            deadline = time.monotonic() + self.FLUSH_INTERVAL
+            while True:
+                done.append(record)
+                if record is _STOP or isinstance(record, threading.Event):
+                    break
+                batch.append(record)
+                if len(batch) >= self.BATCH_SIZE:
+                    break
+                try:
+                    record = records.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+            self._report_dropped()
+            for record in done:
+                if isinstance(record, threading.Event):
+                    record.set()
+                records.task_done()
+            if done[-1] is _STOP:
+                return
+
+    def flush(self, timeout=None):
+        """
+        flush: wait until the records submitted so far are written
+        """
+        if not self.enabled or self._pid != os.getpid():
+            return True
+        flushed = threading.Event()
+        self._queue.put(flushed)
+        return flushed.wait(timeout)
+
+    def close(self, timeout=5):
+        """
+        close: write the queued records and stop the writer thread
+        """
+        with self._start_lock:
+            if self._pid != os.getpid():
+                return
+            self._pid = None
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
@@ -0,0 +1,146 @@
+'''
+Created on Aug 1, 2016
+
+A very basic KBase auth client for the Python server.
+
+@author: gaprice@lbl.gov
+
+The auth client kb-sdk compile generates (FunctionalProfileUtil/authclient.py)
+with a bounded LRU token cache and single-flight token lookups. It lives in
+Utils so that compile does not overwrite it, the server imports it from here.
+'''
+import time as _time
+import requests as _requests
+from requests.adapters import HTTPAdapter as _HTTPAdapter
+import threading as _threading
+import hashlib
+from collections import OrderedDict as _OrderedDict
+
+
+class TokenCache(object):
+    '''
+    A least recently used cache for tokens. Entries expire after _MAX_TIME_SEC
+    and are dropped when they are looked up, the least recently used entry is
+    evicted when the cache is full.
+    '''
+
+    _MAX_TIME_SEC = 5 * 60  # 5 min
+
+    def __init__(self, maxsize=2000):
+        self._cache = _OrderedDict()
+        self._maxsize = maxsize
+        self._lock = _threading.Lock()
+
+    @staticmethod
+    def _hash(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get_user(self, token):
+        token = self._hash(token)
+        with self._lock:
+            usertime = self._cache.get(token)
+            if not usertime:
+                return None
+
+            user, intime = usertime
+            if _time.time() - intime > self._MAX_TIME_SEC:
+                del self._cache[token]
+                return None
+            self._cache.move_to_end(token)
+        return user
+
+    def add_valid_token(self, token, user):
+        if not token:
+            raise ValueError('Must supply token')
+        if not user:
+            raise ValueError('Must supply user')
+        token = self._hash(token)
+        with self._lock:
+            self._cache[token] = (user, _time.time())
+            self._cache.move_to_end(token)
+            while len(self._cache) > self._maxsize:
+                self._cache.popitem(last=False)
+
+
+class _PendingLookup(object):
+    ''' An auth service call other threads with the same token wait for. '''
+
+    def __init__(self):
+        self.done = _threading.Event()
+        self.user = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.user
+
+
+class KBaseAuth(object):
+    '''
+    A very basic KBase auth client for the Python server.
+
+    Concurrent lookups of the same uncached token share one auth service
+    call, which goes through a pooled session.
+    '''
+
+    _LOGIN_URL = 'https://kbase.us/services/auth/api/legacy/KBase/Sessions/Login'
+    _POOL_SIZE = 16
+
+    def __init__(self, auth_url=None):
+        '''
+        Constructor
+        '''
+        self._authurl = auth_url
+        if not self._authurl:
+            self._authurl = self._LOGIN_URL
+        self._cache = TokenCache()
+        self._pending = {}
+        self._pending_lock = _threading.Lock()
+        self._session = _requests.Session()
+        adapter = _HTTPAdapter(
+            pool_connections=1, pool_maxsize=self._POOL_SIZE)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def get_user(self, token):
+        if not token:
+            raise ValueError('Must supply token')
+        user = self._cache.get_user(token)
+        if user:
+            return user
+
+        with self._pending_lock:
+            pending = self._pending.get(token)
+            leader = pending is None
+            if leader:
+                pending = self._pending[token] = _PendingLookup()
+        if not leader:
+            return pending.wait()
+
+        try:
+            pending.user = self._fetch_user(token)
+            self._cache.add_valid_token(token, pending.user)
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._pending_lock:
+                del self._pending[token]
+            pending.done.set()
+        return pending.user
+
+    def _fetch_user(self, token):
+        d = {'token': token, 'fields': 'user_id'}
+        ret = self._session.post(self._authurl, data=d)
+        if not ret.ok:
+            try:
+                err = ret.json()
+            except Exception:
+                ret.raise_for_status()
+            raise ValueError('Error connecting to auth service: {} {}\n{}'
+                             .format(ret.status_code, ret.reason,
+                                     err['error']['message']))
+
+        return ret.json()['user_id']
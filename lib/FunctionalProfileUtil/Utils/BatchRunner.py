@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def iter_batch_requests(input_path):
+    """
+    iter_batch_requests: (request id, request) of a directory of JSON request files, ids are the
+                         file names, or of a JSONL file of requests, ids are the line numbers
+    """
+    if os.path.isdir(input_path):
+        for file_name in sorted(os.listdir(input_path)):
+            if not file_name.endswith('.json'):
+                continue
+            with open(os.path.join(input_path, file_name)) as request_file:
+                yield file_name, json.load(request_file)
+        return
+
+    with open(input_path) as request_file:
+        for line_number, line in enumerate(request_file, 1):
+            if not line.strip():
+                continue
+            try:
+                yield str(line_number), json.loads(line)
+            except ValueError as e:
+                raise ValueError('Invalid request on line {} of {}: {}'.format(
+                                                                line_number, input_path, e))
+
+
+class BatchRunner:
+    """
+    BatchRunner: run many JSON-RPC requests in one process with a pool of worker threads
+
+    results are appended to a JSONL output file as each request finishes, one line
+        {"request": request id, "exit_code": 0 or 500, "seconds": run time, "result": response}
+    per request. requests whose id already has a line with exit code 0 in the output file are
+    skipped, so an interrupted batch continues where it stopped when it is run again and failed
+    requests are retried. a retried request appends another line, the last line of an id holds
+    its latest result.
+    """
+
+    def __init__(self, run_request, workers=1):
+        """
+        run_request: function of a request returning (response, exit code)
+        """
+        self.run_request = run_request
+        self.workers = max(int(workers or 1), 1)
+        self._output_lock = threading.Lock()
+
+    @staticmethod
+    def _finished_requests(output_path):
+        finished = set()
+        if not os.path.isfile(output_path):
+            return finished
+        with open(output_path) as output_file:
+            for line in output_file:
+                try:
+                    result = json.loads(line)
+                    succeeded = result['exit_code'] == 0
+                except (ValueError, KeyError, TypeError):
+                    # a line cut short by an interrupted run
+                    continue
+                if succeeded:
+                    finished.add(result['request'])
+        return finished
+
+    def _run_one(self, request_id, request, output_file, encoder):
+        start = time.time()
+        try:
+            response, exit_code = self.run_request(request)
+        except Exception as e:
+            logging.exception('batch request {} failed'.format(request_id))
+            response, exit_code = {'error': {'code': 0, 'name': 'Batch Runner Error',
+                                             'message': str(e)}}, 500
+
+        line = json.dumps({'request': request_id, 'exit_code': exit_code,
+                           'seconds': round(time.time() - start, 3), 'result': response},
+                          cls=encoder)
+        with self._output_lock:
+            output_file.write(line + '\n')
+            output_file.flush()
+        return exit_code
+
+    def run(self, input_path, output_path, encoder=None):
+        """
+        run: run the requests of input_path, return 0 if all of them succeeded, otherwise the
+             exit code of a failed one
+        """
+        finished = self._finished_requests(output_path)
+        if finished:
+            logging.info('skipping {} requests that succeeded in {}'.format(
+                                                                len(finished), output_path))
+
+        # a malformed request fails the batch before any request runs
+        requests = [(request_id, request) for request_id, request
+                    in iter_batch_requests(input_path) if request_id not in finished]
+
+        exit_codes = list()
+        with open(output_path, 'a') as output_file, \
+                ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._run_one, request_id, request, output_file,
+                                       encoder)
+                       for request_id, request in requests]
+            for future in futures:
+                exit_codes.append(future.result())
+
+        failed = [exit_code for exit_code in exit_codes if exit_code]
+        logging.info('batch finished: {} requests run, {} failed'.format(len(exit_codes),
+                                                                         len(failed)))
+        return failed[0] if failed else 0
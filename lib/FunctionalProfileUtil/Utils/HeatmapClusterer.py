@@ -0,0 +1,163 @@
+import logging
+import os
+import uuid
+
+import numpy as np
+from scipy.cluster.hierarchy import leaves_list, linkage
+
+from FunctionalProfileUtil.Utils.MemoryBudget import MemoryBudget
+from FunctionalProfileUtil.Utils.ServiceMetrics import record_cache
+
+
+class HeatmapClusterer:
+    """
+    HeatmapClusterer: hierarchical clustering order of heatmap rows and columns
+
+    axes longer than MAX_CLUSTER_SIZE are clustered on a random sample, the remaining
+    items are placed next to their nearest sampled item. linkage results are cached on disk by
+    profile content hash. once the cache files add up to more than max_cache_size bytes, the
+    least recently used ones are removed.
+    """
+
+    MAX_CLUSTER_SIZE = 2000
+    MAX_CLUSTER_CELLS = 1 << 22  # larger matrices are not clustered
+    CHUNK_CELLS = 1 << 22  # distance matrix cells computed at once
+
+    DEFAULT_CACHE_SIZE = '1G'
+
+    def __init__(self, cache_dir, max_cache_size=None, method='ward', metric='euclidean'):
+        self.cache_dir = cache_dir
+        self.max_cache_size = MemoryBudget.parse_size(max_cache_size or self.DEFAULT_CACHE_SIZE)
+        self.method = method
+        self.metric = metric
+
+    def _cache_path(self, content_hash):
+        return os.path.join(self.cache_dir, '{}_{}_{}.npz'.format(content_hash, self.method,
+                                                                  self.metric))
+
+    def _load_cached(self, content_hash):
+        if not content_hash:
+            return None
+
+        cache_path = self._cache_path(content_hash)
+        if not os.path.isfile(cache_path):
+            return None
+
+        try:
+            with np.load(cache_path) as cached:
+                logging.info('using cached heatmap clustering {}'.format(cache_path))
+                clustering = {key: cached[key] for key in cached.files}
+            # the modification time tracks the last use for eviction
+            os.utime(cache_path)
+            return clustering
+        except Exception as e:
+            logging.warning('failed to load cached heatmap clustering: {}'.format(e))
+            return None
+
+    def _save_cached(self, content_hash, clustering):
+        if not content_hash:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # write then rename so concurrent reports never read a partial file
+        tmp_path = os.path.join(self.cache_dir, 'tmp_{}.npz'.format(uuid.uuid4()))
+        np.savez(tmp_path, **clustering)
+        os.replace(tmp_path, self._cache_path(content_hash))
+
+        self._evict()
+
+    def _evict(self):
+        """
+        _evict: remove the least recently used cache files until the cache fits max_cache_size
+        """
+        cache_files = list()
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.startswith('tmp_') or not file_name.endswith('.npz'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, file_name))
+            except FileNotFoundError:
+                continue
+            cache_files.append((stat.st_mtime, stat.st_size, file_name))
+
+        cache_size = sum(size for _, size, _ in cache_files)
+        for _, size, file_name in sorted(cache_files):
+            if cache_size <= self.max_cache_size:
+                break
+            logging.info('evicting cached heatmap clustering {}'.format(file_name))
+            try:
+                os.remove(os.path.join(self.cache_dir, file_name))
+            except FileNotFoundError:
+                # removed by a concurrent report
+                pass
+            cache_size -= size
+
+    def _nearest(self, items, sample):
+        """
+        _nearest: index of the nearest sample row for every row of items
+        """
+        sample_sq = np.square(sample).sum(axis=1)
+        chunk_size = max(1, self.CHUNK_CELLS // max(len(sample), 1))
+
+        nearest = np.empty(len(items), dtype=np.int64)
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start:start + chunk_size]
+            # squared euclidean distance without the per item constant
+            distances = sample_sq - 2 * chunk.dot(sample.T)
+            nearest[start:start + len(chunk)] = distances.argmin(axis=1)
+
+        return nearest
+
+    def _cluster_axis(self, values):
+        """
+        _cluster_axis: leaf order and linkage matrix of the rows of values
+        """
+        n_items = len(values)
+        if n_items < 2:
+            return np.arange(n_items), np.zeros((0, 4))
+
+        if n_items <= self.MAX_CLUSTER_SIZE:
+            link = linkage(values, method=self.method, metric=self.metric)
+            return leaves_list(link), link
+
+        sample_idx = np.sort(np.random.RandomState(0).choice(n_items, self.MAX_CLUSTER_SIZE,
+                                                             replace=False))
+        logging.info('clustering a sample of {} out of {} items'.format(len(sample_idx), n_items))
+        sample = values[sample_idx]
+        link = linkage(sample, method=self.method, metric=self.metric)
+
+        # leaf rank of every sampled item, other items follow their nearest sampled item
+        sample_rank = np.empty(len(sample_idx), dtype=np.int64)
+        sample_rank[leaves_list(link)] = np.arange(len(sample_idx))
+        rank = sample_rank[self._nearest(values, sample)]
+        rank[sample_idx] = sample_rank
+
+        not_sampled = np.ones(n_items, dtype=bool)
+        not_sampled[sample_idx] = False
+        return np.lexsort((not_sampled, rank)), link
+
+    def cluster(self, values, content_hash=None):
+        """
+        cluster: row and column order of a NaN free matrix, None if it is too large to cluster
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.size > self.MAX_CLUSTER_CELLS:
+            logging.info('matrix is too large to cluster, keeping original order')
+            return None
+
+        clustering = self._load_cached(content_hash)
+        if clustering is not None and (len(clustering['row_order']),
+                                       len(clustering['col_order'])) != values.shape:
+            logging.warning('cached heatmap clustering does not match the matrix shape')
+            clustering = None
+        record_cache('heatmap_clustering', clustering is not None)
+
+        if clustering is None:
+            logging.info('start clustering {} x {} matrix'.format(*values.shape))
+            row_order, row_linkage = self._cluster_axis(values)
+            col_order, col_linkage = self._cluster_axis(values.T)
+            clustering = {'row_order': row_order, 'row_linkage': row_linkage,
+                          'col_order': col_order, 'col_linkage': col_linkage}
+            self._save_cached(content_hash, clustering)
+
+        return clustering
@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+
+import numpy as np
+
+from FunctionalProfileUtil.Utils.ReportPackager import ReportPackager
+
+MISSING_COLOR = 255  # color index of cells without values, values use 0 to 254
+
+
+class HeatmapTiler:
+    """
+    HeatmapTiler: bounded heatmap of a large profile matrix
+
+    writes an overview of at most OVERVIEW_SIZE rows and columns (top-variance rows/columns or
+    block aggregated) and a pyramid of block-averaged levels cut into TILE_SIZE tiles, with
+    values quantized to one byte per cell. heatmap_viewer.html loads the tiles on demand.
+    """
+
+    OVERVIEW_SIZE = 400
+    TILE_SIZE = 256
+    MAX_TILED_CELLS = 1 << 26  # cells of the finest tiled level
+    CHUNK_CELLS = 1 << 22  # matrix cells processed at once
+
+    def __init__(self, overview_method='variance'):
+        if overview_method not in ('variance', 'block'):
+            raise ValueError('Unsupported heatmap overview method: {}'.format(overview_method))
+        self.overview_method = overview_method
+
+    @staticmethod
+    def _reduce_blocks(arr, row_factor, col_factor):
+        """
+        _reduce_blocks: sum arr over blocks of row_factor x col_factor cells
+        """
+        if col_factor > 1:
+            arr = np.add.reduceat(arr, np.arange(0, arr.shape[1], col_factor), axis=1)
+        if row_factor > 1:
+            arr = np.add.reduceat(arr, np.arange(0, arr.shape[0], row_factor), axis=0)
+
+        return arr
+
+    def _row_chunks(self, values, row_factor=1):
+        """
+        _row_chunks: yield start row, finite mask and NaN filled copy of row chunks of values
+        """
+        n_rows, n_cols = values.shape
+        chunk_rows = max(1, self.CHUNK_CELLS // max(n_cols, 1) // row_factor) * row_factor
+
+        for start in range(0, n_rows, chunk_rows):
+            chunk = values[start:start + chunk_rows]
+            finite = np.isfinite(chunk)
+            yield start, finite, np.where(finite, chunk, 0.0)
+
+    def _scan(self, values, row_factor, col_factor):
+        """
+        _scan: single pass over values collecting the value range, row/column variances and
+               the block sums and counts of the finest tiled level
+        """
+        n_rows, n_cols = values.shape
+
+        vmin, vmax = np.inf, -np.inf
+        row_var = np.empty(n_rows)
+        col_count = np.zeros(n_cols)
+        col_sum = np.zeros(n_cols)
+        col_sumsq = np.zeros(n_cols)
+        level_sums = np.zeros((-(-n_rows // row_factor), -(-n_cols // col_factor)))
+        level_counts = np.zeros(level_sums.shape)
+
+        for start, finite, filled in self._row_chunks(values, row_factor):
+            if finite.any():
+                vmin = min(vmin, filled[finite].min())
+                vmax = max(vmax, filled[finite].max())
+
+            count = finite.sum(axis=1)
+            total = filled.sum(axis=1)
+            sumsq = np.square(filled).sum(axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                row_var[start:start + len(count)] = sumsq / count - np.square(total / count)
+
+            col_count += finite.sum(axis=0)
+            col_sum += filled.sum(axis=0)
+            col_sumsq += np.square(filled).sum(axis=0)
+
+            blocks = slice(start // row_factor, -(-(start + len(count)) // row_factor))
+            level_sums[blocks] = self._reduce_blocks(filled, row_factor, col_factor)
+            level_counts[blocks] = self._reduce_blocks(finite.astype(np.float64),
+                                                       row_factor, col_factor)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            col_var = col_sumsq / col_count - np.square(col_sum / col_count)
+
+        if vmin > vmax:
+            vmin = vmax = 0.0
+
+        return (float(vmin), float(vmax)), row_var, col_var, level_sums, level_counts
+
+    @staticmethod
+    def _quantize(sums, counts, value_range):
+        vmin, vmax = value_range
+        scale = 254.0 / (vmax - vmin) if vmax > vmin else 0.0
+
+        colors = np.full(sums.shape, MISSING_COLOR, dtype=np.uint8)
+        valid = counts > 0
+        colors[valid] = np.rint((sums[valid] / counts[valid] - vmin) * scale).clip(0, 254)
+
+        return colors
+
+    def _level_factors(self, n_rows, n_cols):
+        """
+        _level_factors: (row_factor, col_factor) of each pyramid level, coarsest first
+        """
+        def coarsen(rf, cf):
+            # aggregate along the axis with most blocks
+            if -(-n_rows // rf) >= -(-n_cols // cf):
+                return rf * 2, cf
+            return rf, cf * 2
+
+        row_factor, col_factor = 1, 1
+        while -(-n_rows // row_factor) * -(-n_cols // col_factor) > self.MAX_TILED_CELLS:
+            row_factor, col_factor = coarsen(row_factor, col_factor)
+
+        factors = [(row_factor, col_factor)]
+        while (-(-n_rows // row_factor) > self.TILE_SIZE or
+               -(-n_cols // col_factor) > self.TILE_SIZE):
+            if -(-n_rows // row_factor) > self.TILE_SIZE:
+                row_factor *= 2
+            if -(-n_cols // col_factor) > self.TILE_SIZE:
+                col_factor *= 2
+            factors.append((row_factor, col_factor))
+
+        return factors[::-1]
+
+    def _write_tiles(self, colors, level_dir):
+        os.makedirs(level_dir)
+        for tile_row in range(0, colors.shape[0], self.TILE_SIZE):
+            for tile_col in range(0, colors.shape[1], self.TILE_SIZE):
+                tile = colors[tile_row:tile_row + self.TILE_SIZE,
+                              tile_col:tile_col + self.TILE_SIZE]
+                tile_path = os.path.join(level_dir, '{}_{}.bin'.format(
+                                                            tile_row // self.TILE_SIZE,
+                                                            tile_col // self.TILE_SIZE))
+                with open(tile_path, 'wb') as tile_file:
+                    tile_file.write(np.ascontiguousarray(tile).tobytes())
+
+    @staticmethod
+    def _top_indices(variances, size):
+        if len(variances) <= size:
+            return np.arange(len(variances))
+
+        ranked = np.where(np.isnan(variances), -np.inf, variances)
+        return np.sort(np.argpartition(-ranked, size)[:size])
+
+    def _overview(self, values, row_ids, col_ids, row_var, col_var, levels, value_range):
+        if self.overview_method == 'block':
+            coarsest = levels[0]
+            return {'method': 'block',
+                    'n_rows': coarsest['n_rows'],
+                    'n_cols': coarsest['n_cols'],
+                    'row_factor': coarsest['row_factor'],
+                    'col_factor': coarsest['col_factor']}, None
+
+        rows = self._top_indices(row_var, self.OVERVIEW_SIZE)
+        cols = self._top_indices(col_var, self.OVERVIEW_SIZE)
+        sub_values = values[np.ix_(rows, cols)]
+        finite = np.isfinite(sub_values)
+        colors = self._quantize(np.where(finite, sub_values, 0.0), finite, value_range)
+
+        return {'method': 'variance',
+                'n_rows': len(rows),
+                'n_cols': len(cols),
+                'row_ids': [row_ids[i] for i in rows],
+                'col_ids': [col_ids[i] for i in cols]}, colors
+
+    def build_heatmap(self, values, row_ids, col_ids, output_directory):
+        """
+        build_heatmap: write overview, tiles and viewer page into output_directory
+
+        returns the viewer page name
+        """
+        values = np.asarray(values, dtype=np.float64)
+        n_rows, n_cols = values.shape
+        logging.info('start building tiled heatmap for {} x {} matrix'.format(n_rows, n_cols))
+
+        factors = self._level_factors(n_rows, n_cols)
+        value_range, row_var, col_var, sums, counts = self._scan(values, *factors[-1])
+
+        levels = list()
+        tile_dir = os.path.join(output_directory, 'heatmap_tiles')
+        prev_factors = factors[-1]
+        for level, (row_factor, col_factor) in reversed(list(enumerate(factors))):
+            if (row_factor, col_factor) != prev_factors:
+                sums = self._reduce_blocks(sums, row_factor // prev_factors[0],
+                                           col_factor // prev_factors[1])
+                counts = self._reduce_blocks(counts, row_factor // prev_factors[0],
+                                             col_factor // prev_factors[1])
+                prev_factors = (row_factor, col_factor)
+
+            self._write_tiles(self._quantize(sums, counts, value_range),
+                              os.path.join(tile_dir, str(level)))
+            levels.append({'level': level,
+                           'n_rows': sums.shape[0],
+                           'n_cols': sums.shape[1],
+                           'row_factor': row_factor,
+                           'col_factor': col_factor})
+        levels.reverse()
+
+        overview, overview_colors = self._overview(values, row_ids, col_ids, row_var, col_var,
+                                                   levels, value_range)
+        if overview_colors is not None:
+            with open(os.path.join(tile_dir, 'overview.bin'), 'wb') as overview_file:
+                overview_file.write(np.ascontiguousarray(overview_colors).tobytes())
+
+        heatmap_index = {'n_rows': n_rows,
+                         'n_cols': n_cols,
+                         'tile_size': self.TILE_SIZE,
+                         'value_range': value_range,
+                         'missing_color': MISSING_COLOR,
+                         'levels': levels,
+                         'overview': overview}
+        with open(os.path.join(tile_dir, 'heatmap_index.json'), 'w') as index_file:
+            json.dump(heatmap_index, index_file)
+        with open(os.path.join(tile_dir, 'heatmap_ids.json'), 'w') as ids_file:
+            json.dump({'row_ids': list(row_ids), 'col_ids': list(col_ids)}, ids_file)
+
+        viewer_page = 'heatmap_viewer.html'
+        ReportPackager.link_asset(os.path.join(os.path.dirname(__file__), 'templates', viewer_page),
+                                  os.path.join(output_directory, viewer_page))
+
+        logging.info('built {} heatmap levels'.format(len(levels)))
+
+        return viewer_page
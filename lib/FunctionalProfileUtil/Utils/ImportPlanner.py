@@ -0,0 +1,152 @@
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from FunctionalProfileUtil.Utils.MatrixJSONEncoder import MatrixJSONEncoder
+
+INLINE_OBJECT_LIMIT = 200 * 1024 * 1024  # largest object saved via DataFileUtil
+LARGE_OBJECT_LIMIT = 1 * 1024 * 1024 * 1024  # largest object saved via WsLargeDataIO
+
+# object layouts, in order of increasing capacity
+INLINE_LAYOUT = 'inline'  # values in the object, saved via DataFileUtil
+LARGE_DATA_LAYOUT = 'large_data'  # values in the object, saved via WsLargeDataIO
+BLOB_LAYOUT = 'blob'  # values in a blobstore file referenced by handle
+LAYOUTS = [INLINE_LAYOUT, LARGE_DATA_LAYOUT, BLOB_LAYOUT]
+
+GZIP_MAGIC = b'\x1f\x8b'
+EXCEL_MAGICS = [b'PK\x03\x04', b'\xd0\xcf\x11\xe0']
+
+
+class ImportPlanner:
+    """
+    ImportPlanner: estimate the size of a FunctionalProfile object from the header and the first
+                   rows of a profile file, before the whole file is parsed
+    """
+
+    SAMPLE_BYTES = 1024 * 1024
+
+    def __init__(self):
+        self.json_encoder = MatrixJSONEncoder()
+
+    @staticmethod
+    def choose_layout(obj_size, numeric):
+        """
+        choose_layout: smallest object layout able to hold an object of obj_size bytes
+
+        only numeric objects beyond what WsLargeDataIO saves move their values to the blobstore,
+        readers of values see an empty matrix for them
+        """
+        if obj_size <= INLINE_OBJECT_LIMIT:
+            return INLINE_LAYOUT
+
+        if obj_size <= LARGE_OBJECT_LIMIT:
+            return LARGE_DATA_LAYOUT
+
+        if numeric:
+            return BLOB_LAYOUT
+
+        raise ValueError('Object is too large')
+
+    def _read_sample(self, file_path):
+        """
+        _read_sample: leading text of the file, the number of file bytes it covers and the total
+                      file size
+        """
+        file_size = os.path.getsize(file_path)
+
+        with open(file_path, 'rb') as raw_file:
+            if raw_file.read(2) == GZIP_MAGIC:
+                raw_file.seek(0)
+                with gzip.GzipFile(fileobj=raw_file) as gzip_file:
+                    sample = gzip_file.read(self.SAMPLE_BYTES)
+                    at_end = not gzip_file.read(1)
+                # compressed bytes consumed so far, used to extrapolate the row count
+                sample_file_bytes = raw_file.tell()
+            else:
+                raw_file.seek(0)
+                sample = raw_file.read(self.SAMPLE_BYTES)
+                at_end = len(sample) == file_size
+                sample_file_bytes = len(sample)
+
+        if not at_end:
+            # drop the partial last line
+            sample = sample[:sample.rfind(b'\n') + 1]
+
+        return sample.decode('utf-8', errors='replace'), sample_file_bytes, file_size, at_end
+
+    def plan(self, file_path, value_precision=None):
+        """
+        plan: estimated shape, value format and object size of a profile file, with values
+              rounded to value_precision significant digits if given
+
+        the planned layout decides whether the values are converted to lists before the object
+        is serialized. plans of files sampled to the end (exact) also fix the save layout
+
+        returns None for files that can not be sampled (e.g. excel files)
+        """
+        with open(file_path, 'rb') as raw_file:
+            magic = raw_file.read(4)
+        if magic in EXCEL_MAGICS:
+            logging.info('excel profile file, skip size estimation')
+            return None
+
+        sample, sample_file_bytes, file_size, at_end = self._read_sample(file_path)
+        header, _, body = sample.partition('\n')
+        if not body.strip():
+            return None
+
+        try:
+            sep = csv.Sniffer().sniff(header).delimiter
+            df = pd.read_csv(io.StringIO(sample), sep=sep, index_col=0)
+        except Exception:
+            logging.info('failed to sample profile file, skip size estimation')
+            return None
+
+        if not len(df.index):
+            return None
+
+        try:
+            values = np.asarray(df.values, dtype=np.float64)
+            numeric = True
+            if value_precision:
+                values = self.json_encoder.round_values(values, value_precision)
+        except (TypeError, ValueError):
+            values = df.where(pd.notnull(df), None).values.tolist()
+            numeric = False
+
+        if at_end:
+            n_rows = len(df.index)
+        else:
+            body_file_bytes = sample_file_bytes * len(body) / len(sample)
+            row_file_bytes = body_file_bytes / len(df.index)
+            n_rows = int((file_size - sample_file_bytes * len(header) / len(sample)) /
+                         row_file_bytes)
+
+        row_json_bytes = (sum(len(chunk) for chunk in self.json_encoder.iterencode_values(values)) +
+                          len(json.dumps(df.index.astype(str).tolist()))) / len(df.index)
+        col_json_bytes = len(json.dumps(df.columns.astype(str).tolist()))
+        estimated_size = int(row_json_bytes * n_rows + col_json_bytes)
+
+        import_plan = {'sep': sep,
+                       'n_rows': n_rows,
+                       'n_cols': len(df.columns),
+                       'numeric': numeric,
+                       'estimated_size': estimated_size,
+                       'exact': at_end}
+
+        try:
+            import_plan['layout'] = self.choose_layout(estimated_size, numeric)
+        except ValueError:
+            raise ValueError('Profile file is too large to import: about {} rows x {} columns of '
+                             'non numeric values. Profiles larger than 1GB must hold numeric '
+                             'values only'.format(n_rows, len(df.columns)))
+
+        logging.info('import plan: {}'.format(import_plan))
+
+        return import_plan
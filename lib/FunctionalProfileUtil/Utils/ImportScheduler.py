@@ -0,0 +1,202 @@
+import fcntl
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+
+from FunctionalProfileUtil.Utils.ImportPlanner import INLINE_LAYOUT
+from FunctionalProfileUtil.Utils.MemoryBudget import MemoryBudget, format_size
+from FunctionalProfileUtil.Utils.ServiceMetrics import ADMISSION_WAIT_SECONDS
+
+ImportCost = namedtuple('ImportCost', ['memory', 'cpus'])
+
+QUEUED = 'queued'
+RUNNING = 'running'
+
+
+class ImportScheduler:
+    """
+    ImportScheduler: host wide admission control of concurrent imports
+
+    every import is admitted against a memory budget (import-host-memory-budget in deploy.cfg)
+    and a CPU budget (import-host-cpu-budget, concurrent imports, default the number of CPUs)
+    shared by all server workers writing the same ledger file. imports that do not fit wait in
+    a queue ordered by
+        - imports waiting longer than STARVATION_SECONDS first, in arrival order
+        - users with fewer running imports first
+        - smaller imports first
+        - arrival order
+    an import larger than the whole memory budget runs alone. without a memory budget every
+    import is admitted right away.
+    """
+
+    LEDGER_NAME = 'import_scheduler.json'
+    EXCEL_BYTES_PER_CELL = 2  # excel files can not be sampled, their cells are guessed from size
+    STARVATION_SECONDS = 300
+    POLL_INTERVAL = 0.2
+    MAX_POLL_INTERVAL = 2.0
+
+    def __init__(self, ledger_dir, memory_budget=None, cpu_budget=None, queue_timeout=None):
+        self.ledger_path = os.path.join(ledger_dir, self.LEDGER_NAME)
+        self.memory_budget = MemoryBudget.parse_size(memory_budget)
+        self.cpu_budget = int(cpu_budget or os.cpu_count() or 1)
+        self.queue_timeout = float(queue_timeout) if queue_timeout else None
+        self._hostname = socket.gethostname()
+
+    def estimate(self, import_plan, file_size, build_report=False):
+        """
+        estimate: ImportCost of importing a profile with import_plan (None or empty for files
+                  that can not be sampled) from a file of file_size bytes
+        """
+        if import_plan:
+            n_cells = import_plan['n_rows'] * import_plan['n_cols']
+            numeric = import_plan['numeric']
+            inline = import_plan.get('layout') == INLINE_LAYOUT
+        else:
+            n_cells = file_size // self.EXCEL_BYTES_PER_CELL
+            numeric = True
+            inline = True
+
+        memory = MemoryBudget.project('parse', n_cells, numeric)
+        if inline:
+            memory += MemoryBudget.project('list_conversion', n_cells, numeric)
+        if build_report:
+            memory += MemoryBudget.project('report', n_cells, numeric)
+
+        return ImportCost(memory=memory, cpus=1)
+
+    @staticmethod
+    def estimate_report(n_cells):
+        """
+        estimate_report: ImportCost of building the report of a profile of n_cells in the
+                         background, after its import released its share
+        """
+        return ImportCost(memory=MemoryBudget.project('report', n_cells), cpus=1)
+
+    @contextmanager
+    def _ledger(self):
+        """
+        _ledger: tickets of the ledger file, locked for this process and written back on exit
+        """
+        os.makedirs(os.path.dirname(self.ledger_path), exist_ok=True)
+        with open(self.ledger_path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.ledger_path) as ledger_file:
+                        tickets = json.load(ledger_file)
+                except (OSError, ValueError):
+                    tickets = dict()
+
+                self._drop_dead_tickets(tickets)
+                yield tickets
+
+                tmp_path = self.ledger_path + '.tmp'
+                with open(tmp_path, 'w') as ledger_file:
+                    json.dump(tickets, ledger_file)
+                os.replace(tmp_path, self.ledger_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _drop_dead_tickets(self, tickets):
+        for ticket_id, ticket in list(tickets.items()):
+            if ticket['host'] != self._hostname:
+                continue
+            try:
+                os.kill(ticket['pid'], 0)
+            except ProcessLookupError:
+                logging.warning('dropping import ticket {} of exited process {}'.format(
+                                                                        ticket_id, ticket['pid']))
+                del tickets[ticket_id]
+            except PermissionError:
+                pass
+
+    def _priority(self, ticket, running_per_user, now):
+        starving = now - ticket['queued_at'] > self.STARVATION_SECONDS
+        return (not starving,
+                0 if starving else running_per_user.get(ticket['user_id'], 0),
+                0 if starving else ticket['memory'],
+                ticket['queued_at'])
+
+    def _admissible(self, tickets, now):
+        """
+        _admissible: ids of the queued tickets that can start now
+        """
+        running = [ticket for ticket in tickets.values() if ticket['state'] == RUNNING]
+        free_memory = self.memory_budget - sum(ticket['memory'] for ticket in running)
+        free_cpus = self.cpu_budget - sum(ticket['cpus'] for ticket in running)
+        running_per_user = dict()
+        for ticket in running:
+            running_per_user[ticket['user_id']] = running_per_user.get(ticket['user_id'], 0) + 1
+
+        queued = sorted((ticket_id for ticket_id, ticket in tickets.items()
+                         if ticket['state'] == QUEUED),
+                        key=lambda ticket_id: self._priority(tickets[ticket_id],
+                                                             running_per_user, now))
+        admissible = list()
+        for ticket_id in queued:
+            ticket = tickets[ticket_id]
+            alone = not running and not admissible
+            if free_cpus >= ticket['cpus'] and (ticket['memory'] <= free_memory or alone):
+                admissible.append(ticket_id)
+                free_memory -= ticket['memory']
+                free_cpus -= ticket['cpus']
+                running_per_user[ticket['user_id']] = running_per_user.get(
+                                                                    ticket['user_id'], 0) + 1
+            elif now - ticket['queued_at'] > self.STARVATION_SECONDS:
+                # reserve the freed resources for a starving import instead of passing it by
+                break
+
+        return admissible
+
+    def _try_start(self, ticket_id):
+        with self._ledger() as tickets:
+            if ticket_id in self._admissible(tickets, time.time()):
+                tickets[ticket_id]['state'] = RUNNING
+                return True
+            if ticket_id not in tickets:
+                raise RuntimeError('Import ticket {} vanished from the ledger'.format(ticket_id))
+            return False
+
+    def _release(self, ticket_id):
+        with self._ledger() as tickets:
+            tickets.pop(ticket_id, None)
+
+    @contextmanager
+    def admit(self, cost, user_id=None):
+        """
+        admit: wait until the import of cost fits the host budgets and hold its share of them
+               while the with block runs
+        """
+        if self.memory_budget is None:
+            yield
+            return
+
+        ticket_id = str(uuid.uuid4())
+        queued_at = time.time()
+        with self._ledger() as tickets:
+            tickets[ticket_id] = {'state': QUEUED, 'user_id': user_id, 'memory': cost.memory,
+                                  'cpus': cost.cpus, 'queued_at': queued_at,
+                                  'host': self._hostname, 'pid': os.getpid()}
+
+        try:
+            poll_interval = self.POLL_INTERVAL
+            while not self._try_start(ticket_id):
+                if self.queue_timeout and time.time() - queued_at > self.queue_timeout:
+                    raise ValueError('Importing this profile needs about {} of memory, the '
+                                     'service is busy with other imports. Please try again '
+                                     'later'.format(format_size(cost.memory)))
+                time.sleep(poll_interval)
+                poll_interval = min(poll_interval * 1.5, self.MAX_POLL_INTERVAL)
+
+            waited = time.time() - queued_at
+            ADMISSION_WAIT_SECONDS.observe(waited)
+            if waited > self.POLL_INTERVAL:
+                logging.info('import admitted after waiting {:.1f} s'.format(waited))
+            yield
+        finally:
+            self._release(ticket_id)
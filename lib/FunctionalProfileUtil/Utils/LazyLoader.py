@@ -0,0 +1,46 @@
+import logging
+import threading
+import time
+
+
+class lazy_property:
+    """
+    lazy_property: attribute built by the decorated method on first access and cached on the
+                   instance
+
+    construction is guarded by a lock, so concurrent first accesses build the attribute once.
+    the cached value is a plain instance attribute and can be replaced by assignment.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+        self._lock = threading.RLock()
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        with self._lock:
+            if self.name not in instance.__dict__:
+                instance.__dict__[self.name] = self.func(instance)
+        return instance.__dict__[self.name]
+
+
+def lazy_property_names(instance):
+    """
+    lazy_property_names: names of the lazy properties of instance's class
+    """
+    return [name for klass in reversed(type(instance).__mro__)
+            for name, attr in vars(klass).items() if isinstance(attr, lazy_property)]
+
+
+def preload(instance):
+    """
+    preload: build every lazy property of instance now instead of on first use
+    """
+    start = time.perf_counter()
+    for name in lazy_property_names(instance):
+        getattr(instance, name)
+    logging.info('preloaded {} in {:.3f} s'.format(type(instance).__name__,
+                                                   time.perf_counter() - start))
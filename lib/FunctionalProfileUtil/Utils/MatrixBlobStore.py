@@ -0,0 +1,74 @@
+import gzip
+import logging
+import os
+import uuid
+
+import numpy as np
+
+VALUES_FORMAT = 'npy.gz'
+
+
+class MatrixBlobStore:
+    """
+    MatrixBlobStore: keep the values of a FloatMatrix2D as a gzip compressed NPY file in the
+                     blobstore, referenced from the matrix by a handle
+    """
+
+    # float matrices barely compress, a low level keeps upload of large matrices cheap
+    COMPRESS_LEVEL = 1
+
+    def __init__(self, dfu, scratch):
+        self.dfu = dfu
+        self.scratch = scratch
+
+    @staticmethod
+    def is_blob_backed(matrix_data):
+        return bool(matrix_data.get('values_handle_ref'))
+
+    def save_values(self, values, name):
+        """
+        save_values: upload values matrix and return the blob backed matrix fields
+        """
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        file_path = os.path.join(self.scratch,
+                                 '{}_values_{}.{}'.format(name, uuid.uuid4(), VALUES_FORMAT))
+
+        logging.info('writing {} x {} values matrix to {}'.format(*values.shape, file_path))
+        with gzip.open(file_path, 'wb', compresslevel=self.COMPRESS_LEVEL) as values_file:
+            np.save(values_file, values, allow_pickle=False)
+
+        logging.info('uploading values file ({} bytes)'.format(os.path.getsize(file_path)))
+        shock_info = self.dfu.file_to_shock({'file_path': file_path, 'make_handle': 1})
+        os.remove(file_path)
+
+        return {'values_handle_ref': shock_info['handle']['hid'],
+                'values_format': VALUES_FORMAT}
+
+    def load_values(self, matrix_data):
+        """
+        load_values: values matrix of a FloatMatrix2D in either layout
+        """
+        if not self.is_blob_backed(matrix_data):
+            return matrix_data.get('values')
+
+        values_format = matrix_data.get('values_format', VALUES_FORMAT)
+        if values_format != VALUES_FORMAT:
+            raise ValueError('Unsupported matrix values format: {}'.format(values_format))
+
+        download_dir = os.path.join(self.scratch, 'matrix_values_' + str(uuid.uuid4()))
+        os.makedirs(download_dir)
+
+        file_path = self.dfu.shock_to_file({'handle_id': matrix_data['values_handle_ref'],
+                                            'file_path': download_dir})['file_path']
+
+        with gzip.open(file_path, 'rb') as values_file:
+            values = np.load(values_file, allow_pickle=False)
+        os.remove(file_path)
+
+        expected_shape = (len(matrix_data.get('row_ids', [])),
+                          len(matrix_data.get('col_ids', [])))
+        if values.shape != expected_shape:
+            raise ValueError('Matrix values shape {} does not match row/col ids {}'.format(
+                                                                values.shape, expected_shape))
+
+        return values
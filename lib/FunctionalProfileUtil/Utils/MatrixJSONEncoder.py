@@ -0,0 +1,507 @@
+import json
+import logging
+
+import numpy as np
+
+
+# float.__repr__ writes the shortest decimal that round-trips, which takes at most 17
+# significant digits. The vectorized path finds it by trying 15, 16 and 17 digits. 15 digit
+# mantissas are exact in float64. For 16 and 17 digits the value times a power of ten is
+# computed exactly as the unevaluated sum of two floats, which decides the rounding and the
+# round-trip exactly up to a margin of a few units in the last place of the remainder. The
+# rare values inside that margin, at a rounding tie or at the round-trip limit, fall back to
+# float.__repr__.
+_SIG_DIGITS = 17
+_DOUBLE_DIGITS = 15
+
+# decimal exponent range printed positionally by float.__repr__ (outside of it repr switches
+# to scientific notation, which is left to the fallback path)
+_MIN_EXP = -4
+_MAX_EXP = 15
+
+# widest float repr is '-2.2250738585072014e-308', widest separator is '], ['
+_VALUE_WIDTH = 24
+_SLOT_WIDTH = _VALUE_WIDTH + 4
+_SLOT_COLS = np.arange(_SLOT_WIDTH, dtype=np.int8)
+
+# per decimal exponent (offset by _MIN_EXP - 1): scale of the 15 digit mantissa and the exact
+# operations rebuilding the float from it
+_EXPS = np.arange(_MIN_EXP - 1, _MAX_EXP + 2)
+_MANTISSA_SCALE = np.array([10.0 ** (_DOUBLE_DIGITS - 1 - e) for e in _EXPS])
+_RECON_DIV = np.array([10.0 ** max(_DOUBLE_DIGITS - 1 - e, 0) for e in _EXPS])
+_RECON_MUL = np.array([10.0 ** max(e - _DOUBLE_DIGITS + 1, 0) for e in _EXPS])
+
+# powers of ten 10^0 .. 10^22, exact in float64, split in halves of 26 bits for exact products
+_POW10 = 10.0 ** np.arange(23)
+_SPLITTER = 2.0 ** 27 + 1
+_POW10_HIGH = _SPLITTER * _POW10 - (_SPLITTER * _POW10 - _POW10)
+_POW10_LOW = _POW10 - _POW10_HIGH
+# margin of the remainder of an exact product, which is at most 16 and rounded once
+_REMAINDER_MARGIN = 2.0 ** -40
+
+# the mantissa is split into four 5 digit chunks which are looked up in these tables, the
+# 17 digits of the mantissa are the last 17 of the 20 chunk digits
+_CHUNK = 10 ** 5
+_CHUNK_CHARS = np.frombuffer(b''.join(b'%05d' % i for i in range(_CHUNK)), dtype='S5')
+_CHUNK_TRAILING_ZEROS = np.array([5] + [len(str(i)) - len(str(i).rstrip('0'))
+                                        for i in range(1, _CHUNK)], dtype=np.int8)
+_CHUNK_DIGITS = 20
+_FIRST_DIGIT_COL = _CHUNK_DIGITS - _SIG_DIGITS
+
+# the mantissa digit columns are followed by '0', '.' and '-' columns to build layouts from
+_ZERO_COL = _CHUNK_DIGITS
+_POINT_COL = _CHUNK_DIGITS + 1
+_MINUS_COL = _CHUNK_DIGITS + 2
+_SOURCE_CHARS = np.frombuffer(b'0.-', dtype=np.uint8)
+
+
+def _positional_layout(exp):
+    """
+    _positional_layout: columns printing a mantissa of decimal exponent exp the way
+                        float.__repr__ does, and how many of them are fraction digits
+    """
+    digits = list(range(_FIRST_DIGIT_COL, _CHUNK_DIGITS))
+    if exp < 0:
+        fraction = [_ZERO_COL] * (-exp - 1) + digits
+        return [_ZERO_COL, _POINT_COL] + fraction, len(fraction)
+
+    integer = digits[:exp + 1] + [_ZERO_COL] * (exp + 1 - _SIG_DIGITS)
+    fraction = digits[exp + 1:] or [_ZERO_COL]
+    return integer + [_POINT_COL] + fraction, len(fraction)
+
+
+# layouts keyed by 2 * (exp - _MIN_EXP) + sign bit, followed by the keys for 0.0 and -0.0
+_LAYOUTS = []
+for _exp in range(_MIN_EXP, _MAX_EXP + 1):
+    _layout, _n_fraction = _positional_layout(_exp)
+    _LAYOUTS.append((np.array(_layout), _n_fraction))
+    _LAYOUTS.append((np.array([_MINUS_COL] + _layout), _n_fraction))
+_ZERO_KEY = len(_LAYOUTS)
+_LAYOUTS.append((np.array([_ZERO_COL, _POINT_COL, _ZERO_COL]), 1))
+_LAYOUTS.append((np.array([_MINUS_COL, _ZERO_COL, _POINT_COL, _ZERO_COL]), 1))
+_FALLBACK_KEY = len(_LAYOUTS)
+
+# integer valued matrices (counts) are written from Python ints by json.dumps, which is faster
+# than any digit layout for them
+_MAX_INTEGER = 2 ** 53
+
+# the values portion is spliced into the JSON produced for the rest of the object
+_VALUES_PLACEHOLDER = '__MatrixJSONEncoder_values__'
+
+
+class MatrixJSONEncoder:
+    """
+    Serializes KBaseProfile.FloatMatrix2D values (list<list<float>>) to JSON in bulk.
+
+    Values are formatted straight from a float64 NumPy buffer, a block of rows at a time,
+    instead of walking every float through the generic json encoder. The output is
+    byte-for-byte what json.dumps produces for the same nested lists (NaN/None as null),
+    except that matrices holding only integral values (counts) are written as integers.
+
+    Unrounded floats encode about twice as fast as json.dumps of their lists. Counts are left
+    to json.dumps of Python ints, block by block, which is as fast as it gets in Python.
+    """
+
+    def __init__(self, chunk_size=1 << 16, detect_integers=True):
+        # number of matrix cells formatted per block
+        self.chunk_size = chunk_size
+        self.detect_integers = detect_integers
+
+    @staticmethod
+    def _as_float_array(values):
+        try:
+            arr = np.asarray(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            return None
+
+        if arr.ndim != 2:
+            return None
+
+        return arr
+
+    @staticmethod
+    def is_integral(arr):
+        """
+        is_integral: check all non missing values of a float matrix are exact integers
+        """
+        with np.errstate(invalid='ignore'):
+            return bool(np.all(np.isnan(arr) |
+                               ((np.abs(arr) < _MAX_INTEGER) & (arr == np.rint(arr)))))
+
+    @staticmethod
+    def round_values(values, value_precision):
+        """
+        round_values: round values to value_precision significant digits
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            exp = np.floor(np.log10(np.abs(values)))
+        decimals = value_precision - 1 - np.where(np.isfinite(exp), exp, 0)
+
+        # scale by exact powers of ten (up to 10^22) so rounded values print with
+        # value_precision digits, values too small or large for that are rounded via a string
+        exact = np.abs(decimals) <= 22
+        scale_up = 10.0 ** np.where(exact, np.maximum(decimals, 0), 0)
+        scale_down = 10.0 ** np.where(exact, np.maximum(-decimals, 0), 0)
+        rounded = np.rint(values * scale_up / scale_down) / scale_up * scale_down
+
+        rounded[~exact] = np.char.mod('%.{}e'.format(value_precision - 1),
+                                      values[~exact]).astype(np.float64)
+
+        return rounded
+
+    @staticmethod
+    def _format_fallback(value):
+        if np.isnan(value):
+            return b'null'
+
+        return json.dumps(float(value)).encode('ascii')
+
+    @staticmethod
+    def _double_mantissa(abs_values, nonzero):
+        """
+        _double_mantissa: exponent index and 15 digit mantissa of every value, and whether
+                          the mantissa round-trips
+        """
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            exp = np.floor(np.log10(np.where(nonzero, abs_values, 1.0)))
+            exp_idx = np.clip(exp, _MIN_EXP - 1, _MAX_EXP + 1).astype(np.intp) - (_MIN_EXP - 1)
+
+            # log10 can land a decade off next to powers of ten and rounding can carry
+            mantissa = np.rint(abs_values * _MANTISSA_SCALE[exp_idx])
+            exp_idx += mantissa >= 10.0 ** _DOUBLE_DIGITS
+            exp_idx -= mantissa < 10.0 ** (_DOUBLE_DIGITS - 1)
+            np.clip(exp_idx, 0, len(_EXPS) - 1, out=exp_idx)
+            mantissa = np.rint(abs_values * _MANTISSA_SCALE[exp_idx])
+
+            # the mantissa and the power of ten are exact, so the rebuilt float is correctly
+            # rounded and equals the value exactly if the 15 digits round-trip
+            recon = mantissa / _RECON_DIV[exp_idx] * _RECON_MUL[exp_idx]
+
+        round_trips = (nonzero & (recon == abs_values) &
+                       (mantissa >= 10.0 ** (_DOUBLE_DIGITS - 1)) &
+                       (mantissa < 10.0 ** _DOUBLE_DIGITS))
+
+        return exp_idx + (_MIN_EXP - 1), mantissa, round_trips
+
+    @staticmethod
+    def _scaled(values, power):
+        """
+        _scaled: values * 10^power (power 0 to 22) split into the nearest integer and the exact
+                 remainder, which is rounded once
+        """
+        # Dekker's product: values * 10^power == high + low exactly
+        high = values * _POW10[power]
+        split = _SPLITTER * values
+        values_high = split - (split - values)
+        values_low = values - values_high
+        low = (((values_high * _POW10_HIGH[power] - high) + values_high * _POW10_LOW[power] +
+                values_low * _POW10_HIGH[power]) + values_low * _POW10_LOW[power])
+
+        integer = np.rint(high)
+        return integer, (high - integer) + low
+
+    @classmethod
+    def _extended_mantissa(cls, abs_values, exp):
+        """
+        _extended_mantissa: exponent and 17 digit mantissa of the nearest 16 or 17 digit
+                            decimal of every value that round-trips, and which values could not
+                            be decided
+        """
+        exp = np.clip(exp, _MIN_EXP - 1, _MAX_EXP)
+
+        # settle the exponent on the 17 digit mantissa
+        integer, remainder = cls._scaled(abs_values, _SIG_DIGITS - 1 - exp)
+        mantissa = integer.astype(np.int64) + np.rint(remainder).astype(np.int64)
+        exp = exp + (mantissa >= 10 ** _SIG_DIGITS) - (mantissa < 10 ** (_SIG_DIGITS - 1))
+        exp = np.clip(exp, _MIN_EXP - 1, _MAX_EXP)
+
+        # a decimal round-trips if it is closer to the value than half the distance to the next
+        # float, a quarter of it below powers of two
+        half_ulp = np.spacing(abs_values) / 2
+        power_of_two = np.frexp(abs_values)[0] == 0.5
+
+        mantissa = np.zeros(abs_values.size, dtype=np.int64)
+        final_exp = exp.copy()
+        undecided = np.ones(abs_values.size, dtype=bool)
+        ambiguous = np.zeros(abs_values.size, dtype=bool)
+        for digits in [_SIG_DIGITS - 1, _SIG_DIGITS]:
+            power = digits - 1 - exp
+            integer, remainder = cls._scaled(abs_values, power)
+            rounded = np.rint(remainder)
+            distance = np.abs(remainder - rounded)
+            limit = half_ulp * _POW10[power]
+            limit = np.where(power_of_two & (rounded < remainder), limit / 2, limit)
+
+            round_trips = distance < limit - _REMAINDER_MARGIN
+            unsure = ((np.abs(distance - 0.5) < _REMAINDER_MARGIN) |
+                      ~(round_trips | (distance > limit + _REMAINDER_MARGIN)))
+            if digits < _SIG_DIGITS:
+                # below a power of two, repr may pick a 16 digit decimal that is not the nearest
+                unsure |= power_of_two & ~round_trips
+            else:
+                unsure |= ~round_trips
+
+            ambiguous |= undecided & unsure
+            done = undecided & round_trips & ~unsure
+            digit_mantissa = integer.astype(np.int64) + rounded.astype(np.int64)
+            carry = digit_mantissa >= 10 ** digits
+            digit_mantissa[carry] = 10 ** (digits - 1)
+            mantissa[done] = digit_mantissa[done] * 10 ** (_SIG_DIGITS - digits)
+            final_exp[done] = exp[done] + carry[done]
+            undecided &= ~(done | unsure)
+
+        return final_exp, mantissa.astype(np.uint64), ambiguous
+
+    @classmethod
+    def _float_layout_keys(cls, flat):
+        """
+        _float_layout_keys: layout key of every value and its 17 digit mantissa, such that
+                            |value| ~= mantissa * 10^(exp - 16)
+        """
+        abs_values = np.abs(flat)
+        nonzero = np.isfinite(flat) & (abs_values != 0)
+        negative = np.signbit(flat)
+
+        exp, double_mantissa, positional = cls._double_mantissa(abs_values, nonzero)
+        mantissa = (np.where(positional, double_mantissa, 0).astype(np.uint64) *
+                    np.uint64(10 ** (_SIG_DIGITS - _DOUBLE_DIGITS)))
+
+        # values with a decimal exponent next to the positional range, the others are written
+        # in scientific notation anyway
+        extended = np.flatnonzero(nonzero & ~positional & (abs_values >= 10.0 ** (_MIN_EXP - 1)) &
+                                  (abs_values < 10.0 ** (_MAX_EXP + 1)))
+        if extended.size:
+            extended_exp, extended_mantissa, ambiguous = cls._extended_mantissa(
+                                                            abs_values[extended], exp[extended])
+            decided = extended[~ambiguous]
+            exp[decided] = extended_exp[~ambiguous]
+            mantissa[decided] = extended_mantissa[~ambiguous]
+            positional[decided] = True
+
+        positional &= (exp >= _MIN_EXP) & (exp <= _MAX_EXP)
+
+        layout_key = np.full(flat.size, _FALLBACK_KEY, dtype=np.int8)
+        layout_key[positional] = 2 * (exp[positional] - _MIN_EXP) + negative[positional]
+        zero = abs_values == 0
+        layout_key[zero] = _ZERO_KEY + negative[zero]
+
+        return layout_key, np.where(positional, mantissa, 0)
+
+    @staticmethod
+    def _float_digits(mantissa):
+        """
+        _float_digits: layout source columns and trailing zero count of the mantissas
+        """
+        chunks = list()
+        for _ in range(_CHUNK_DIGITS // 5):
+            chunks.append((mantissa % _CHUNK).astype(np.intp))
+            mantissa = mantissa // _CHUNK
+        chunks.reverse()
+
+        source = np.empty((len(chunks[0]), _CHUNK_DIGITS + len(_SOURCE_CHARS)), dtype=np.uint8)
+        digits = np.ndarray((source.shape[0], len(chunks)), dtype='S5', buffer=source,
+                            strides=(source.strides[0], 5))
+        for i, chunk in enumerate(chunks):
+            digits[:, i] = _CHUNK_CHARS[chunk]
+        source[:, _CHUNK_DIGITS:] = _SOURCE_CHARS
+
+        # zero chunks pass on to the trailing zeros of the chunk before them
+        trailing_zeros = np.zeros(source.shape[0], dtype=np.int8)
+        all_zero = np.ones(source.shape[0], dtype=bool)
+        for chunk in reversed(chunks):
+            trailing_zeros += all_zero * _CHUNK_TRAILING_ZEROS[chunk]
+            all_zero &= chunk == 0
+
+        return source, trailing_zeros
+
+    @staticmethod
+    def _integral_rows(arr):
+        """
+        _integral_rows: nested lists of the ints of an integral float matrix, None for missing
+        """
+        missing = np.isnan(arr)
+        if not missing.any():
+            return arr.astype(np.int64).tolist()
+
+        rows = np.where(missing, 0, arr).astype(np.int64).astype(object)
+        rows[missing] = None
+        return rows.tolist()
+
+    @classmethod
+    def _format_int_block(cls, block, last_block):
+        """
+        _format_int_block: format a 2D block of integral values as JSON rows joined by '], ['
+        """
+        # strip the outer '[[' and ']]', the rows are joined to those of the other blocks
+        encoded = json.dumps(cls._integral_rows(block))[2:-2]
+        if not last_block:
+            encoded += '], ['
+
+        return encoded.encode('ascii')
+
+    @classmethod
+    def _format_block(cls, block, last_block):
+        """
+        _format_block: format a 2D float64 block as JSON rows joined by '], ['
+
+        every value is written left aligned into a fixed width slot followed by its separator.
+        Values sharing a decimal exponent and sign share one column layout, so each group is
+        built with a single gather. The unused tail of every slot is
+        then masked out and the slots are compacted in one pass.
+        """
+        n_rows, n_cols = block.shape
+        flat = block.ravel()
+        n_values = flat.size
+
+        layout_key, mantissa = cls._float_layout_keys(flat)
+
+        # values are formatted grouped by layout, then scattered back into their slots
+        order = np.argsort(layout_key, kind='stable')
+        group_ends = np.cumsum(np.bincount(layout_key, minlength=len(_LAYOUTS) + 1))
+        source, strippable = cls._float_digits(mantissa[order])
+
+        sorted_chars = np.empty((n_values, _SLOT_WIDTH), dtype=np.uint8)
+        sorted_len = np.empty(n_values, dtype=np.int8)
+
+        group_start = 0
+        for key, group_end in enumerate(group_ends):
+            if group_end == group_start:
+                continue
+            group = slice(group_start, group_end)
+            group_start = group_end
+
+            if key == len(_LAYOUTS):
+                # values the vectorized layouts do not cover are formatted one by one
+                fallback = [cls._format_fallback(flat[i]) for i in order[group]]
+                sorted_chars[group, :_VALUE_WIDTH] = np.array(
+                    fallback, dtype='S{}'.format(_VALUE_WIDTH)).view(np.uint8).reshape(
+                        -1, _VALUE_WIDTH)
+                sorted_len[group] = [len(value) for value in fallback]
+                continue
+
+            # trailing zeros of the fraction are dropped, keeping at least one digit
+            layout, n_fraction = _LAYOUTS[key]
+            sorted_chars[group, :len(layout)] = np.take(source[group], layout, axis=1)
+            sorted_len[group] = len(layout) - np.minimum(strippable[group], n_fraction - 1)
+
+        chars = np.empty((n_values, _SLOT_WIDTH), dtype=np.uint8)
+        chars[order] = sorted_chars
+        value_len = np.empty(n_values, dtype=np.int8)
+        value_len[order] = sorted_len
+
+        # separators: ', ' between values and '], [' between rows
+        slot_start = np.arange(0, n_values * _SLOT_WIDTH, _SLOT_WIDTH)
+        sep_start = slot_start + value_len
+        flat_chars = chars.reshape(-1)
+        flat_chars[sep_start] = ord(',')
+        flat_chars[sep_start + 1] = ord(' ')
+        sep_len = np.full(n_values, 2, dtype=np.int8)
+
+        row_end = sep_start[n_cols - 1::n_cols]
+        for offset, char in enumerate(b'], ['):
+            flat_chars[row_end + offset] = char
+        sep_len[n_cols - 1::n_cols] = 4
+        if last_block:
+            sep_len[-1] = 0
+
+        mask = _SLOT_COLS < (value_len + sep_len)[:, np.newaxis]
+
+        return chars[mask].tobytes()
+
+    def _iterencode_rows(self, arr, integral):
+        n_rows, n_cols = arr.shape
+
+        if n_rows == 0:
+            yield b'[]'
+            return
+
+        if n_cols == 0:
+            yield b'[' + b', '.join([b'[]'] * n_rows) + b']'
+            return
+
+        rows_per_block = max(1, self.chunk_size // n_cols)
+        format_block = self._format_int_block if integral else self._format_block
+
+        yield b'[['
+        for start in range(0, n_rows, rows_per_block):
+            end = min(start + rows_per_block, n_rows)
+            yield format_block(arr[start:end], end == n_rows)
+        yield b']]'
+
+    def iterencode_values(self, values):
+        """
+        iterencode_values: yield the JSON encoding of a 2D values matrix as bytes chunks
+        """
+        arr = self._as_float_array(values)
+
+        if arr is None:
+            logging.info('values are not a numeric matrix, using generic JSON encoder')
+            yield json.dumps(values.tolist() if isinstance(values, np.ndarray)
+                             else values).encode('utf-8')
+            return
+
+        integral = self.detect_integers and self.is_integral(arr)
+        if integral:
+            logging.info('all profile values are integers, serializing them as integers')
+
+        yield from self._iterencode_rows(arr, integral)
+
+    def values_to_list(self, values):
+        """
+        values_to_list: convert a values matrix to nested lists the SDK clients can serialize
+
+        missing values become None and integral matrices hold ints, as in iterencode_values
+        """
+        arr = self._as_float_array(values)
+
+        if arr is None:
+            return values.tolist() if isinstance(values, np.ndarray) else values
+
+        if self.detect_integers and self.is_integral(arr):
+            return self._integral_rows(arr)
+
+        list_values = arr.astype(object)
+        list_values[np.isnan(arr)] = None
+
+        return list_values.tolist()
+
+    def iterencode(self, func_profile_data, sort_keys=False):
+        """
+        iterencode: yield the JSON encoding of a FunctionalProfile object as bytes chunks
+
+        everything but data['values'] goes through json.dumps, a values matrix is spliced in.
+        values lists, e.g. from values_to_list, are written by json.dumps as they are
+        """
+        data = func_profile_data.get('data')
+        if not isinstance(data, dict) or not isinstance(data.get('values'), np.ndarray):
+            yield json.dumps(func_profile_data, sort_keys=sort_keys).encode('utf-8')
+            return
+
+        values = data['values']
+        shallow_data = dict(data)
+        shallow_data['values'] = _VALUES_PLACEHOLDER
+        shallow_obj = dict(func_profile_data)
+        shallow_obj['data'] = shallow_data
+
+        encoded = json.dumps(shallow_obj, sort_keys=sort_keys)
+        head, tail = encoded.split(json.dumps(_VALUES_PLACEHOLDER), 1)
+
+        yield head.encode('utf-8')
+        yield from self.iterencode_values(values)
+        yield tail.encode('utf-8')
+
+    def dumps(self, func_profile_data):
+        return b''.join(self.iterencode(func_profile_data))
+
+    def dump(self, func_profile_data, fp):
+        """
+        dump: write the JSON encoding of a FunctionalProfile object to a binary file object
+
+        returns the number of bytes written
+        """
+        size = 0
+        for chunk in self.iterencode(func_profile_data):
+            fp.write(chunk)
+            size += len(chunk)
+
+        return size
@@ -0,0 +1,87 @@
+import os
+import re
+
+SIZE_UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+# projected resident memory per matrix cell of the import stages that are not streamed
+STAGE_BYTES_PER_CELL = {
+    # pandas parse buffers plus the parsed frame
+    'parse': {True: 16, False: 120},
+    # python float objects and list slots of values_to_list for inline objects
+    'list_conversion': {True: 32, False: 0},
+    # loaded values, reordered heatmap copy and float32 table blocks
+    'report': {True: 32, False: 32},
+}
+
+
+def current_rss():
+    """
+    current_rss: resident set size of this process in bytes, 0 where /proc is not available
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def format_size(size_bytes):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_bytes < 1024 or unit == 'GB':
+            return '{:.1f} {}'.format(size_bytes, unit)
+        size_bytes /= 1024.0
+
+
+class MemoryBudget:
+    """
+    MemoryBudget: projected memory footprint of import stages checked against a process budget
+
+    the budget (import-memory-budget in deploy.cfg, e.g. 4G) bounds the resident memory of the
+    process. stages that would exceed it switch to their streaming strategy or fail before
+    allocating. without a budget every stage fits.
+    """
+
+    def __init__(self, budget=None):
+        self.budget = self.parse_size(budget)
+
+    @staticmethod
+    def parse_size(size):
+        """
+        parse_size: bytes of a size like 4G, 512M or 1048576, None for an empty size
+        """
+        if size is None or isinstance(size, int):
+            return size or None
+
+        match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$', str(size), re.IGNORECASE)
+        if not match:
+            if not str(size).strip():
+                return None
+            raise ValueError('Invalid memory budget: {}'.format(size))
+
+        return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()]) or None
+
+    @staticmethod
+    def project(stage, n_cells, numeric=True):
+        """
+        project: projected bytes stage allocates for a matrix of n_cells
+        """
+        return int(STAGE_BYTES_PER_CELL[stage][bool(numeric)] * n_cells)
+
+    def fits(self, projected_bytes):
+        if self.budget is None:
+            return True
+
+        return current_rss() + projected_bytes <= self.budget
+
+    def require(self, stage, projected_bytes):
+        """
+        require: raise if stage does not fit into the budget
+        """
+        if self.fits(projected_bytes):
+            return
+
+        raise ValueError('Importing this profile needs about {} of memory for the {} stage on top '
+                         'of the {} in use, more than the {} memory budget of this '
+                         'service'.format(format_size(projected_bytes), stage,
+                                          format_size(current_rss()),
+                                          format_size(self.budget)))
@@ -1,24 +1,42 @@
 
 import errno
+import hashlib
 import logging
 import os
+import numpy as np
 import pandas as pd
 from xlrd.biffh import XLRDError
 import uuid
-import shutil
 import math
-import json
 
 from installed_clients.DataFileUtilClient import DataFileUtil
 from installed_clients.KBaseReportClient import KBaseReport
-from installed_clients.kb_GenericsReportClient import kb_GenericsReport
 from installed_clients.GenericsAPIClient import GenericsAPI
 from installed_clients.WsLargeDataIOClient import WsLargeDataIO
+from installed_clients.WorkspaceClient import Workspace
+from FunctionalProfileUtil.Utils.MatrixJSONEncoder import MatrixJSONEncoder
+from FunctionalProfileUtil.Utils.LazyLoader import lazy_property, preload
+from FunctionalProfileUtil.Utils.MatrixBlobStore import MatrixBlobStore
+from FunctionalProfileUtil.Utils.MemoryBudget import MemoryBudget
+from FunctionalProfileUtil.Utils.HeatmapClusterer import HeatmapClusterer
+from FunctionalProfileUtil.Utils.HeatmapTiler import HeatmapTiler
+from FunctionalProfileUtil.Utils.ProfileStats import ProfileStats
+from FunctionalProfileUtil.Utils.ProfileTableBuilder import ProfileTableBuilder
+from FunctionalProfileUtil.Utils.ReportPackager import ReportPackager
+from FunctionalProfileUtil.Utils.ReportRenderer import ReportRenderer, ReportTab
+from FunctionalProfileUtil.Utils.ReportWorker import ReportWorker
+from FunctionalProfileUtil.Utils.ServiceMetrics import record_cache
+from FunctionalProfileUtil.Utils.StageTracer import StageTracer, traced
+from FunctionalProfileUtil.Utils.ImportScheduler import ImportScheduler
+from FunctionalProfileUtil.Utils.ImportPlanner import (ImportPlanner, INLINE_LAYOUT,
+                                                       LARGE_DATA_LAYOUT, BLOB_LAYOUT)
 
 
 DATA_EPISTEMOLOGY = ['measured', 'asserted', 'predicted']
 PROFILE_CATEGORY = ['community',  'organism']
 PROFILE_TYPE = ['amplicon', 'mg', 'modelset']
+MAX_VALUE_PRECISION = 15
+CONTENT_HASH_META_KEY = 'content_hash'
 
 
 class ProfileImporter:
@@ -63,24 +81,78 @@ class ProfileImporter:
         return "%s %s" % (s, size_name[i])
 
     def _calculate_object_size(self, func_profile_data):
+        """
+        _calculate_object_size: serialized JSON size and canonical content hash of the object
+
+        both come from a single pass over the sorted-keys encoding, which has the same size as
+        the encoding that gets saved
+        """
         json_size = 0
+        content_hash = None
         try:
             logging.info('start calculating object size')
-            json_object = json.dumps(func_profile_data).encode("utf-8")
-            json_size = len(json_object)
+            with self.tracer.span('serialize_profile') as span:
+                sha256 = hashlib.sha256()
+                for chunk in self.json_encoder.iterencode(func_profile_data, sort_keys=True):
+                    sha256.update(chunk)
+                    json_size += len(chunk)
+                content_hash = sha256.hexdigest()
+                span.add_bytes(json_size)
             size_str = self._convert_size(json_size)
             logging.info('serialized object JSON size: {}'.format(size_str))
         except Exception:
             logging.info('failed to calculate object size')
 
-        return json_size
+        return json_size, content_hash
+
+    def _fetch_saved_profile(self, workspace_id, func_profile_obj_name, content_hash):
+        """
+        _fetch_saved_profile: ref of the latest version of func_profile_obj_name if it holds
+                              the same content, otherwise None
+        """
+        if not content_hash:
+            return None
+
+        # workspace ids may come in as digit strings, e.g. from the narrative
+        if isinstance(workspace_id, str) and workspace_id.isdigit():
+            workspace_id = int(workspace_id)
+
+        if isinstance(workspace_id, int):
+            obj_spec = {'wsid': workspace_id, 'name': func_profile_obj_name}
+        else:
+            obj_spec = {'workspace': workspace_id, 'name': func_profile_obj_name}
+
+        try:
+            info = self.ws.get_object_info3({'objects': [obj_spec],
+                                             'includeMetadata': 1,
+                                             'ignoreErrors': 1})['infos'][0]
+        except Exception as e:
+            logging.warning('failed to look up existing object {}: {}'.format(
+                                                                func_profile_obj_name, e))
+            return None
+
+        if not info or not info[2].startswith('KBaseProfile.FunctionalProfile'):
+            return None
+
+        if (info[10] or {}).get(CONTENT_HASH_META_KEY) != content_hash:
+            return None
+
+        return "%s/%s/%s" % (info[6], info[0], info[4])
 
     @staticmethod
-    def _file_to_df(file_path):
+    def _file_to_df(file_path, sep=None):
         logging.info('start parsing file content to data frame')
 
         try:
-            df = pd.read_excel(file_path, sheet_name='data', index_col=0)
+            if sep:
+                # text file with separator already detected by the import planner
+                try:
+                    df = pd.read_csv(file_path, sep=sep, index_col=0)
+                except Exception:
+                    err_msg = 'Cannot parse file. Please provide valide tsv, excel or csv file'
+                    raise ValueError(err_msg)
+            else:
+                df = pd.read_excel(file_path, sheet_name='data', index_col=0)
 
         except XLRDError:
             try:
@@ -102,30 +174,91 @@ class ProfileImporter:
         df.columns = df.columns.astype('str')
 
         # fill NA with "None" so that they are properly represented as nulls in the KBase Object
-        df = df.where((pd.notnull(df)), None)
+        # numeric profiles keep NaN, which becomes null once the values are serialized
+        if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in df.dtypes):
+            df = df.where((pd.notnull(df)), None)
 
         # df = df.applymap(str)
 
         return df
 
-    def _save_func_profile(self, workspace_id, func_profile_data, func_profile_obj_name):
-        logging.info('start saving FunctionalProfile object: {}'.format(func_profile_obj_name))
+    def _profile_values(self, df, value_precision=None):
+        """
+        _profile_values: profile values as a float64 matrix (NaN for missing values)
+        """
+        try:
+            values = np.asarray(df.values, dtype=np.float64)
+        except (TypeError, ValueError):
+            logging.warning('profile contains non numeric values, keeping values as parsed')
+            return df.values.tolist()
+
+        if value_precision:
+            logging.info('rounding values to {} significant digits'.format(value_precision))
+            values = self.json_encoder.round_values(values, value_precision)
 
-        obj_size = self._calculate_object_size(func_profile_data)
+        return values
 
-        MB_200 = 200 * 1024 * 1024
-        GB_1 = 1 * 1024 * 1024 * 1024
+    @traced('save_profile')
+    def _save_func_profile(self, workspace_id, func_profile_data, func_profile_obj_name,
+                           import_plan=None):
+        logging.info('start saving FunctionalProfile object: {}'.format(func_profile_obj_name))
 
-        if obj_size > GB_1:
-            raise ValueError('Object is too large')
-        elif obj_size <= MB_200:
+        values = func_profile_data['data']['values']
+        numeric = isinstance(values, np.ndarray)
+        list_fits = numeric and self.memory_budget.fits(
+                            self.memory_budget.project('list_conversion', np.size(values)))
+        import_plan = import_plan or dict()
+        planned_layout = import_plan.get('layout', INLINE_LAYOUT)
+
+        obj_data = dict(func_profile_data)
+        obj_data['data'] = dict(func_profile_data['data'])
+        if list_fits and planned_layout == INLINE_LAYOUT:
+            # values of objects planned inline are converted to lists once, their size and hash
+            # are measured on the lists that get saved
+            obj_data['data']['values'] = self.json_encoder.values_to_list(values)
+
+        obj_size, content_hash = self._calculate_object_size(obj_data)
+
+        saved_ref = self._fetch_saved_profile(workspace_id, func_profile_obj_name, content_hash)
+        if content_hash:
+            record_cache('saved_profile', saved_ref is not None)
+        if saved_ref:
+            logging.info('{} already holds identical content, skip saving'.format(saved_ref))
+            return saved_ref
+
+        obj_meta = {CONTENT_HASH_META_KEY: content_hash} if content_hash else {}
+
+        if import_plan.get('exact'):
+            # the plan sampled the whole file, its layout holds
+            layout = planned_layout
+        else:
+            # the plan extrapolated from the leading rows, the measured size decides
+            layout = ImportPlanner.choose_layout(obj_size, numeric)
+        if layout == INLINE_LAYOUT and numeric and not list_fits:
+            logging.info('values list does not fit into the memory budget, streaming object')
+            layout = LARGE_DATA_LAYOUT
+        logging.info('saving object with {} layout'.format(layout))
+
+        if layout == BLOB_LAYOUT:
+            logging.info('Starting uploading values matrix to blobstore')
+            # values stays an empty list, so the object is valid for readers of values
+            obj_data['data']['values'] = []
+            obj_data['data'].update(self.blob_store.save_values(values, func_profile_obj_name))
+        elif layout == INLINE_LAYOUT and numeric and obj_data['data']['values'] is values:
+            obj_data['data']['values'] = self.json_encoder.values_to_list(values)
+        elif layout == LARGE_DATA_LAYOUT:
+            # the streaming encoder writes the values straight from the matrix
+            obj_data['data']['values'] = values
+
+        if layout in (INLINE_LAYOUT, BLOB_LAYOUT):
             logging.info('Starting saving object via DataFileUtil')
             info = self.dfu.save_objects({
                 "id": workspace_id,
                 "objects": [{
                     "type": 'KBaseProfile.FunctionalProfile',
-                    "data": func_profile_data,
-                    "name": func_profile_obj_name
+                    "data": obj_data,
+                    "name": func_profile_obj_name,
+                    "meta": obj_meta
                 }]
             })[0]
         else:
@@ -133,14 +266,17 @@ class ProfileImporter:
             data_path = os.path.join(self.scratch,
                                      func_profile_obj_name + "_" + str(uuid.uuid4()) + ".json")
             logging.info('Dumpping object data to file: {}'.format(data_path))
-            json.dump(func_profile_data, open(data_path, 'w'))
+            with self.tracer.span('dump_profile_json') as span, \
+                    open(data_path, 'wb') as data_file:
+                span.add_bytes(self.json_encoder.dump(obj_data, data_file))
 
             info = self.ws_large_data.save_objects({
                 "id": workspace_id,
                 "objects": [{
                     "type": 'KBaseProfile.FunctionalProfile',
                     "data_json_file": data_path,
-                    "name": func_profile_obj_name
+                    "name": func_profile_obj_name,
+                    "meta": obj_meta
                 }]
             })[0]
 
@@ -148,80 +284,60 @@ class ProfileImporter:
 
         return obj_ref
 
-    def _generate_visualization_content(self, func_profile_ref, output_directory):
-        func_profile_data = self.dfu.get_objects(
-                                            {'object_refs': [func_profile_ref]})['data'][0]['data']
+    def _generate_report_tabs(self, func_profile_ref, output_directory):
+        func_profile_obj = self.dfu.get_objects({'object_refs': [func_profile_ref]})['data'][0]
+        func_profile_data = func_profile_obj['data']
+        content_hash = (func_profile_obj['info'][10] or {}).get(CONTENT_HASH_META_KEY)
 
         data = func_profile_data.get('data')
-        data_df = pd.DataFrame(data['values'],
-                               index=data['row_ids'], columns=data['col_ids'])
+        with self.tracer.span('load_values') as span:
+            data_df = pd.DataFrame(self.blob_store.load_values(data),
+                                   index=data['row_ids'], columns=data['col_ids'])
+            span.add_bytes(data_df.values.nbytes)
+
+        with self.tracer.span('profile_stats'):
+            row_stats, col_stats = self.profile_stats.summarize(data_df.values)
+            row_stats_pages = self.profile_stats.write_stats_pages(row_stats, data_df.index,
+                                                                   output_directory, 'row_stats')
+            col_stats_pages = self.profile_stats.write_stats_pages(col_stats, data_df.columns,
+                                                                   output_directory, 'col_stats')
+
+        with self.tracer.span('profile_table'):
+            table_page = self.profile_table_builder.build_table(data_df.values,
+                                                                data_df.index.tolist(),
+                                                                data_df.columns.tolist(),
+                                                                output_directory)
 
         data_df.fillna(0, inplace=True)
-        tsv_file_path = os.path.join(output_directory, 'heatmap_data_{}.tsv'.format(
-                                                                    str(uuid.uuid4())))
-        data_df.to_csv(tsv_file_path)
-        heatmap_dir = self.report_util.build_heatmap_html({
-                                            'tsv_file_path': tsv_file_path,
-                                            'cluster_data': True})['html_dir']
-
-        row_data_summary = data_df.T.describe().to_string()
-        col_data_summary = data_df.describe().to_string()
-
-        tab_def_content = ''
-        tab_content = ''
-
-        # build data summary page
-        viewer_name = 'data_summary'
-        tab_def_content += '''\n<div class="tab">\n'''
-        tab_def_content += '''\n<button class="tablinks" '''
-        tab_def_content += '''onclick="openTab(event, '{}')"'''.format(viewer_name)
-        tab_def_content += ''' id="defaultOpen"'''
-        tab_def_content += '''>Profile Statistics</button>\n'''
-
-        tab_content += '''\n<div id="{}" class="tabcontent" style="overflow:auto">'''.format(viewer_name)
-        tab_content += '''\n<h5>Profile Size: {} x {}</h5>'''.format(len(data_df.index),
-                                                                     len(data_df.columns))
-        tab_content += '''\n<h5>Row Aggregating Statistics</h5>'''
-        html = '''\n<pre class="tab">''' + str(row_data_summary).replace("\n", "<br>") + "</pre>"
-        tab_content += html
-        tab_content += '''\n<br>'''
-        tab_content += '''\n<hr style="height:2px;border-width:0;color:gray;background-color:gray">'''
-        tab_content += '''\n<br>'''
-        tab_content += '''\n<h5>Column Aggregating Statistics</h5>'''
-        html = '''\n<pre class="tab">''' + str(col_data_summary).replace("\n", "<br>") + "</pre>"
-        tab_content += html
-        tab_content += '\n</div>\n'
-
-        # build profile heatmap page
-        viewer_name = 'ProfileHeatmapViewer'
-        tab_def_content += '''\n<button class="tablinks" '''
-        tab_def_content += '''onclick="openTab(event, '{}')"'''.format(viewer_name)
-        tab_def_content += '''>Profile Heatmap</button>\n'''
-
-        heatmap_report_files = os.listdir(heatmap_dir)
 
         heatmap_index_page = None
-        for heatmap_report_file in heatmap_report_files:
-            if heatmap_report_file.endswith('.html'):
-                heatmap_index_page = heatmap_report_file
-
-            shutil.copy2(os.path.join(heatmap_dir, heatmap_report_file),
-                         output_directory)
+        if data_df.size:
+            with self.tracer.span('cluster_heatmap'):
+                clustering = self.heatmap_clusterer.cluster(data_df.values,
+                                                            content_hash=content_hash)
+            if clustering is not None:
+                data_df = data_df.iloc[clustering['row_order'], clustering['col_order']]
+            with self.tracer.span('tile_heatmap'):
+                heatmap_index_page = self.heatmap_tiler.build_heatmap(data_df.values,
+                                                                      data_df.index.tolist(),
+                                                                      data_df.columns.tolist(),
+                                                                      output_directory)
+
+        tabs = [ReportTab('data_summary', 'Profile Statistics', 'stats_tab.html',
+                          {'n_rows': len(data_df.index), 'n_cols': len(data_df.columns),
+                           'row_stats_pages': row_stats_pages,
+                           'col_stats_pages': col_stats_pages}),
+                ReportTab('ProfileTableViewer', 'Profile Table', 'iframe_tab.html',
+                          {'page': table_page})]
 
         if heatmap_index_page:
-            tab_content += '''\n<div id="{}" class="tabcontent">'''.format(viewer_name)
-            tab_content += '\n<iframe height="1300px" width="100%" '
-            tab_content += 'src="{}" '.format(heatmap_index_page)
-            tab_content += 'style="border:none;"></iframe>'
-            tab_content += '\n</div>\n'
+            tabs.append(ReportTab('ProfileHeatmapViewer', 'Profile Heatmap', 'iframe_tab.html',
+                                  {'page': heatmap_index_page}))
         else:
-            tab_content += '''\n<div id="{}" class="tabcontent">'''.format(viewer_name)
-            tab_content += '''\n<p style="color:red;" >'''
-            tab_content += '''Heatmap is too large to be displayed.</p>\n'''
-            tab_content += '\n</div>\n'
+            tabs.append(ReportTab('ProfileHeatmapViewer', 'Profile Heatmap', 'message_tab.html',
+                                  {'message': 'Profile is empty, no heatmap to display.'}))
 
-        tab_def_content += '\n</div>\n'
-        return tab_def_content + tab_content
+        return tabs
 
     def _generate_html_report(self, func_profile_ref):
 
@@ -235,20 +351,14 @@ class ProfileImporter:
         self._mkdir_p(output_directory)
         result_file_path = os.path.join(output_directory, 'func_profile_viewer_report.html')
 
-        visualization_content = self._generate_visualization_content(func_profile_ref,
-                                                                     output_directory)
+        report_tabs = self._generate_report_tabs(func_profile_ref, output_directory)
+        with self.tracer.span('render_report'):
+            self.report_renderer.render_report(result_file_path, report_tabs)
 
-        with open(result_file_path, 'w') as result_file:
-            with open(os.path.join(os.path.dirname(__file__),
-                                   'templates', 'func_profile_template.html'),
-                      'r') as report_template_file:
-                report_template = report_template_file.read()
-                report_template = report_template.replace('<p>Visualization_Content</p>',
-                                                          visualization_content)
-                result_file.write(report_template)
-
-        report_shock_id = self.dfu.file_to_shock({'file_path': output_directory,
-                                                  'pack': 'zip'})['shock_id']
+        with self.tracer.span('pack_report') as span:
+            report_zip_path = ReportPackager.pack(output_directory, output_directory + '.zip')
+            span.add_bytes(os.path.getsize(report_zip_path))
+        report_shock_id = self.dfu.file_to_shock({'file_path': report_zip_path})['shock_id']
 
         html_report.append({'shock_id': report_shock_id,
                             'name': os.path.basename(result_file_path),
@@ -257,6 +367,7 @@ class ProfileImporter:
                             })
         return html_report
 
+    @traced('build_report')
     def _gen_func_profile_report(self, func_profile_ref, workspace_id):
         logging.info('start generating report')
 
@@ -272,28 +383,31 @@ class ProfileImporter:
                          'html_window_height': 1400,
                          'report_object_name': 'func_profile_viewer_' + str(uuid.uuid4())}
 
-        kbase_report_client = KBaseReport(self.callback_url, token=self.token)
+        kbase_report_client = self.tracer.trace_client(KBaseReport(self.callback_url,
+                                                                   token=self.token),
+                                                       'KBaseReport')
         output = kbase_report_client.create_extended_report(report_params)
 
         report_output = {'report_name': output['name'], 'report_ref': output['ref']}
 
         return report_output
 
-    def _build_profile_data(self, profile_file_path, item_ids, profile_category, staging_file=False):
-
-        if not profile_file_path:
-            raise ValueError('Missing profile file path')
-
-        logging.info('start reading {}'.format(os.path.basename(profile_file_path)))
-        if staging_file:
-            logging.info('start downloading staging file')
-            download_staging_file_params = {'staging_file_subdir_path': profile_file_path}
-            profile_file_path = self.dfu.download_staging_file(
-                                                download_staging_file_params).get('copy_file_path')
-
-        df = self._file_to_df(profile_file_path)
+    def _gen_admitted_report(self, report_cost, user_id, func_profile_ref, workspace_id):
+        """
+        _gen_admitted_report: build a background report once it fits the host budget, which it
+                              holds while the report is built. a report that does not fit the
+                              memory budget of this service ends its job in the error state
+        """
+        with self.import_scheduler.admit(report_cost, user_id=user_id):
+            self.memory_budget.require('report', report_cost.memory)
+            return self._gen_func_profile_report(func_profile_ref, workspace_id)
 
-        # check base object contains all items from function profile file
+    @traced('validate_ids')
+    def _match_item_ids(self, df, item_ids, profile_category):
+        """
+        _match_item_ids: check base object contains all items from function profile file,
+                         transposing the profile if the items are on the other axis
+        """
         if profile_category == 'community' and item_ids is not None:
             unmatched_ids = set(df.columns) - set(item_ids)
             if unmatched_ids:
@@ -331,14 +445,51 @@ class ProfileImporter:
                     err_msg = 'Matrix row does not contain all data ids from profile file'
                     raise ValueError(err_msg)
 
-        profile_data = {'row_ids': df.index.tolist(),
-                        'col_ids': df.columns.tolist(),
-                        'values': df.values.tolist()}
+        return df
+
+    def _fetch_profile_file(self, profile_file_path, staging_file=False):
+        """
+        _fetch_profile_file: local path of the profile file, downloaded from the staging area if
+                             staging_file
+        """
+        if not profile_file_path:
+            raise ValueError('Missing profile file path')
+
+        logging.info('start reading {}'.format(os.path.basename(profile_file_path)))
+        if staging_file:
+            logging.info('start downloading staging file')
+            download_staging_file_params = {'staging_file_subdir_path': profile_file_path}
+            profile_file_path = self.dfu.download_staging_file(
+                                                download_staging_file_params).get('copy_file_path')
+
+        return profile_file_path
+
+    def _build_profile_data(self, profile_file_path, item_ids, profile_category, import_plan,
+                            value_precision=None):
+
+        if import_plan:
+            self.memory_budget.require('parse', self.memory_budget.project(
+                                    'parse', import_plan['n_rows'] * import_plan['n_cols'],
+                                    numeric=import_plan['numeric']))
+
+        with self.tracer.span('parse_file') as span:
+            df = self._file_to_df(profile_file_path, sep=import_plan.get('sep'))
+            span.add_bytes(os.path.getsize(profile_file_path))
+
+        df = self._match_item_ids(df, item_ids, profile_category)
+
+        with self.tracer.span('build_values') as span:
+            profile_data = {'row_ids': df.index.tolist(),
+                            'col_ids': df.columns.tolist(),
+                            'values': self._profile_values(df, value_precision=value_precision)}
+            if isinstance(profile_data['values'], np.ndarray):
+                span.add_bytes(profile_data['values'].nbytes)
 
         return profile_data
 
     def _gen_func_profile(self, base_object_ref, matrix_data,
-                          profile_category, profile_file_path, metadata, staging_file=False):
+                          profile_category, profile_file_path, metadata, import_plan,
+                          value_precision=None):
 
         func_profile_data = dict()
         item_ids = None
@@ -361,9 +512,9 @@ class ProfileImporter:
                 item_ids = matrix_data.get('row_ids')
                 func_profile_data.pop('col_attributemapping_ref', None)
 
-        profile_data = self._build_profile_data(profile_file_path, item_ids, profile_category,
-                                                staging_file=staging_file)
-        func_profile_data['data'] = profile_data
+        func_profile_data['data'] = self._build_profile_data(profile_file_path, item_ids,
+                                                             profile_category, import_plan,
+                                                             value_precision=value_precision)
 
         return func_profile_data
 
@@ -371,15 +522,58 @@ class ProfileImporter:
         self.callback_url = config['SDK_CALLBACK_URL']
         self.scratch = config['scratch']
         self.token = config['KB_AUTH_TOKEN']
-        self.dfu = DataFileUtil(self.callback_url)
-        self.report_util = kb_GenericsReport(self.callback_url)
-        self.generics_api = GenericsAPI(self.callback_url)
-        self.ws_large_data = WsLargeDataIO(self.callback_url)
+        self.ws_url = config['workspace-url']
+        self.tracer = StageTracer(os.path.join(self.scratch, 'traces'))
+        self.json_encoder = MatrixJSONEncoder()
+        self.import_planner = ImportPlanner()
+        self.memory_budget = MemoryBudget(config.get('import-memory-budget'))
+        self.import_scheduler = ImportScheduler(config.get('import-scheduler-dir') or self.scratch,
+                                                config.get('import-host-memory-budget'),
+                                                config.get('import-host-cpu-budget'),
+                                                config.get('import-queue-timeout'))
+        self.heatmap_tiler = HeatmapTiler()
+        self.heatmap_clusterer = HeatmapClusterer(config.get('heatmap-cache-dir') or
+                                                  os.path.join(self.scratch, 'heatmap_cache'),
+                                                  config.get('heatmap-cache-size'))
+        self.profile_stats = ProfileStats()
+        self.profile_table_builder = ProfileTableBuilder()
+        self.report_renderer = ReportRenderer()
+        self.report_worker = ReportWorker(config.get('report-status-dir') or
+                                          os.path.join(self.scratch, 'report_jobs'))
+        self.background_reports = config.get('background-reports', 'false') == 'true'
 
         logging.basicConfig(format='%(created)s %(levelname)s: %(message)s',
                             level=logging.INFO)
 
-    def import_func_profile(self, params):
+    # service clients are built on first use, a server answering status calls never needs them
+    @lazy_property
+    def ws(self):
+        return self.tracer.trace_client(Workspace(self.ws_url, token=self.token), 'Workspace')
+
+    @lazy_property
+    def dfu(self):
+        return self.tracer.trace_client(DataFileUtil(self.callback_url), 'DataFileUtil')
+
+    @lazy_property
+    def generics_api(self):
+        return self.tracer.trace_client(GenericsAPI(self.callback_url), 'GenericsAPI')
+
+    @lazy_property
+    def ws_large_data(self):
+        return self.tracer.trace_client(WsLargeDataIO(self.callback_url), 'WsLargeDataIO')
+
+    @lazy_property
+    def blob_store(self):
+        return MatrixBlobStore(self.dfu, self.scratch)
+
+    def warm_up(self):
+        """
+        warm_up: build the service clients before the first import
+        """
+        preload(self)
+
+    @traced('import_func_profile')
+    def import_func_profile(self, params, user_id=None):
 
         if params.get('original_matrix_ref') and params.get('base_object_ref') is None:
             logging.info("rename original_matrix_ref to base_object_ref")
@@ -397,13 +591,22 @@ class ProfileImporter:
                                        'epistemology_method',
                                        'description',
                                        'staging_file',
-                                       'build_report'))
+                                       'build_report',
+                                       'background_report',
+                                       'value_precision'))
 
         workspace_id = params.get('workspace_id')
         func_profile_obj_name = params.get('func_profile_obj_name')
         staging_file = params.get('staging_file', False)
         build_report = params.get('build_report', False)
+        background_report = params.get('background_report', False)
         profile_file_path = params.get('profile_file_path')
+        value_precision = params.get('value_precision')
+
+        if build_report and background_report and not self.background_reports:
+            # a one-off job process waits for its report threads, nothing to gain
+            logging.info('background reports are disabled, building the report inline')
+            background_report = False
 
         base_object_ref = params.get('base_object_ref')
         base_object_data = self.dfu.get_objects(
@@ -427,21 +630,63 @@ class ProfileImporter:
         if profile_type not in PROFILE_TYPE:
             raise ValueError('Please choose one of {} as profile type'.format(PROFILE_TYPE))
 
-        func_profile_data = self._gen_func_profile(base_object_ref,
-                                                   base_object_data.get('data'),
-                                                   profile_category,
-                                                   profile_file_path,
-                                                   metadata,
-                                                   staging_file=staging_file)
+        if value_precision is not None and (
+                not isinstance(value_precision, int) or isinstance(value_precision, bool) or
+                not 1 <= value_precision <= MAX_VALUE_PRECISION):
+            raise ValueError('Please provide value precision as an integer between 1 and {}'.format(
+                                                                            MAX_VALUE_PRECISION))
+
+        profile_file_path = self._fetch_profile_file(profile_file_path, staging_file=staging_file)
+        with self.tracer.span('plan_import'):
+            import_plan = self.import_planner.plan(profile_file_path,
+                                                   value_precision=value_precision) or dict()
+
+        # concurrent imports of this host wait here until their memory fits the host budget.
+        # a report built inline is counted with the import, a background report is admitted
+        # on its own once its job starts
+        import_cost = self.import_scheduler.estimate(
+                                    import_plan, os.path.getsize(profile_file_path),
+                                    build_report=build_report and not background_report)
+        with self.import_scheduler.admit(import_cost, user_id=user_id):
+            func_profile_data = self._gen_func_profile(base_object_ref,
+                                                       base_object_data.get('data'),
+                                                       profile_category,
+                                                       profile_file_path,
+                                                       metadata,
+                                                       import_plan,
+                                                       value_precision=value_precision)
+            profile_data = func_profile_data['data']
+            n_cells = len(profile_data['row_ids']) * len(profile_data['col_ids'])
+
+            func_profile_ref = self._save_func_profile(workspace_id,
+                                                       func_profile_data,
+                                                       func_profile_obj_name,
+                                                       import_plan=import_plan)
+
+            returnVal = {'func_profile_ref': func_profile_ref}
+
+            if build_report and not background_report:
+                # the profile is saved by now, a report that does not fit is skipped alone
+                try:
+                    self.memory_budget.require('report', self.memory_budget.project('report',
+                                                                                    n_cells))
+                except ValueError as e:
+                    logging.warning('skipping the report: {}'.format(e))
+                    returnVal['report_error'] = str(e)
+                else:
+                    report_output = self._gen_func_profile_report(func_profile_ref, workspace_id)
+                    returnVal.update(report_output)
+
+        if build_report and background_report:
+            returnVal['report_job_id'] = self.report_worker.submit(
+                                            self._gen_admitted_report,
+                                            self.import_scheduler.estimate_report(n_cells),
+                                            user_id, func_profile_ref, workspace_id)
 
-        func_profile_ref = self._save_func_profile(workspace_id,
-                                                   func_profile_data,
-                                                   func_profile_obj_name)
+        return returnVal
 
-        returnVal = {'func_profile_ref': func_profile_ref}
+    def get_report_status(self, params):
 
-        if build_report:
-            report_output = self._gen_func_profile_report(func_profile_ref, workspace_id)
-            returnVal.update(report_output)
+        self._validate_params(params, ('report_job_id',))
 
-        return returnVal
+        return self.report_worker.get_status(params['report_job_id'])
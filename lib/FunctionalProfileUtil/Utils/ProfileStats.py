@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from FunctionalProfileUtil.Utils.MatrixJSONEncoder import MatrixJSONEncoder
+
+STAT_NAMES = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+
+
+class ProfileStats:
+    """
+    ProfileStats: NaN-aware row and column summary statistics of a profile matrix
+
+    count, mean, std, min and max are exact. quantiles are exact up to QUANTILE_SAMPLE_SIZE values
+    per row/column and otherwise come from an evenly strided sample of the row/column.
+    """
+
+    QUANTILES = [25, 50, 75]
+    QUANTILE_SAMPLE_SIZE = 1 << 14
+    CHUNK_CELLS = 1 << 22  # matrix cells processed at once
+    PAGE_SIZE = 200  # rows/columns per statistics page
+
+    def __init__(self):
+        self.json_encoder = MatrixJSONEncoder(detect_integers=False)
+
+    def _quantiles(self, values, axis):
+        # all missing rows/columns get NaN quantiles. they are left out instead of silencing the
+        # numpy warning, catch_warnings swaps process wide filters and is not thread safe
+        has_values = ~np.isnan(values).all(axis=axis)
+        quantiles = np.full((has_values.size, len(self.QUANTILES)), np.nan)
+        if has_values.any():
+            quantiles[has_values] = np.nanpercentile(
+                np.compress(has_values, values, axis=1 - axis), self.QUANTILES, axis=axis).T
+        return quantiles
+
+    @staticmethod
+    def _moments(chunk, finite, axis):
+        """
+        _moments: count, mean and sum of squared deviations along axis
+        """
+        count = finite.sum(axis=axis)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(finite, chunk, 0.0).sum(axis=axis) / count
+            deviations = np.where(finite, chunk - np.expand_dims(mean, axis), 0.0)
+        return count, mean, np.square(deviations).sum(axis=axis)
+
+    @staticmethod
+    def _assemble(count, mean, m2, minimum, maximum, quantiles):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.sqrt(m2 / (count - 1))
+        std[count < 2] = np.nan
+        minimum[count == 0] = np.nan
+        maximum[count == 0] = np.nan
+
+        return np.column_stack([count, mean, std, minimum, quantiles[:, 0], quantiles[:, 1],
+                                quantiles[:, 2], maximum])
+
+    @staticmethod
+    def _as_float_matrix(values):
+        """
+        _as_float_matrix: values as a 2D float64 matrix, non numeric cells become NaN
+        """
+        try:
+            values = np.asarray(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            logging.warning('profile contains non numeric values, leaving them out of the '
+                            'statistics')
+            values = pd.DataFrame(values).apply(pd.to_numeric, errors='coerce').values
+            values = values.astype(np.float64)
+
+        if values.ndim == 1 and not values.size:
+            # an empty list has no columns either
+            values = values.reshape(0, 0)
+
+        return values
+
+    @staticmethod
+    def _missing_stats(n):
+        stats = np.full((n, len(STAT_NAMES)), np.nan)
+        stats[:, 0] = 0
+        return stats
+
+    def summarize(self, values):
+        """
+        summarize: (row statistics, column statistics), one row of STAT_NAMES per profile
+                   row/column, from a single pass over row chunks of values
+        """
+        values = self._as_float_matrix(values)
+        n_rows, n_cols = values.shape
+
+        if not values.size:
+            # no rows or no columns, every statistic is missing
+            return self._missing_stats(n_rows), self._missing_stats(n_cols)
+
+        row_stats = np.empty((n_rows, len(STAT_NAMES)))
+        col_count = np.zeros(n_cols)
+        col_mean = np.zeros(n_cols)
+        col_m2 = np.zeros(n_cols)
+        col_min = np.full(n_cols, np.inf)
+        col_max = np.full(n_cols, -np.inf)
+
+        col_stride = -(-n_cols // self.QUANTILE_SAMPLE_SIZE)
+        row_stride = -(-n_rows // self.QUANTILE_SAMPLE_SIZE)
+        col_sample = list()
+
+        chunk_rows = max(1, self.CHUNK_CELLS // max(n_cols, 1))
+        # align chunks with the strided row sample
+        chunk_rows = -(-chunk_rows // row_stride) * row_stride
+        for start in range(0, n_rows, chunk_rows):
+            chunk = values[start:start + chunk_rows]
+            finite = np.isfinite(chunk)
+
+            count, mean, m2 = self._moments(chunk, finite, 1)
+            row_stats[start:start + len(chunk)] = self._assemble(
+                                            count, mean, m2,
+                                            np.where(finite, chunk, np.inf).min(axis=1),
+                                            np.where(finite, chunk, -np.inf).max(axis=1),
+                                            self._quantiles(chunk[:, ::col_stride], 1))
+
+            # merge the column moments of this chunk (Chan et al.)
+            count, mean, m2 = self._moments(chunk, finite, 0)
+            total = col_count + count
+            with np.errstate(divide='ignore', invalid='ignore'):
+                delta = np.nan_to_num(mean - col_mean)
+                col_mean = np.where(count > 0, col_mean + delta * count / total, col_mean)
+                col_m2 += np.where(count > 0, m2 + delta ** 2 * col_count * count / total, 0.0)
+            col_count = total
+            col_min = np.minimum(col_min, np.where(finite, chunk, np.inf).min(axis=0))
+            col_max = np.maximum(col_max, np.where(finite, chunk, -np.inf).max(axis=0))
+
+            col_sample.append(chunk[::row_stride])
+
+        col_mean[col_count == 0] = np.nan
+        col_quantiles = (self._quantiles(np.concatenate(col_sample), 0) if col_sample
+                         else np.full((n_cols, len(self.QUANTILES)), np.nan))
+        col_stats = self._assemble(col_count, col_mean, col_m2, col_min, col_max, col_quantiles)
+
+        return row_stats, col_stats
+
+    def write_stats_pages(self, stats, ids, output_directory, name):
+        """
+        write_stats_pages: write statistics as JSON pages of PAGE_SIZE rows for the report viewer
+
+        returns the number of pages
+        """
+        stats_dir = os.path.join(output_directory, 'profile_stats')
+        os.makedirs(stats_dir, exist_ok=True)
+
+        n_pages = -(-len(ids) // self.PAGE_SIZE)
+        for page in range(n_pages):
+            page_slice = slice(page * self.PAGE_SIZE, (page + 1) * self.PAGE_SIZE)
+            page_path = os.path.join(stats_dir, '{}_{}.json'.format(name, page))
+            with open(page_path, 'wb') as page_file:
+                page_file.write('{{"ids": {}, "stat_names": {}, "stats": '.format(
+                            json.dumps(list(ids[page_slice])), json.dumps(STAT_NAMES)).encode())
+                for chunk in self.json_encoder.iterencode_values(stats[page_slice]):
+                    page_file.write(chunk)
+                page_file.write(b'}')
+
+        logging.info('wrote {} {} pages'.format(n_pages, name))
+
+        return n_pages
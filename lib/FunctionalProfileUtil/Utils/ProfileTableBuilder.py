@@ -0,0 +1,90 @@
+import json
+import logging
+import os
+
+import numpy as np
+
+from FunctionalProfileUtil.Utils.ReportPackager import ReportPackager
+
+VALUE_DTYPE = '<f4'  # little endian float32, read as Float32Array by the viewer
+
+
+class ProfileTableBuilder:
+    """
+    ProfileTableBuilder: chunked binary profile data for the lazy loading profile table viewer
+
+    writes the matrix as row blocks of about BLOCK_CELLS float32 values (missing values are NaN)
+    with the row ids of every block, and an index. profile_viewer.html fetches only the blocks it
+    displays. profiles of more than MAX_TABLE_CELLS values (or MAX_TABLE_COLS columns) are shown
+    as an evenly strided sample of their rows (and columns), which the viewer says above the
+    table. sorting and filtering gather a column from the leading blocks of up to
+    MAX_SORT_CELLS values and apply to their rows only.
+    """
+
+    BLOCK_CELLS = 1 << 16  # values per row block
+    MAX_TABLE_CELLS = 1 << 24  # values in the table, 64MB of float32
+    MAX_TABLE_COLS = 1 << 14
+    MAX_SORT_CELLS = 1 << 22  # values fetched to sort or filter by a column, 16MB of float32
+
+    def _write_row_blocks(self, values, row_ids, data_dir, block_rows):
+        block_dir = os.path.join(data_dir, 'blocks')
+        os.makedirs(block_dir)
+
+        n_rows = values.shape[0]
+        for block, start in enumerate(range(0, n_rows, block_rows)):
+            block_path = os.path.join(block_dir, str(block))
+            with open(block_path + '.bin', 'wb') as block_file:
+                block_file.write(values[start:start + block_rows].astype(VALUE_DTYPE).tobytes())
+            with open(block_path + '_ids.json', 'w') as ids_file:
+                json.dump(list(row_ids[start:start + block_rows]), ids_file)
+
+        return -(-n_rows // block_rows)
+
+    def build_table(self, values, row_ids, col_ids, output_directory):
+        """
+        build_table: write row blocks, index and viewer page into output_directory
+
+        returns the viewer page name
+        """
+        values = np.asarray(values, dtype=np.float64)
+        profile_rows, profile_cols = values.shape
+        logging.info('start building profile table for {} x {} matrix'.format(profile_rows,
+                                                                              profile_cols))
+
+        col_stride = max(1, -(-profile_cols // self.MAX_TABLE_COLS))
+        row_stride = max(1, -(-profile_rows * -(-profile_cols // col_stride) //
+                              self.MAX_TABLE_CELLS))
+        if row_stride > 1 or col_stride > 1:
+            logging.info('profile is too large for the table, showing every {} row and every {} '
+                         'column'.format(row_stride, col_stride))
+            values = values[::row_stride, ::col_stride]
+            row_ids = list(row_ids)[::row_stride]
+            col_ids = list(col_ids)[::col_stride]
+        n_rows, n_cols = values.shape
+
+        data_dir = os.path.join(output_directory, 'profile_table')
+        block_rows = max(1, self.BLOCK_CELLS // max(n_cols, 1))
+        n_blocks = self._write_row_blocks(values, row_ids, data_dir, block_rows)
+        sort_blocks = max(1, self.MAX_SORT_CELLS // (block_rows * max(n_cols, 1)))
+
+        table_index = {'n_rows': n_rows,
+                       'n_cols': n_cols,
+                       'profile_rows': profile_rows,
+                       'profile_cols': profile_cols,
+                       'row_stride': row_stride,
+                       'col_stride': col_stride,
+                       'sort_rows': min(n_rows, sort_blocks * block_rows),
+                       'block_rows': block_rows,
+                       'n_blocks': n_blocks,
+                       'dtype': 'float32',
+                       'col_ids': list(col_ids)}
+        with open(os.path.join(data_dir, 'table_index.json'), 'w') as index_file:
+            json.dump(table_index, index_file)
+
+        viewer_page = 'profile_viewer.html'
+        ReportPackager.link_asset(os.path.join(os.path.dirname(__file__), 'templates', viewer_page),
+                                  os.path.join(output_directory, viewer_page))
+
+        logging.info('wrote {} profile table blocks of {} rows'.format(n_blocks, block_rows))
+
+        return viewer_page
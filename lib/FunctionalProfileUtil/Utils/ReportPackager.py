@@ -0,0 +1,54 @@
+import logging
+import os
+import shutil
+import zipfile
+
+# assets that are compressed already and are stored in the archive as they are
+COMPRESSED_EXTENSIONS = {'.gz', '.bz2', '.xz', '.zip', '.npz', '.png', '.jpg', '.jpeg', '.gif',
+                         '.webp', '.woff', '.woff2'}
+
+
+class ReportPackager:
+    """
+    ReportPackager: assemble report assets and pack the report directory into a zip archive
+    """
+
+    @staticmethod
+    def link_asset(src, dst):
+        """
+        link_asset: hard link src to dst, copying only if src is on another file system
+        """
+        if os.path.exists(dst):
+            os.remove(dst)
+
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    @staticmethod
+    def pack(report_directory, zip_path):
+        """
+        pack: zip report_directory into zip_path, file by file
+
+        returns zip_path
+        """
+        n_files = 0
+        with zipfile.ZipFile(zip_path, 'w', allowZip64=True) as report_zip:
+            for root, dirs, files in os.walk(report_directory):
+                dirs.sort()
+                for file_name in sorted(files):
+                    file_path = os.path.join(root, file_name)
+                    compress_type = zipfile.ZIP_DEFLATED
+                    if os.path.splitext(file_name)[1].lower() in COMPRESSED_EXTENSIONS:
+                        compress_type = zipfile.ZIP_STORED
+
+                    report_zip.write(file_path,
+                                     arcname=os.path.relpath(file_path, report_directory),
+                                     compress_type=compress_type)
+                    n_files += 1
+
+        logging.info('packed {} report files into {} ({} bytes)'.format(
+                                                n_files, zip_path, os.path.getsize(zip_path)))
+
+        return zip_path
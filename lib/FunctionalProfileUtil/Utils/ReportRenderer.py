@@ -0,0 +1,98 @@
+import functools
+import logging
+import os
+import re
+from collections import namedtuple
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'templates')
+REPORT_TEMPLATE = 'func_profile_template.html'
+TAB_BUTTON_TEMPLATE = 'tab_button.html'
+
+# {{ slot_name }} placeholders of a template
+SLOT_PATTERN = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+# one report tab, rendered from template (a file in TEMPLATE_DIR) with name and fields
+ReportTab = namedtuple('ReportTab', ['name', 'title', 'template', 'fields'])
+
+
+class ReportTemplate:
+    """
+    ReportTemplate: a template split once into static text and {{ slot }} placeholders
+    """
+
+    def __init__(self, template_text):
+        parts = SLOT_PATTERN.split(template_text)
+        self.static_parts = parts[0::2]
+        self.slots = parts[1::2]
+
+    @staticmethod
+    def _write_value(writer, value):
+        if isinstance(value, str):
+            writer.write(value)
+        elif callable(value):
+            # renders itself into the writer
+            value(writer)
+        elif isinstance(value, (list, tuple)) or hasattr(value, '__next__'):
+            for item in value:
+                ReportTemplate._write_value(writer, item)
+        else:
+            writer.write(str(value))
+
+    def render(self, writer, **values):
+        """
+        render: write the template into writer, filling every slot from values
+
+        a slot value is a string, an iterable of values or a callable taking the writer
+        """
+        missing_slots = set(self.slots) - set(values)
+        if missing_slots:
+            raise ValueError('Missing template values: {}'.format(sorted(missing_slots)))
+
+        for static_part, slot in zip(self.static_parts, self.slots):
+            writer.write(static_part)
+            self._write_value(writer, values[slot])
+        writer.write(self.static_parts[-1])
+
+
+@functools.lru_cache(maxsize=None)
+def get_template(template_name):
+    """
+    get_template: compiled template from TEMPLATE_DIR, read once per process
+    """
+    logging.info('compiling report template {}'.format(template_name))
+    with open(os.path.join(TEMPLATE_DIR, template_name), 'r') as template_file:
+        return ReportTemplate(template_file.read())
+
+
+class ReportRenderer:
+    """
+    ReportRenderer: render report pages from precompiled templates and declarative tabs
+    """
+
+    def __init__(self, report_template=REPORT_TEMPLATE):
+        self.report_template = report_template
+
+    @staticmethod
+    def _write_tab_buttons(writer, tabs):
+        button_template = get_template(TAB_BUTTON_TEMPLATE)
+        for idx, tab in enumerate(tabs):
+            button_template.render(writer, name=tab.name, title=tab.title,
+                                   button_attributes=' id="defaultOpen"' if idx == 0 else '')
+
+    @staticmethod
+    def _write_tab_contents(writer, tabs):
+        for tab in tabs:
+            get_template(tab.template).render(writer, name=tab.name, **tab.fields)
+
+    def render_report(self, file_path, tabs):
+        """
+        render_report: stream the report page with tabs into file_path, the first tab is opened
+                       by default
+        """
+        with open(file_path, 'w') as result_file:
+            get_template(self.report_template).render(
+                result_file,
+                tab_buttons=lambda writer: self._write_tab_buttons(writer, tabs),
+                tab_contents=lambda writer: self._write_tab_contents(writer, tabs))
+
+        return file_path
@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+REPORT_STATES = ['queued', 'running', 'done', 'error']
+
+
+class ReportWorker:
+    """
+    ReportWorker: build reports in a background thread after import_func_profile returns
+
+    report job status is kept as a JSON file per job in status_dir (report-status-dir of
+    deploy.cfg), which has to outlive the request so later get_report_status calls find it.
+    only a long running server gains from background reports, see background-reports.
+    """
+
+    STATUS_MAX_AGE = 7 * 24 * 3600  # seconds report job status is kept
+
+    def __init__(self, status_dir, max_workers=1):
+        self.status_dir = status_dir
+        self._executor = None
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+
+    def _status_path(self, report_job_id):
+        try:
+            uuid.UUID(report_job_id)
+        except (TypeError, ValueError):
+            raise ValueError('Invalid report job id: {}'.format(report_job_id))
+
+        return os.path.join(self.status_dir, '{}.json'.format(report_job_id))
+
+    def _write_status(self, report_job_id, state, **fields):
+        status = {'report_job_id': report_job_id, 'state': state}
+        status.update(fields)
+
+        status_path = self._status_path(report_job_id)
+        tmp_path = status_path + '.tmp'
+        with open(tmp_path, 'w') as status_file:
+            json.dump(status, status_file)
+        os.replace(tmp_path, status_path)
+
+    def _prune_status(self):
+        """
+        _prune_status: remove report job status older than STATUS_MAX_AGE
+        """
+        expiry = time.time() - self.STATUS_MAX_AGE
+        for file_name in os.listdir(self.status_dir):
+            status_path = os.path.join(self.status_dir, file_name)
+            try:
+                if os.path.getmtime(status_path) < expiry:
+                    os.remove(status_path)
+            except FileNotFoundError:
+                # pruned by another worker
+                pass
+
+    def _run(self, report_job_id, report_func, args):
+        self._write_status(report_job_id, 'running')
+        try:
+            report_output = report_func(*args)
+        except Exception as e:
+            logging.exception('report job {} failed'.format(report_job_id))
+            self._write_status(report_job_id, 'error', error=str(e))
+        else:
+            logging.info('report job {} done'.format(report_job_id))
+            self._write_status(report_job_id, 'done', **report_output)
+
+    def submit(self, report_func, *args):
+        """
+        submit: queue report_func(*args) and return the report job id
+
+        report_func returns a dict with report_name and report_ref
+        """
+        with self._lock:
+            if self._executor is None:
+                os.makedirs(self.status_dir, exist_ok=True)
+                self._prune_status()
+                # worker threads are joined at interpreter exit, a one-off job process waits
+                # for its reports before it exits
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                                    thread_name_prefix='report_worker')
+
+        report_job_id = str(uuid.uuid4())
+        self._write_status(report_job_id, 'queued')
+        self._executor.submit(self._run, report_job_id, report_func, args)
+        logging.info('queued report job {}'.format(report_job_id))
+
+        return report_job_id
+
+    def get_status(self, report_job_id):
+        status_path = self._status_path(report_job_id)
+        if not os.path.isfile(status_path):
+            raise ValueError('Unknown report job id: {}'.format(report_job_id))
+
+        with open(status_path) as status_file:
+            return json.load(status_file)
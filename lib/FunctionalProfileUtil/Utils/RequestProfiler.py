@@ -0,0 +1,140 @@
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+SAMPLING = 'sampling'
+DETERMINISTIC = 'deterministic'
+
+
+def _frame_label(code):
+    file_path = '/'.join(code.co_filename.split(os.sep)[-2:])
+    return '{} ({}:{})'.format(code.co_name, file_path, code.co_firstlineno)
+
+
+class StackSampler(threading.Thread):
+    """
+    StackSampler: samples the call stack of one thread every interval seconds
+    """
+
+    def __init__(self, thread_id, interval):
+        super(StackSampler, self).__init__(name='StackSampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = list()
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class RequestProfiler:
+    """
+    RequestProfiler: on demand profile of single requests
+
+    a request is profiled when its context asks for it (rpc_context {"profile": 1}) or its user
+    is listed in profile-users of deploy.cfg. the profile is written to a directory in
+    profile_dir with
+        - stacks.folded: collapsed stacks with sample counts, input of flamegraph.pl or
+                         speedscope
+        - top_functions.txt: functions by samples in the function itself and in its callees
+    profiler (deploy.cfg) picks a sampling profiler of the request thread (default, low
+    overhead) or cProfile (every call, slower), which writes profile.pstats and a
+    top_functions.txt of the calls instead.
+    requests that are not profiled run without any profiler.
+    """
+
+    SAMPLE_INTERVAL = 0.005
+    TOP_FUNCTIONS = 40
+
+    def __init__(self, profile_dir, allowed_users=None, mode=None):
+        self.profile_dir = profile_dir
+        self.allowed_users = {user.strip() for user in (allowed_users or '').split(',')
+                              if user.strip()}
+        self.mode = mode or SAMPLING
+        if self.mode not in [SAMPLING, DETERMINISTIC]:
+            raise ValueError('Invalid profiler: {}, expected {} or {}'.format(
+                                                            self.mode, SAMPLING, DETERMINISTIC))
+
+    def wanted(self, ctx):
+        rpc_context = ctx.get('rpc_context') or dict()
+        return bool(rpc_context.get('profile')) or ctx.get('user_id') in self.allowed_users
+
+    def run(self, ctx, method_name, func, *args, **kwargs):
+        """
+        run: func(*args, **kwargs), profiled if ctx asks for it
+        """
+        if not self.wanted(ctx):
+            return func(*args, **kwargs)
+
+        profile_path = os.path.join(self.profile_dir, '{}_{}_{}_{}'.format(
+                            method_name, ctx.get('user_id') or 'anonymous',
+                            time.strftime('%Y%m%d_%H%M%S'), uuid.uuid4().hex[:8]))
+        os.makedirs(profile_path, exist_ok=True)
+        logging.info('profiling {} with the {} profiler'.format(method_name, self.mode))
+
+        start = time.perf_counter()
+        if self.mode == DETERMINISTIC:
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(func, *args, **kwargs)
+            finally:
+                self._write_deterministic(profiler, profile_path, time.perf_counter() - start)
+
+        sampler = StackSampler(threading.get_ident(), self.SAMPLE_INTERVAL)
+        sampler.start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            sampler.stop()
+            self._write_profile(sampler.stacks, profile_path, time.perf_counter() - start)
+
+    def _write_profile(self, stacks, profile_path, wall_time):
+        with open(os.path.join(profile_path, 'stacks.folded'), 'w') as folded_file:
+            for stack, count in sorted(stacks.items()):
+                folded_file.write('{} {}\n'.format(stack, count))
+
+        self_samples = Counter()
+        total_samples = Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(';')
+            self_samples[frames[-1]] += count
+            for frame in set(frames):
+                total_samples[frame] += count
+        n_samples = sum(stacks.values()) or 1
+
+        with open(os.path.join(profile_path, 'top_functions.txt'), 'w') as top_file:
+            top_file.write('{:.2f} s wall time, {} samples every {} s\n\n'.format(
+                                        wall_time, sum(stacks.values()), self.SAMPLE_INTERVAL))
+            top_file.write('{:>7} {:>7}  {}\n'.format('self%', 'total%', 'function'))
+            for frame, count in self_samples.most_common(self.TOP_FUNCTIONS):
+                top_file.write('{:7.1f} {:7.1f}  {}\n'.format(
+                                100 * count / n_samples, 100 * total_samples[frame] / n_samples,
+                                frame))
+
+        logging.info('profile of {:.2f} s written to {}'.format(wall_time, profile_path))
+
+    def _write_deterministic(self, profiler, profile_path, wall_time):
+        profiler.dump_stats(os.path.join(profile_path, 'profile.pstats'))
+        with open(os.path.join(profile_path, 'top_functions.txt'), 'w') as top_file:
+            top_file.write('{:.2f} s wall time\n'.format(wall_time))
+            stats = pstats.Stats(profiler, stream=top_file)
+            stats.sort_stats('tottime').print_stats(self.TOP_FUNCTIONS)
+
+        logging.info('profile of {:.2f} s written to {}'.format(wall_time, profile_path))
@@ -0,0 +1,167 @@
+import json
+import zlib
+
+# zlib window bits of the HTTP content codings
+CONTENT_CODINGS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+
+class RequestTooLarge(ValueError):
+    pass
+
+
+def read_request_body(environ, max_size, chunk_size=1 << 16):
+    """
+    read_request_body: request body of a WSGI environ read in chunks of chunk_size
+
+    raises RequestTooLarge for bodies over max_size bytes, before reading them if the client
+    announced the size
+    """
+    try:
+        body_size = int(environ.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        body_size = 0
+    if max_size and body_size > max_size:
+        raise RequestTooLarge('Request body of {} bytes exceeds the limit of {} bytes'.format(
+                                                                        body_size, max_size))
+
+    chunks = list()
+    remaining = body_size
+    while remaining > 0:
+        chunk = environ['wsgi.input'].read(min(chunk_size, remaining))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+
+    return b''.join(chunks)
+
+
+def iterencode_json(obj, cls=None, split_depth=3):
+    """
+    iterencode_json: the text of json.dumps(obj, cls=cls) as an iterator of chunks
+
+    lists and dicts of the first split_depth levels, for a JSON-RPC response down to the values
+    of the method result, are written item by item and the values below with json.dumps. a
+    large result is encoded by the C encoder without the whole response as one string
+    """
+    if split_depth > 0 and isinstance(obj, (list, tuple)) and obj:
+        yield '['
+        for i, value in enumerate(obj):
+            if i:
+                yield ', '
+            yield from iterencode_json(value, cls=cls, split_depth=split_depth - 1)
+        yield ']'
+    elif (split_depth > 0 and isinstance(obj, dict) and obj and
+            all(isinstance(key, str) for key in obj)):
+        yield '{'
+        for i, (key, value) in enumerate(obj.items()):
+            yield (', ' if i else '') + json.dumps(key) + ': '
+            yield from iterencode_json(value, cls=cls, split_depth=split_depth - 1)
+        yield '}'
+    else:
+        yield json.dumps(obj, cls=cls)
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    negotiate_encoding: preferred content coding of an Accept-Encoding header, None for identity
+    """
+    preferences = dict()
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        preferences[coding] = quality
+
+    candidates = [(preferences.get(coding, preferences.get('*', 0.0)), coding)
+                  for coding in ['gzip', 'deflate']]
+    quality, coding = max(candidates, key=lambda candidate: candidate[0])
+    return coding if quality > 0 else None
+
+
+class ResponseEncoder:
+    """
+    ResponseEncoder: response bodies compressed for the client's Accept-Encoding and streamed
+                     in chunks once they outgrow BUFFER_SIZE
+
+    bodies up to BUFFER_SIZE are sent at once with a content-length, larger ones are encoded
+    while they are written, so a large result never exists as one string
+    """
+
+    CHUNK_SIZE = 1 << 16
+    BUFFER_SIZE = 1 << 20
+    MIN_COMPRESS_SIZE = 1024
+    COMPRESS_LEVEL = 6
+
+    def _byte_chunks(self, text_chunks):
+        buffered = list()
+        buffered_size = 0
+        for text in text_chunks:
+            data = text.encode('utf8')
+            if len(data) > self.CHUNK_SIZE:
+                # a large piece, e.g. one value of a result, is sent in slices of CHUNK_SIZE
+                if buffered_size:
+                    yield b''.join(buffered)
+                    buffered = list()
+                    buffered_size = 0
+                for start in range(0, len(data), self.CHUNK_SIZE):
+                    yield data[start:start + self.CHUNK_SIZE]
+                continue
+            buffered.append(data)
+            buffered_size += len(data)
+            if buffered_size >= self.CHUNK_SIZE:
+                yield b''.join(buffered)
+                buffered = list()
+                buffered_size = 0
+        if buffered_size:
+            yield b''.join(buffered)
+
+    def _compress(self, chunks, coding):
+        compressor = zlib.compressobj(self.COMPRESS_LEVEL, zlib.DEFLATED, CONTENT_CODINGS[coding])
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+    def encode(self, text_chunks, accept_encoding=None):
+        """
+        encode: (response headers, iterable of body bytes) of a body given as text chunks
+        """
+        chunks = self._byte_chunks(text_chunks)
+        head = list()
+        head_size = 0
+        for chunk in chunks:
+            head.append(chunk)
+            head_size += len(chunk)
+            if head_size > self.BUFFER_SIZE:
+                break
+        else:
+            chunks = None
+
+        coding = negotiate_encoding(accept_encoding)
+        headers = [('Vary', 'Accept-Encoding')]
+        if chunks is None and head_size < self.MIN_COMPRESS_SIZE:
+            coding = None
+        if coding:
+            headers.append(('content-encoding', coding))
+
+        if chunks is None:
+            body = b''.join(head)
+            if coding:
+                body = b''.join(self._compress([body], coding))
+            headers.append(('content-length', str(len(body))))
+            return headers, [body]
+
+        def stream():
+            yield from head
+            yield from chunks
+
+        return headers, self._compress(stream(), coding) if coding else stream()
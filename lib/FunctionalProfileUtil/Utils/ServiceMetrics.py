@@ -0,0 +1,360 @@
+import glob
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRIC_PREFIX = 'functional_profile_util_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300,
+                   600, 1800)
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', r'\\')
+                                           .replace('"', r'\"').replace('\n', r'\n'))
+                          for name, value in labels) + '}'
+
+
+class _Metric:
+
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = dict()
+        self._lock = threading.Lock()
+
+    def labels(self, *labelvalues):
+        """
+        labels: the child of this metric with labelvalues
+        """
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError('{} expects labels {}'.format(self.name, self.labelnames))
+        key = tuple(str(value) for value in labelvalues)
+        with self._lock:
+            if key not in self._children:
+                self._children[key] = self._new_child()
+            return self._children[key]
+
+    def samples(self):
+        with self._lock:
+            children = sorted(self._children.items())
+        for labelvalues, child in children:
+            labels = list(zip(self.labelnames, labelvalues))
+            for suffix, extra_labels, value in child.samples():
+                yield self.name + suffix, labels + extra_labels, value
+
+    def snapshot(self):
+        """
+        snapshot: the type, documentation and child samples of this metric as plain JSON data
+        """
+        with self._lock:
+            children = sorted(self._children.items())
+        return {'type': self.metric_type,
+                'documentation': self.documentation,
+                'labelnames': list(self.labelnames),
+                'children': [[list(labelvalues), child.samples()]
+                             for labelvalues, child in children]}
+
+    def render(self):
+        return _render_snapshot(self.name, self.snapshot())
+
+
+def _render_snapshot(name, snapshot):
+    lines = ['# HELP {} {}'.format(name, snapshot['documentation']),
+             '# TYPE {} {}'.format(name, snapshot['type'])]
+    for labelvalues, samples in snapshot['children']:
+        labels = list(zip(snapshot['labelnames'], labelvalues))
+        lines.extend('{}{} {}'.format(name + suffix, _format_labels(labels + list(extra_labels)),
+                                      _format_value(value))
+                     for suffix, extra_labels, value in samples)
+    return '\n'.join(lines)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge_snapshots(snapshots):
+    """
+    _merge_snapshots: sum the samples of the process snapshots in snapshots, a list of
+                      (process alive, snapshot). gauges of processes that exited are left out,
+                      counters and histograms keep counting what they recorded
+    """
+    merged = dict()
+    for alive, snapshot in snapshots:
+        for name, metric in snapshot.items():
+            if metric['type'] == 'gauge' and not alive:
+                continue
+            if name not in merged:
+                merged[name] = dict(metric, children=dict())
+            children = merged[name]['children']
+            for labelvalues, samples in metric['children']:
+                key = tuple(labelvalues)
+                if key not in children:
+                    children[key] = [[suffix, extra_labels, 0.0]
+                                     for suffix, extra_labels, value in samples]
+                for sample, (suffix, extra_labels, value) in zip(children[key], samples):
+                    sample[2] += value
+
+    for metric in merged.values():
+        metric['children'] = [[list(labelvalues), samples]
+                              for labelvalues, samples in sorted(metric['children'].items())]
+    return merged
+
+
+class _Value:
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def samples(self):
+        return [('', [], self.value)]
+
+
+class _HistogramValue:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def samples(self):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        samples = list()
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            samples.append(('_bucket', [('le', _format_value(bound))], cumulative))
+        samples.append(('_sum', [], total))
+        samples.append(('_count', [], cumulative))
+        return samples
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    metric_type = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+
+class Histogram(_Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class MetricsRegistry:
+    """
+    MetricsRegistry: counters, gauges and histograms rendered in the Prometheus text exposition
+                     format
+
+    metrics are per process. with a multiprocess_dir, e.g. for uwsgi workers, every process
+    writes its metrics to its own file there and render sums the files of all processes
+    """
+
+    def __init__(self):
+        self._metrics = dict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.multiprocess_dir = None
+
+    def set_multiprocess_dir(self, multiprocess_dir, clear=False):
+        """
+        set_multiprocess_dir: share the metrics of the processes writing to multiprocess_dir.
+                              clear removes the files of earlier runs, so call it once before
+                              the workers start, e.g. in the uwsgi master before it forks
+        """
+        os.makedirs(multiprocess_dir, exist_ok=True)
+        if clear:
+            for metrics_path in glob.glob(os.path.join(multiprocess_dir, '*.json')):
+                os.remove(metrics_path)
+        self.multiprocess_dir = multiprocess_dir
+
+    def _register(self, metric_class, name, *args, **kwargs):
+        name = METRIC_PREFIX + name
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = metric_class(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def snapshot(self):
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        return {name: metric.snapshot() for name, metric in metrics}
+
+    def flush(self):
+        """
+        flush: write the metrics of this process to multiprocess_dir, if set
+        """
+        if self.multiprocess_dir is None:
+            return
+
+        # the pid is read on every flush, the directory is usually set before uwsgi forks
+        metrics_path = os.path.join(self.multiprocess_dir, '{}.json'.format(os.getpid()))
+        with self._flush_lock:
+            tmp_path = metrics_path + '.tmp'
+            with open(tmp_path, 'w') as metrics_file:
+                json.dump(self.snapshot(), metrics_file)
+            os.replace(tmp_path, metrics_path)
+
+    def _read_snapshots(self):
+        self.flush()
+        snapshots = list()
+        for metrics_path in glob.glob(os.path.join(self.multiprocess_dir, '*.json')):
+            pid = int(os.path.splitext(os.path.basename(metrics_path))[0])
+            try:
+                with open(metrics_path) as metrics_file:
+                    snapshots.append((_pid_alive(pid), json.load(metrics_file)))
+            except FileNotFoundError:
+                continue
+        return snapshots
+
+    def render(self):
+        if self.multiprocess_dir is None:
+            snapshot = self.snapshot()
+        else:
+            snapshot = _merge_snapshots(self._read_snapshots())
+        return '\n'.join(_render_snapshot(name, metric)
+                         for name, metric in sorted(snapshot.items())) + '\n'
+
+    def write(self, file_path):
+        """
+        write: render the metrics into file_path, e.g. for a node exporter textfile collector
+        """
+        tmp_path = '{}.{}.tmp'.format(file_path, os.getpid())
+        with open(tmp_path, 'w') as metrics_file:
+            metrics_file.write(self.render())
+        os.replace(tmp_path, file_path)
+
+
+REGISTRY = MetricsRegistry()
+
+REQUESTS = REGISTRY.counter('requests_total', 'JSON-RPC requests by method and outcome',
+                            ['method', 'status'])
+REQUEST_SECONDS = REGISTRY.histogram('request_duration_seconds',
+                                     'JSON-RPC request latency by method', ['method'])
+REQUESTS_IN_FLIGHT = REGISTRY.gauge('requests_in_flight', 'JSON-RPC requests being handled',
+                                    ['method'])
+STAGE_SECONDS = REGISTRY.histogram('import_stage_duration_seconds',
+                                   'wall time of traced import stages', ['stage'])
+STAGE_BYTES = REGISTRY.counter('import_stage_bytes_total',
+                               'bytes processed by traced import stages, e.g. parse_file for '
+                               'bytes parsed and serialize_profile for bytes saved', ['stage'])
+CLIENT_CALL_SECONDS = REGISTRY.histogram('client_call_duration_seconds',
+                                         'latency of remote service calls',
+                                         ['service', 'method', 'status'])
+CACHE_REQUESTS = REGISTRY.counter('cache_requests_total', 'cache lookups by cache and result',
+                                  ['cache', 'result'])
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram('import_admission_wait_seconds',
+                                            'time imports queued for host budget')
+LOG_RECORDS_DROPPED = REGISTRY.counter('log_records_dropped_total',
+                                       'log records dropped because the log queue was full')
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def record_span(span):
+    """
+    record_span: observe a finished StageTracer span as a client call or import stage
+    """
+    if span.attributes.get('kind') == 'client':
+        service, _, method = span.name.partition('.')
+        CLIENT_CALL_SECONDS.labels(service, method,
+                                   'error' if span.error else 'ok').observe(span.wall_time)
+        return
+
+    STAGE_SECONDS.labels(span.name).observe(span.wall_time)
+    if span.bytes:
+        STAGE_BYTES.labels(span.name).inc(span.bytes)
+
+
+@contextmanager
+def track_request(method):
+    """
+    track_request: count and time the enclosed request of method
+    """
+    REQUESTS_IN_FLIGHT.labels(method).inc()
+    REGISTRY.flush()
+    start = time.perf_counter()
+    status = 'error'
+    try:
+        yield
+        status = 'ok'
+    finally:
+        REQUEST_SECONDS.labels(method).observe(time.perf_counter() - start)
+        REQUESTS_IN_FLIGHT.labels(method).dec()
+        REQUESTS.labels(method, status).inc()
+        REGISTRY.flush()
@@ -0,0 +1,218 @@
+import functools
+import json
+import logging
+import os
+import resource
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from FunctionalProfileUtil.Utils.MemoryBudget import current_rss, format_size
+from FunctionalProfileUtil.Utils.ServiceMetrics import record_span
+
+
+def _peak_rss():
+    # ru_maxrss is reported in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Span:
+    """
+    Span: one timed stage of a trace
+    """
+
+    def __init__(self, name, span_id, parent_id, attributes, trace_start):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.bytes = 0
+        self.error = None
+        self.start_offset = time.time() - trace_start if trace_start else 0.0
+        self.wall_time = None
+        self.cpu_time = None
+        self.peak_rss = None
+        self.rss_growth = None
+        self.rss = None
+        self.rss_delta = None
+
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        self._peak_rss_start = _peak_rss()
+        self._rss_start = current_rss()
+
+    def add_bytes(self, n_bytes):
+        """
+        add_bytes: count n_bytes as processed by this span
+        """
+        self.bytes += n_bytes
+
+    def finish(self):
+        self.wall_time = time.perf_counter() - self._wall_start
+        self.cpu_time = time.thread_time() - self._cpu_start
+        self.peak_rss = _peak_rss()
+        self.rss_growth = self.peak_rss - self._peak_rss_start
+        self.rss = current_rss()
+        self.rss_delta = self.rss - self._rss_start
+
+    def to_dict(self):
+        return {'span_id': self.span_id,
+                'parent_id': self.parent_id,
+                'name': self.name,
+                'attributes': self.attributes,
+                'start_offset': self.start_offset,
+                'wall_time': self.wall_time,
+                'cpu_time': self.cpu_time,
+                'bytes': self.bytes,
+                'peak_rss': self.peak_rss,
+                'rss_growth': self.rss_growth,
+                'rss': self.rss,
+                'rss_delta': self.rss_delta,
+                'error': self.error}
+
+
+class TracedClient:
+    """
+    TracedClient: wraps a service client so every method call is a span of the active trace
+    """
+
+    def __init__(self, tracer, client, client_name):
+        self._tracer = tracer
+        self._client = client
+        self._client_name = client_name
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def traced_call(*args, **kwargs):
+            with self._tracer.span('{}.{}'.format(self._client_name, name), kind='client'):
+                return attr(*args, **kwargs)
+
+        return traced_call
+
+
+class StageTracer:
+    """
+    StageTracer: nested spans recording wall time, CPU time, bytes processed, resident memory
+                 and peak RSS of each import stage and remote client call
+
+    a trace is collected per thread, written as JSON into trace_dir and summarized in the log
+    once its root span ends. spans opened outside of a trace are not recorded.
+    """
+
+    def __init__(self, trace_dir):
+        self.trace_dir = trace_dir
+        self._local = threading.local()
+
+    def _active(self):
+        return getattr(self._local, 'trace', None)
+
+    @contextmanager
+    def _open_span(self, trace, name, attributes):
+        stack = trace['stack']
+        span = Span(name, len(trace['spans']), stack[-1].span_id if stack else None,
+                    attributes, trace['started'])
+        trace['spans'].append(span)
+        stack.append(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = '{}: {}'.format(type(e).__name__, e)
+            raise
+        finally:
+            span.finish()
+            stack.pop()
+            record_span(span)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        span: time the enclosed stage as a child of the current span
+
+        yields the Span so the stage can count its bytes with add_bytes
+        """
+        trace = self._active()
+        if trace is None:
+            yield Span(name, None, None, attributes, None)
+            return
+
+        with self._open_span(trace, name, attributes) as span:
+            yield span
+
+    @contextmanager
+    def trace(self, name, **attributes):
+        """
+        trace: start a new trace with root span name, or a nested span if a trace is already
+               active in this thread
+        """
+        if self._active() is not None:
+            with self.span(name, **attributes) as span:
+                yield span
+            return
+
+        trace = {'trace_id': str(uuid.uuid4()), 'name': name, 'started': time.time(),
+                 'spans': list(), 'stack': list()}
+        self._local.trace = trace
+        try:
+            with self._open_span(trace, name, attributes) as span:
+                yield span
+        finally:
+            self._local.trace = None
+            self._write_trace(trace)
+
+    def trace_client(self, client, client_name):
+        """
+        trace_client: client whose method calls are recorded as spans
+        """
+        return TracedClient(self, client, client_name)
+
+    def _write_trace(self, trace):
+        spans = [span.to_dict() for span in trace['spans']]
+        trace_path = os.path.join(self.trace_dir,
+                                  '{}_{}.json'.format(trace['name'], trace['trace_id']))
+        try:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            with open(trace_path, 'w') as trace_file:
+                json.dump({'trace_id': trace['trace_id'],
+                           'name': trace['name'],
+                           'started': trace['started'],
+                           'spans': spans}, trace_file, indent=1)
+        except Exception as e:
+            logging.warning('failed to write trace {}: {}'.format(trace_path, e))
+            trace_path = None
+
+        depths = dict()
+        summary = ['trace {} ({})'.format(trace['name'], trace_path)]
+        for span in spans:
+            depth = depths[span['span_id']] = depths.get(span['parent_id'], -1) + 1
+            line = '{}{}: {:.3f}s wall, {:.3f}s cpu, rss {} ({}{}), peak rss {}'.format(
+                                                    '  ' * depth, span['name'],
+                                                    span['wall_time'], span['cpu_time'],
+                                                    format_size(span['rss']),
+                                                    '-' if span['rss_delta'] < 0 else '+',
+                                                    format_size(abs(span['rss_delta'])),
+                                                    format_size(span['peak_rss']))
+            if span['bytes']:
+                line += ', {}'.format(format_size(span['bytes']))
+            if span['error']:
+                line += ', failed: {}'.format(span['error'])
+            summary.append(line)
+        logging.info('\n'.join(summary))
+
+
+def traced(name):
+    """
+    traced: run the decorated method in a trace of self.tracer, or in a span of the trace
+            already active
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.tracer.trace(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
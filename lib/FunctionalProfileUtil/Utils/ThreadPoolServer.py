@@ -0,0 +1,130 @@
+import functools
+import logging
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+BUSY_BODY = (b'{"version": "1.1", "error": {"name": "Server busy", "code": -32000, '
+             b'"message": "Too many queued requests, retry later"}}')
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        logging.debug('%s - ' + format, self.address_string(), *args)
+
+
+def _busy_app(environ, start_response, max_body_size=None, chunk_size=1 << 16):
+    # read and drop the body, closing a socket with unread input resets the connection before
+    # the client sees the response. bodies over max_body_size are not worth the accepting
+    # thread's time, those clients get the reset
+    try:
+        body_size = int(environ.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        body_size = 0
+    remaining = body_size if not max_body_size or body_size <= max_body_size else 0
+    while remaining > 0:
+        chunk = environ['wsgi.input'].read(min(chunk_size, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+    start_response('503 Service Unavailable', [('content-type', 'application/json'),
+                                               ('content-length', str(len(BUSY_BODY))),
+                                               ('Retry-After', '1')])
+    return [BUSY_BODY]
+
+
+class _BusyServer:
+    # stands in for the server while a rejected request is answered from the accepting thread
+
+    def __init__(self, server):
+        self.base_environ = server.base_environ
+        self.max_request_size = server.max_request_size
+
+    def get_app(self):
+        return functools.partial(_busy_app, max_body_size=self.max_request_size)
+
+
+class ThreadPoolServer(WSGIServer):
+    """
+    ThreadPoolServer: WSGI server handling requests in a pool of worker threads
+
+    up to threads requests run at once and up to max_queue more wait for a free worker, any
+    further connection is answered with 503 by the accepting thread, which reads request bodies
+    up to max_request_size bytes for that. shutdown stops accepting and close waits for the
+    running and queued requests to finish.
+    """
+
+    REJECT_TIMEOUT = 5  # seconds to read a rejected request and write the 503
+
+    def __init__(self, server_address, app, threads=4, max_queue=16, max_request_size=None):
+        if threads < 1 or max_queue < 0:
+            raise ValueError('Invalid server pool: {} threads, {} queued requests'.format(
+                                                                            threads, max_queue))
+        # the listen backlog holds connections while the accepting thread is busy
+        self.request_queue_size = max(self.request_queue_size, max_queue)
+        WSGIServer.__init__(self, server_address, _QuietRequestHandler)
+        self.set_app(app)
+        self.threads = threads
+        self.max_queue = max_queue
+        self.max_request_size = max_request_size
+        self._slots = threading.BoundedSemaphore(threads + max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=threads,
+                                            thread_name_prefix='server_worker')
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            self._reject_request(request, client_address)
+            return
+        try:
+            self._executor.submit(self._process_request, request, client_address)
+        except RuntimeError:
+            # the pool is shutting down
+            self._slots.release()
+            self._reject_request(request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def _reject_request(self, request, client_address):
+        logging.warning('server busy, rejecting request from {}'.format(client_address[0]))
+        try:
+            request.settimeout(self.REJECT_TIMEOUT)
+            _QuietRequestHandler(request, client_address, _BusyServer(self))
+        except Exception:
+            logging.debug('failed to reject request', exc_info=True)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        WSGIServer.server_close(self)
+        self._executor.shutdown(wait=True)
+
+
+def serve_until_signal(httpd, signals=(signal.SIGTERM, signal.SIGINT)):
+    """
+    serve_until_signal: serve httpd until one of signals arrives, then finish the accepted
+                        requests and close it
+
+    must be called from the main thread
+    """
+    def _stop(signum, frame):
+        logging.info('received signal {}, finishing requests'.format(signum))
+        # shutdown blocks until serve_forever returns, so it cannot run in the serving thread
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
+
+    previous = {signum: signal.signal(signum, _stop) for signum in signals}
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+    logging.info('server stopped')
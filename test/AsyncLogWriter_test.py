@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+import unittest
+
+from FunctionalProfileUtil.Utils.AsyncLogWriter import AsyncLogWriter
+from FunctionalProfileUtil.Utils.ServiceMetrics import LOG_RECORDS_DROPPED
+
+ERR = 3
+INFO = 6
+
+
+class SlowLog:
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.messages = list()
+        self.threads = set()
+        self.unblocked = threading.Event()
+        self.unblocked.set()
+
+    def log_message(self, level, message):
+        self.unblocked.wait()
+        time.sleep(self.delay)
+        self.threads.add(threading.current_thread().name)
+        self.messages.append(message)
+
+
+class AsyncLogWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.writer = AsyncLogWriter(max_queue=5, put_timeout=0.2)
+        self.writer.FLUSH_INTERVAL = 0.01
+
+    def tearDown(self):
+        self.writer.close()
+
+    def test_background_writes(self):
+        log = SlowLog(delay=0.01)
+        start = time.perf_counter()
+        for i in range(5):
+            self.writer.submit(INFO, log.log_message, INFO, 'message {}'.format(i))
+        # the request thread does not wait for the writes
+        self.assertLess(time.perf_counter() - start, 0.04)
+
+        self.assertTrue(self.writer.flush(timeout=5))
+        self.assertEqual(log.messages, ['message {}'.format(i) for i in range(5)])
+        self.assertEqual(log.threads, {'AsyncLogWriter'})
+
+    def test_drop_policy(self):
+        dropped = LOG_RECORDS_DROPPED.labels().value
+        log = SlowLog()
+        log.unblocked.clear()
+        self.writer.submit(INFO, log.log_message, INFO, 'first')
+        time.sleep(0.05)
+        for i in range(5):
+            self.writer.submit(INFO, log.log_message, INFO, 'queued {}'.format(i))
+
+        # a full queue drops info records right away, errors wait put_timeout for room
+        start = time.perf_counter()
+        self.writer.submit(INFO, log.log_message, INFO, 'dropped')
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.writer.submit(ERR, log.log_message, ERR, 'dropped error')
+        self.assertGreaterEqual(time.perf_counter() - start, 0.2)
+
+        threading.Timer(0.1, log.unblocked.set).start()
+        self.writer.submit(ERR, log.log_message, ERR, 'error')
+        self.assertTrue(self.writer.flush(timeout=5))
+
+        self.assertEqual(log.messages, ['first'] + ['queued {}'.format(i) for i in range(5)] +
+                         ['error'])
+        self.assertEqual(LOG_RECORDS_DROPPED.labels().value, dropped + 2)
+        self.assertEqual(self.writer.dropped, 0)
+
+    def test_disabled(self):
+        writer = AsyncLogWriter(enabled=False)
+        log = SlowLog()
+        writer.submit(INFO, log.log_message, INFO, 'message')
+        self.assertEqual(log.messages, ['message'])
+        self.assertEqual(log.threads, {threading.current_thread().name})
+
+    def test_close(self):
+        log = SlowLog(delay=0.01)
+        for i in range(3):
+            self.writer.submit(INFO, log.log_message, INFO, 'message {}'.format(i))
+        self.writer.close()
+        self.assertEqual(len(log.messages), 3)
+        self.assertFalse(self.writer._thread.is_alive())
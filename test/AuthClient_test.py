@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+import unittest
+from unittest import mock
+
+from FunctionalProfileUtil.Utils.AuthClient import KBaseAuth, TokenCache
+
+
+class Response:
+
+    def __init__(self, user_id):
+        self.ok = True
+        self.user_id = user_id
+
+    def json(self):
+        return {'user_id': self.user_id}
+
+
+class TokenCacheTest(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = TokenCache(maxsize=3)
+        for i in range(3):
+            cache.add_valid_token('token_{}'.format(i), 'user_{}'.format(i))
+        # token_0 is used, so token_1 is the least recently used one
+        self.assertEqual(cache.get_user('token_0'), 'user_0')
+        cache.add_valid_token('token_3', 'user_3')
+
+        self.assertEqual(len(cache._cache), 3)
+        self.assertIsNone(cache.get_user('token_1'))
+        for i in [0, 2, 3]:
+            self.assertEqual(cache.get_user('token_{}'.format(i)), 'user_{}'.format(i))
+
+    def test_expiry(self):
+        cache = TokenCache()
+        cache._MAX_TIME_SEC = 0.05
+        cache.add_valid_token('token', 'user')
+        self.assertEqual(cache.get_user('token'), 'user')
+        time.sleep(0.1)
+        self.assertIsNone(cache.get_user('token'))
+        self.assertEqual(len(cache._cache), 0)
+
+        with self.assertRaisesRegex(ValueError, 'Must supply user'):
+            cache.add_valid_token('token', None)
+
+
+class KBaseAuthTest(unittest.TestCase):
+
+    def test_single_flight(self):
+        auth = KBaseAuth('http://localhost/auth')
+        calls = list()
+
+        def post(url, data):
+            calls.append(data['token'])
+            time.sleep(0.2)
+            if data['token'] == 'bad_token':
+                raise ValueError('auth service down')
+            return Response('user_of_' + data['token'])
+
+        results = list()
+        errors = list()
+
+        def lookup(token):
+            try:
+                results.append(auth.get_user(token))
+            except ValueError as e:
+                errors.append(str(e))
+
+        with mock.patch.object(auth._session, 'post', side_effect=post):
+            threads = [threading.Thread(target=lookup, args=(token,))
+                       for token in ['token'] * 5 + ['other_token'] + ['bad_token'] * 3]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(sorted(calls), ['bad_token', 'other_token', 'token'])
+            self.assertEqual(sorted(results), ['user_of_other_token'] + ['user_of_token'] * 5)
+            self.assertEqual(errors, ['auth service down'] * 3)
+
+            # cached users need no call, failed lookups are retried
+            self.assertEqual(auth.get_user('token'), 'user_of_token')
+            with self.assertRaises(ValueError):
+                auth.get_user('bad_token')
+            self.assertEqual(len(calls), 4)
+            self.assertEqual(auth._pending, {})
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from FunctionalProfileUtil.Utils.BatchRunner import BatchRunner, iter_batch_requests
+
+
+class BatchRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.output_path = os.path.join(self.work_dir, 'results.jsonl')
+        self.threads = set()
+        self.ran = list()
+        self.flaky_fixed = False
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def run_request(self, request):
+        self.threads.add(threading.current_thread().name)
+        self.ran.append(request['params'][0]['name'])
+        time.sleep(0.05)
+        if request['params'][0]['name'] == 'broken':
+            raise RuntimeError('import failed')
+        if request['params'][0]['name'] == 'flaky' and not self.flaky_fixed:
+            return {'error': {'message': 'service unavailable'}}, 500
+        if request['params'][0]['name'] == 'invalid':
+            return {'error': {'message': 'invalid params'}}, 500
+        return {'result': [request['params'][0]['name']]}, 0
+
+    def write_jsonl(self, names):
+        input_path = os.path.join(self.work_dir, 'requests.jsonl')
+        with open(input_path, 'w') as input_file:
+            for name in names:
+                input_file.write(json.dumps({'method': 'FunctionalProfileUtil.status',
+                                             'params': [{'name': name}]}) + '\n\n')
+        return input_path
+
+    def results(self):
+        with open(self.output_path) as output_file:
+            return {result['request']: result for result in map(json.loads, output_file)}
+
+    def test_jsonl_batch(self):
+        input_path = self.write_jsonl(['a', 'b', 'invalid', 'broken', 'c'])
+
+        runner = BatchRunner(self.run_request, workers=3)
+        self.assertEqual(runner.run(input_path, self.output_path), 500)
+        self.assertEqual(len(self.threads), 3)
+
+        results = self.results()
+        self.assertEqual(sorted(results), ['1', '3', '5', '7', '9'])
+        self.assertEqual(results['1']['result'], {'result': ['a']})
+        self.assertEqual(results['1']['exit_code'], 0)
+        self.assertEqual(results['5']['exit_code'], 500)
+        self.assertEqual(results['7']['exit_code'], 500)
+        self.assertEqual(results['7']['result']['error']['message'], 'import failed')
+
+        # a rerun skips the requests that succeeded, also with a line cut short by an
+        # interruption, and retries the failed ones
+        with open(self.output_path, 'a') as output_file:
+            output_file.write('{"request": "11", "exit')
+        input_path = self.write_jsonl(['a', 'b', 'invalid', 'broken', 'c', 'd'])
+        self.ran = list()
+        self.assertEqual(runner.run(input_path, self.output_path), 500)
+        self.assertEqual(sorted(self.ran), ['broken', 'd', 'invalid'])
+
+    def test_resume_after_failure(self):
+        input_path = self.write_jsonl(['a', 'flaky', 'b'])
+        runner = BatchRunner(self.run_request)
+        self.assertEqual(runner.run(input_path, self.output_path), 500)
+        self.assertEqual(self.results()['3']['exit_code'], 500)
+
+        self.flaky_fixed = True
+        self.ran = list()
+        self.assertEqual(runner.run(input_path, self.output_path), 0)
+        self.assertEqual(self.ran, ['flaky'])
+        # the retry appends its line, the latest result of a request is its last line
+        results = self.results()
+        self.assertEqual(results['3']['exit_code'], 0)
+        self.assertEqual(results['3']['result'], {'result': ['flaky']})
+
+        self.ran = list()
+        self.assertEqual(runner.run(input_path, self.output_path), 0)
+        self.assertEqual(self.ran, [])
+
+    def test_directory_batch(self):
+        request_dir = os.path.join(self.work_dir, 'requests')
+        os.makedirs(request_dir)
+        for name in ['b', 'a']:
+            with open(os.path.join(request_dir, name + '.json'), 'w') as request_file:
+                json.dump({'method': 'FunctionalProfileUtil.status', 'params': [{'name': name}]},
+                          request_file)
+        with open(os.path.join(request_dir, 'notes.txt'), 'w') as notes_file:
+            notes_file.write('not a request')
+
+        self.assertEqual([request_id for request_id, _ in iter_batch_requests(request_dir)],
+                         ['a.json', 'b.json'])
+        self.assertEqual(BatchRunner(self.run_request).run(request_dir, self.output_path), 0)
+        self.assertEqual(self.ran, ['a', 'b'])
+        self.assertEqual(sorted(self.results()), ['a.json', 'b.json'])
+
+    def test_invalid_request(self):
+        input_path = self.write_jsonl(['a'])
+        with open(input_path, 'a') as input_file:
+            input_file.write('{"method": \n')
+
+        with self.assertRaisesRegex(ValueError, 'Invalid request on line 3'):
+            BatchRunner(self.run_request).run(input_path, self.output_path)
+        self.assertEqual(self.ran, [])
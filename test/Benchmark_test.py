@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+import pandas as pd
+
+from benchmark.ProfileGenerator import ProfileGenerator
+from benchmark.run_benchmark import check_baselines, run_case
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.generator = ProfileGenerator(os.path.join(self.work_dir, 'profiles'))
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_generate_profiles(self):
+        for file_format, sep in [('tsv', '\t'), ('csv', ','), ('tsv.gz', '\t')]:
+            file_path = self.generator.generate(50, 30, 'sparse', file_format)
+            df = pd.read_csv(file_path, sep=sep, index_col=0)
+            self.assertEqual(df.shape, (50, 30))
+            self.assertEqual(df.columns[-1], 'sample_29')
+            self.assertEqual(df.index[-1], 'func_49')
+            self.assertLess((df.values != 0).mean(), 0.2)
+
+        file_path = self.generator.generate(5, 30, 'dense', 'xlsx')
+        with zipfile.ZipFile(file_path) as xlsx:
+            sheet = xlsx.read('xl/worksheets/sheet1.xml').decode()
+        self.assertIn('<t>sample_29</t>', sheet)
+        self.assertIn('r="AE6"', sheet)
+
+        with self.assertRaisesRegex(ValueError, 'Unsupported profile format'):
+            self.generator.generate(5, 5, 'dense', 'json')
+
+    def test_run_case(self):
+        case = {'n_rows': 60, 'n_cols': 12, 'density': 'dense', 'file_format': 'tsv',
+                'work_dir': self.work_dir,
+                'file_path': self.generator.generate(60, 12, 'dense', 'tsv')}
+        result = run_case(case)
+
+        self.assertIsNone(result['error'])
+        self.assertEqual(result['case'], '60x12_dense_tsv')
+        self.assertGreater(result['throughput'], 0)
+        for stage in ['import_func_profile', 'parse_file', 'save_profile', 'build_report',
+                      'DataFileUtil.save_objects', 'KBaseReport.create_extended_report']:
+            self.assertIn(stage, result['stages'])
+
+        baselines = {result['case']: {'latency': result['latency'] / 2,
+                                      'peak_rss': result['peak_rss']}}
+        regressions = check_baselines([result], baselines)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn('latency', regressions[0])
@@ -13,6 +13,7 @@ from FunctionalProfileUtil.authclient import KBaseAuth as _KBaseAuth
 
 from installed_clients.WorkspaceClient import Workspace
 from installed_clients.DataFileUtilClient import DataFileUtil
+from installed_clients.WsLargeDataIOClient import WsLargeDataIO
 from installed_clients.FakeObjectsForTestsClient import FakeObjectsForTests
 
 DATA_IDS = ['PB-Low-5', 'PB-High-5', 'PB-Low-6', 'PB-High-6',
@@ -243,14 +244,20 @@ class FunctionalProfileUtilTest(unittest.TestCase):
 
         self.assertEqual(func_profile_data['data_epistemology'], 'predicted')
         self.assertEqual(func_profile_data['epistemology_method'], 'FAPROTAX')
+        values = func_profile_data['data']['values']
 
-        # import profile large size
+        # import profile large size, without a content hash the profile is saved again. objects
+        # between 200MB and 1GB are saved via WsLargeDataIO with their values
         MB_300 = 300 * 1024 * 1024
         with patch.object(DataFileUtil, "get_objects", side_effect=self.mock_get_objects):
-            with patch.object(ProfileImporter, "_calculate_object_size", return_value=MB_300):
+            with patch.object(ProfileImporter, "_calculate_object_size",
+                              return_value=(MB_300, None)), \
+                    patch.object(WsLargeDataIO, "save_objects", autospec=True,
+                                 side_effect=WsLargeDataIO.save_objects) as save_large_objects:
                 func_profile_ref = self.serviceImpl.import_func_profile(
                                                                     self.ctx,
                                                                     params)[0]['func_profile_ref']
+        save_large_objects.assert_called_once()
 
         func_profile_data = self.dfu.get_objects(
                                             {'object_refs': [func_profile_ref]})['data'][0]['data']
@@ -263,6 +270,8 @@ class FunctionalProfileUtilTest(unittest.TestCase):
         self.assertEqual(func_profile_data['profile_category'], 'organism')
         self.assertEqual(func_profile_data['profile_type'], 'Amplicon')
         self.assertCountEqual(data_ids, func_profile_data['data']['row_ids'])
+        self.assertEqual(func_profile_data['data']['values'], values)
+        self.assertNotIn('values_handle_ref', func_profile_data['data'])
 
         self.assertEqual(func_profile_data['data_epistemology'], 'predicted')
         self.assertEqual(func_profile_data['epistemology_method'], 'FAPROTAX')
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from FunctionalProfileUtil.Utils.HeatmapClusterer import HeatmapClusterer
+
+
+class HeatmapClustererTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.clusterer = HeatmapClusterer(self.cache_dir)
+
+        # two groups of rows, interleaved
+        rng = np.random.RandomState(0)
+        self.values = rng.rand(60, 12) * 0.1
+        self.values[::2, :6] += 5
+        self.values[1::2, 6:] += 5
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def assertGrouped(self, order):
+        groups = order % 2
+        # the two interleaved groups end up in two contiguous blocks
+        self.assertEqual(np.count_nonzero(np.diff(groups)), 1)
+
+    def test_cluster(self):
+        clustering = self.clusterer.cluster(self.values)
+
+        self.assertEqual(sorted(clustering['row_order']), list(range(60)))
+        self.assertEqual(sorted(clustering['col_order']), list(range(12)))
+        self.assertGrouped(clustering['row_order'])
+        self.assertEqual(clustering['row_linkage'].shape, (59, 4))
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_subsampled_cluster(self):
+        self.clusterer.MAX_CLUSTER_SIZE = 10
+        self.clusterer.CHUNK_CELLS = 50
+
+        clustering = self.clusterer.cluster(self.values)
+
+        self.assertEqual(sorted(clustering['row_order']), list(range(60)))
+        self.assertGrouped(clustering['row_order'])
+        self.assertEqual(clustering['row_linkage'].shape, (9, 4))
+
+    def test_cached_cluster(self):
+        clustering = self.clusterer.cluster(self.values, content_hash='abc')
+        self.assertEqual(os.listdir(self.cache_dir), ['abc_ward_euclidean.npz'])
+
+        with mock.patch.object(HeatmapClusterer, '_cluster_axis') as cluster_axis:
+            cached = self.clusterer.cluster(self.values, content_hash='abc')
+            cluster_axis.assert_not_called()
+        for key in clustering:
+            np.testing.assert_array_equal(cached[key], clustering[key])
+
+        # a cached result for another shape is not reused
+        other = self.clusterer.cluster(self.values[:30], content_hash='abc')
+        self.assertEqual(len(other['row_order']), 30)
+
+    def test_large_matrix(self):
+        self.clusterer.MAX_CLUSTER_CELLS = 100
+
+        self.assertIsNone(self.clusterer.cluster(self.values))
+
+    def test_cache_eviction(self):
+        self.clusterer.cluster(self.values, content_hash='first')
+        cache_file_size = os.path.getsize(os.path.join(self.cache_dir,
+                                                       'first_ward_euclidean.npz'))
+        self.clusterer.max_cache_size = 2 * cache_file_size
+
+        self.clusterer.cluster(self.values, content_hash='second')
+        os.utime(os.path.join(self.cache_dir, 'first_ward_euclidean.npz'), (1, 1))
+        os.utime(os.path.join(self.cache_dir, 'second_ward_euclidean.npz'), (2, 2))
+        # a cache hit makes first the most recently used result
+        self.clusterer.cluster(self.values, content_hash='first')
+        self.clusterer.cluster(self.values, content_hash='third')
+
+        self.assertEqual(sorted(os.listdir(self.cache_dir)),
+                         ['first_ward_euclidean.npz', 'third_ward_euclidean.npz'])
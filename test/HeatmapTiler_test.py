@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from FunctionalProfileUtil.Utils.HeatmapTiler import HeatmapTiler
+
+
+class HeatmapTilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_directory = tempfile.mkdtemp()
+
+        self.tiler = HeatmapTiler()
+        self.tiler.TILE_SIZE = 16
+        self.tiler.OVERVIEW_SIZE = 10
+        self.tiler.MAX_TILED_CELLS = 60 * 40
+        self.tiler.CHUNK_CELLS = 500
+
+        rng = np.random.RandomState(0)
+        self.values = rng.rand(100, 70)
+        self.values[5, 7] = np.nan
+        self.values[:, 3] *= 100  # highest variance column
+        self.row_ids = ['row_{}'.format(i) for i in range(100)]
+        self.col_ids = ['col_{}'.format(i) for i in range(70)]
+
+    def tearDown(self):
+        shutil.rmtree(self.output_directory)
+
+    def load_level(self, heatmap_index, level):
+        tile_size = heatmap_index['tile_size']
+        colors = np.zeros((level['n_rows'], level['n_cols']), dtype=np.uint8)
+        level_dir = os.path.join(self.output_directory, 'heatmap_tiles', str(level['level']))
+        for tile_name in os.listdir(level_dir):
+            tile_row, tile_col = map(int, tile_name[:-len('.bin')].split('_'))
+            tile_rows = min(tile_size, level['n_rows'] - tile_row * tile_size)
+            with open(os.path.join(level_dir, tile_name), 'rb') as tile_file:
+                tile = np.frombuffer(tile_file.read(), dtype=np.uint8).reshape(tile_rows, -1)
+            colors[tile_row * tile_size:tile_row * tile_size + tile.shape[0],
+                   tile_col * tile_size:tile_col * tile_size + tile.shape[1]] = tile
+
+        return colors
+
+    def test_build_heatmap(self):
+        viewer_page = self.tiler.build_heatmap(self.values, self.row_ids, self.col_ids,
+                                               self.output_directory)
+
+        self.assertTrue(os.path.isfile(os.path.join(self.output_directory, viewer_page)))
+        with open(os.path.join(self.output_directory, 'heatmap_tiles',
+                               'heatmap_index.json')) as index_file:
+            heatmap_index = json.load(index_file)
+
+        vmin, vmax = heatmap_index['value_range']
+        self.assertEqual((vmin, vmax), (np.nanmin(self.values), np.nanmax(self.values)))
+
+        levels = heatmap_index['levels']
+        self.assertEqual([level['level'] for level in levels], list(range(len(levels))))
+        finest = levels[-1]
+        self.assertLessEqual(finest['n_rows'] * finest['n_cols'], self.tiler.MAX_TILED_CELLS)
+        self.assertLessEqual(levels[0]['n_rows'], 16)
+        self.assertLessEqual(levels[0]['n_cols'], 16)
+
+        for level in levels:
+            row_factor, col_factor = level['row_factor'], level['col_factor']
+            self.assertEqual(level['n_rows'], -(-100 // row_factor))
+            self.assertEqual(level['n_cols'], -(-70 // col_factor))
+
+            expected = np.zeros((level['n_rows'], level['n_cols']), dtype=np.uint8)
+            for i in range(level['n_rows']):
+                for j in range(level['n_cols']):
+                    block = self.values[i * row_factor:(i + 1) * row_factor,
+                                        j * col_factor:(j + 1) * col_factor]
+                    expected[i, j] = np.rint((np.nanmean(block) - vmin) / (vmax - vmin) * 254)
+            np.testing.assert_array_equal(self.load_level(heatmap_index, level), expected)
+
+        overview = heatmap_index['overview']
+        self.assertEqual(overview['method'], 'variance')
+        self.assertEqual((overview['n_rows'], overview['n_cols']), (10, 10))
+        self.assertIn('col_3', overview['col_ids'])
+
+    def test_missing_values(self):
+        self.values[:40] = np.nan
+        self.tiler.build_heatmap(self.values, self.row_ids, self.col_ids, self.output_directory)
+
+        with open(os.path.join(self.output_directory, 'heatmap_tiles',
+                               'heatmap_index.json')) as index_file:
+            heatmap_index = json.load(index_file)
+        finest = heatmap_index['levels'][-1]
+        colors = self.load_level(heatmap_index, finest)
+
+        missing_rows = 40 // finest['row_factor']
+        self.assertTrue((colors[:missing_rows] == 255).all())
+        self.assertTrue((colors[missing_rows + 1:] < 255).all())
+
+    def test_block_overview(self):
+        tiler = HeatmapTiler(overview_method='block')
+        tiler.build_heatmap(self.values, self.row_ids, self.col_ids, self.output_directory)
+
+        with open(os.path.join(self.output_directory, 'heatmap_tiles',
+                               'heatmap_index.json')) as index_file:
+            overview = json.load(index_file)['overview']
+        self.assertEqual(overview['method'], 'block')
+        self.assertFalse(os.path.exists(os.path.join(self.output_directory, 'heatmap_tiles',
+                                                     'overview.bin')))
+
+        with self.assertRaisesRegex(ValueError, 'Unsupported'):
+            HeatmapTiler(overview_method='random')
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from FunctionalProfileUtil.Utils import ImportPlanner as planner_module
+from FunctionalProfileUtil.Utils.ImportPlanner import ImportPlanner
+from FunctionalProfileUtil.Utils.MatrixJSONEncoder import MatrixJSONEncoder
+
+
+class ImportPlannerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.scratch = tempfile.mkdtemp()
+        cls.planner = ImportPlanner()
+        cls.data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+        rng = np.random.RandomState(0)
+        cls.df = pd.DataFrame(np.round(rng.rand(6000, 40), 6),
+                              index=['row_{}'.format(i) for i in range(6000)],
+                              columns=['col_{}'.format(i) for i in range(40)])
+        cls.json_size = len(MatrixJSONEncoder().dumps({'data': {
+                                                'row_ids': cls.df.index.tolist(),
+                                                'col_ids': cls.df.columns.tolist(),
+                                                'values': cls.df.values}}))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.scratch)
+
+    def assertCloseTo(self, estimated, expected, tolerance=0.05):
+        self.assertLess(abs(estimated - expected), expected * tolerance)
+
+    def test_small_file(self):
+        import_plan = self.planner.plan(os.path.join(self.data_dir, 'func_table.tsv'))
+
+        self.assertEqual(import_plan['sep'], '\t')
+        self.assertTrue(import_plan['exact'])
+        self.assertTrue(import_plan['numeric'])
+        self.assertEqual(import_plan['layout'], 'inline')
+        self.assertEqual((import_plan['n_rows'], import_plan['n_cols']), (9, 8))
+
+    def test_large_csv_file(self):
+        file_path = os.path.join(self.scratch, 'large.csv')
+        self.df.to_csv(file_path)
+
+        import_plan = self.planner.plan(file_path)
+
+        self.assertEqual(import_plan['sep'], ',')
+        self.assertFalse(import_plan['exact'])
+        self.assertEqual(import_plan['n_cols'], 40)
+        self.assertCloseTo(import_plan['n_rows'], 6000)
+        self.assertCloseTo(import_plan['estimated_size'], self.json_size)
+
+    def test_value_precision(self):
+        file_path = os.path.join(self.scratch, 'precise.tsv')
+        df = pd.DataFrame(np.random.RandomState(1).rand(6000, 40), index=self.df.index,
+                          columns=self.df.columns)
+        df.to_csv(file_path, sep='\t')
+        encoder = MatrixJSONEncoder()
+        json_size = len(encoder.dumps({'data': {
+                                'row_ids': df.index.tolist(),
+                                'col_ids': df.columns.tolist(),
+                                'values': encoder.round_values(df.values, 3)}}))
+
+        import_plan = self.planner.plan(file_path, value_precision=3)
+
+        self.assertCloseTo(import_plan['estimated_size'], json_size)
+        self.assertLess(import_plan['estimated_size'],
+                        self.planner.plan(file_path)['estimated_size'] / 2)
+
+    def test_gzip_file(self):
+        file_path = os.path.join(self.scratch, 'large.tsv.gz')
+        with gzip.open(file_path, 'wt') as gzip_file:
+            self.df.to_csv(gzip_file, sep='\t')
+
+        import_plan = self.planner.plan(file_path)
+
+        self.assertEqual(import_plan['sep'], '\t')
+        self.assertCloseTo(import_plan['n_rows'], 6000, tolerance=0.15)
+
+    def test_layouts(self):
+        with mock.patch.object(planner_module, 'INLINE_OBJECT_LIMIT', 1024), \
+                mock.patch.object(planner_module, 'LARGE_OBJECT_LIMIT', 4096):
+            self.assertEqual(ImportPlanner.choose_layout(1024, False), 'inline')
+            self.assertEqual(ImportPlanner.choose_layout(1025, False), 'large_data')
+            self.assertEqual(ImportPlanner.choose_layout(1025, True), 'large_data')
+            self.assertEqual(ImportPlanner.choose_layout(4096, True), 'large_data')
+            self.assertEqual(ImportPlanner.choose_layout(4097, True), 'blob')
+            with self.assertRaisesRegex(ValueError, 'too large'):
+                ImportPlanner.choose_layout(4097, False)
+
+    def test_reject_large_non_numeric_file(self):
+        file_path = os.path.join(self.scratch, 'text.tsv')
+        self.df.assign(col_0='high').to_csv(file_path, sep='\t')
+
+        with mock.patch.object(planner_module, 'INLINE_OBJECT_LIMIT', 1024), \
+                mock.patch.object(planner_module, 'LARGE_OBJECT_LIMIT', 1024 * 1024):
+            with self.assertRaisesRegex(ValueError, 'too large to import'):
+                self.planner.plan(file_path)
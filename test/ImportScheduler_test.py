@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+
+from FunctionalProfileUtil.Utils.ImportScheduler import ImportCost, ImportScheduler
+
+MB = 1 << 20
+
+
+class ImportSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ledger_dir = tempfile.mkdtemp()
+        self.scheduler = ImportScheduler(self.ledger_dir, memory_budget='100M', cpu_budget=2)
+        self.scheduler.POLL_INTERVAL = 0.01
+
+    def tearDown(self):
+        shutil.rmtree(self.ledger_dir)
+
+    def ticket(self, tickets, ticket_id, memory, user_id='user', state='queued', queued_at=None):
+        tickets[ticket_id] = {'state': state, 'user_id': user_id, 'memory': memory * MB,
+                              'cpus': 1, 'queued_at': queued_at or time.time(),
+                              'host': 'other_host', 'pid': 1}
+
+    def test_estimate(self):
+        plan = {'n_rows': 1000, 'n_cols': 100, 'numeric': True, 'layout': 'inline'}
+        self.assertEqual(self.scheduler.estimate(plan, 10 * MB), ImportCost(4800000, 1))
+        self.assertEqual(self.scheduler.estimate(plan, 10 * MB, build_report=True).memory,
+                         8000000)
+        self.assertEqual(self.scheduler.estimate(dict(plan, layout='blob'), 10 * MB).memory,
+                         1600000)
+        # excel files are estimated from their size
+        self.assertEqual(self.scheduler.estimate(None, 1000).memory, 24000)
+        self.assertEqual(self.scheduler.estimate_report(1000 * 100), ImportCost(3200000, 1))
+
+    def test_no_budget(self):
+        scheduler = ImportScheduler(self.ledger_dir)
+        with scheduler.admit(ImportCost(1 << 40, 1)):
+            self.assertFalse(os.path.exists(scheduler.ledger_path))
+
+    def test_admission_order(self):
+        now = time.time()
+        tickets = dict()
+        self.ticket(tickets, 'running', 40, user_id='heavy_user', state='running')
+        self.ticket(tickets, 'large', 45, queued_at=now - 10)
+        self.ticket(tickets, 'small', 10, queued_at=now - 5)
+        self.ticket(tickets, 'heavy_user_small', 5, user_id='heavy_user', queued_at=now - 20)
+        # small imports and users without running imports go first, one CPU is left
+        self.assertEqual(self.scheduler._admissible(tickets, now), ['small'])
+
+        self.scheduler.cpu_budget = 4
+        self.assertEqual(self.scheduler._admissible(tickets, now),
+                         ['small', 'large', 'heavy_user_small'])
+
+        # a starving import reserves the freed memory instead of being passed by
+        self.ticket(tickets, 'starving', 70, queued_at=now - 1000)
+        self.assertEqual(self.scheduler._admissible(tickets, now), [])
+
+        # an import larger than the budget runs alone
+        tickets = dict()
+        self.ticket(tickets, 'huge', 500)
+        self.assertEqual(self.scheduler._admissible(tickets, now), ['huge'])
+
+    def test_admit(self):
+        started = list()
+
+        def run_import(name, memory):
+            with self.scheduler.admit(ImportCost(memory * MB, 1), user_id=name):
+                started.append(name)
+                time.sleep(0.3)
+
+        first = threading.Thread(target=run_import, args=('first', 60))
+        first.start()
+        time.sleep(0.1)
+        second = threading.Thread(target=run_import, args=('second', 60))
+        second.start()
+        time.sleep(0.1)
+        self.assertEqual(started, ['first'])
+
+        with self.scheduler.admit(ImportCost(30 * MB, 1)):
+            started.append('small')
+        self.assertEqual(started, ['first', 'small'])
+
+        first.join()
+        second.join()
+        self.assertEqual(started, ['first', 'small', 'second'])
+        with self.scheduler._ledger() as tickets:
+            self.assertEqual(tickets, {})
+
+    def test_queue_timeout_and_dead_tickets(self):
+        process = subprocess.Popen(['true'])
+        process.wait()
+        with self.scheduler._ledger() as tickets:
+            self.ticket(tickets, 'dead', 90, state='running')
+            tickets['dead'].update({'host': self.scheduler._hostname, 'pid': process.pid})
+            self.ticket(tickets, 'elsewhere', 90, state='running')
+
+        self.scheduler.queue_timeout = 0.2
+        with self.assertRaisesRegex(ValueError, 'service is busy'):
+            with self.scheduler.admit(ImportCost(50 * MB, 1)):
+                pass
+
+        with self.scheduler._ledger() as tickets:
+            self.assertEqual(list(tickets), ['elsewhere'])
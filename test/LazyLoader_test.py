@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from FunctionalProfileUtil.Utils.LazyLoader import lazy_property, lazy_property_names, preload
+
+IMPL_IMPORT_CHECK = '''
+import os, sys
+os.environ.update({'SDK_CALLBACK_URL': 'http://localhost:1', 'KB_AUTH_TOKEN': ''})
+from FunctionalProfileUtil.FunctionalProfileUtilImpl import FunctionalProfileUtil
+impl = FunctionalProfileUtil({'scratch': sys.argv[1], 'workspace-url': 'http://localhost:2'})
+print('pandas' in sys.modules)
+importer = impl.profile_importer
+print('pandas' in sys.modules, 'dfu' in vars(importer))
+impl.warm_up()
+print('dfu' in vars(importer), importer.blob_store.dfu is importer.dfu)
+'''
+
+
+class Clients:
+
+    def __init__(self):
+        self.builds = 0
+
+    @lazy_property
+    def client(self):
+        self.builds += 1
+        time.sleep(0.05)
+        return object()
+
+    @lazy_property
+    def other_client(self):
+        return self.client
+
+
+class LazyLoaderTest(unittest.TestCase):
+
+    def test_lazy_property(self):
+        clients = Clients()
+        self.assertNotIn('client', vars(clients))
+
+        threads = [threading.Thread(target=lambda: clients.client) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(clients.builds, 1)
+        self.assertIs(clients.other_client, clients.client)
+
+        replacement = object()
+        clients.client = replacement
+        self.assertIs(clients.client, replacement)
+        self.assertIsInstance(Clients.client, lazy_property)
+
+    def test_preload(self):
+        clients = Clients()
+        self.assertEqual(lazy_property_names(clients), ['client', 'other_client'])
+        preload(clients)
+        self.assertIn('client', vars(clients))
+        self.assertIn('other_client', vars(clients))
+
+    def test_impl_defers_importer(self):
+        scratch = tempfile.mkdtemp()
+        try:
+            output = subprocess.check_output(
+                [sys.executable, '-c', IMPL_IMPORT_CHECK, scratch],
+                env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        finally:
+            shutil.rmtree(scratch)
+        self.assertEqual(output.decode().split('\n')[:3],
+                         ['False', 'True False', 'True True'])
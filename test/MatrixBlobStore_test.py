@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from FunctionalProfileUtil.Utils.MatrixBlobStore import MatrixBlobStore
+
+
+class LocalFileStore:
+    """
+    LocalFileStore: stands in for the DataFileUtil blobstore calls
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.handles = dict()
+
+    def file_to_shock(self, params):
+        hid = 'KBH_{}'.format(len(self.handles))
+        stored_path = os.path.join(self.store_dir,
+                                   hid + '_' + os.path.basename(params['file_path']))
+        shutil.copy(params['file_path'], stored_path)
+        self.handles[hid] = stored_path
+
+        return {'shock_id': hid, 'handle': {'hid': hid}, 'size': os.path.getsize(stored_path)}
+
+    def shock_to_file(self, params):
+        stored_path = self.handles[params['handle_id']]
+        file_path = os.path.join(params['file_path'], os.path.basename(stored_path))
+        shutil.copy(stored_path, file_path)
+
+        return {'file_path': file_path}
+
+
+class MatrixBlobStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.blob_store = MatrixBlobStore(LocalFileStore(tempfile.mkdtemp()), self.scratch)
+
+    def test_round_trip(self):
+        values = np.random.RandomState(0).rand(30, 12)
+        values[2, 3] = np.nan
+        matrix_data = {'row_ids': ['r{}'.format(i) for i in range(30)],
+                       'col_ids': ['c{}'.format(i) for i in range(12)]}
+
+        matrix_data.update(self.blob_store.save_values(values, 'profile'))
+
+        self.assertTrue(MatrixBlobStore.is_blob_backed(matrix_data))
+        self.assertEqual(matrix_data['values_format'], 'npy.gz')
+        np.testing.assert_array_equal(self.blob_store.load_values(matrix_data), values)
+
+    def test_inline_values(self):
+        matrix_data = {'row_ids': ['r1'], 'col_ids': ['c1'], 'values': [[1.0]]}
+
+        self.assertFalse(MatrixBlobStore.is_blob_backed(matrix_data))
+        self.assertEqual(self.blob_store.load_values(matrix_data), [[1.0]])
+
+    def test_shape_mismatch(self):
+        matrix_data = {'row_ids': ['r1', 'r2'], 'col_ids': ['c1']}
+        matrix_data.update(self.blob_store.save_values(np.zeros((2, 2)), 'profile'))
+
+        with self.assertRaisesRegex(ValueError, 'does not match'):
+            self.blob_store.load_values(matrix_data)
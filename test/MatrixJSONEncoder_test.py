@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import math
+import time
+import unittest
+
+import numpy as np
+
+from FunctionalProfileUtil.Utils.MatrixJSONEncoder import MatrixJSONEncoder
+
+
+class MatrixJSONEncoderTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.encoder = MatrixJSONEncoder(chunk_size=64)
+
+    def assertSameJSON(self, values):
+        expected = json.dumps(values.tolist()).replace('NaN', 'null')
+        encoded = b''.join(self.encoder.iterencode_values(values)).decode()
+        self.assertEqual(encoded, expected)
+
+    def test_special_values(self):
+        values = np.array([[0.0, -0.0, 1.0, -1.0, 0.1, 1e15, 1e16, 1e-4, 1e-5,
+                            9.999999999999999e-5, 99999.99999999999, 123456789012345.0,
+                            1 / 3, 5e-324, 1.7976931348623157e+308, math.inf, -math.inf,
+                            math.nan]])
+        self.assertSameJSON(values)
+
+    def test_random_values(self):
+        rng = np.random.RandomState(0)
+
+        self.assertSameJSON(rng.rand(40, 33))
+        self.assertSameJSON(np.round(rng.rand(40, 33) * 1000, 4))
+        self.assertSameJSON(rng.standard_normal((40, 33)) *
+                            10.0 ** rng.randint(-8, 18, (40, 33)))
+        self.assertSameJSON(np.array([[10.0 ** k for k in range(-10, 20)],
+                                      [-9.5 * 10.0 ** k for k in range(-10, 20)]]))
+
+    def test_full_precision_values(self):
+        rng = np.random.RandomState(3)
+        # 16 and 17 digit values, next to powers of two and ten, and ties of the last digit
+        values = rng.rand(50, 40) * 10.0 ** rng.randint(-5, 16, (50, 40))
+        values[0] = np.nextafter(2.0 ** np.arange(-16, 24), 0)
+        values[1] = 2.0 ** np.arange(-16, 24)
+        values[2] = np.nextafter(10.0 ** np.arange(-5, 35) / 2 ** 17, np.inf)
+        values[3] = (rng.randint(1, 10 ** 6, 40) + 0.5) / 10 ** 6
+        values[4] = -values[4]
+        self.assertSameJSON(values)
+
+    def best_time(self, encode):
+        times = list()
+        for _ in range(5):
+            start = time.perf_counter()
+            encoded = encode()
+            times.append(time.perf_counter() - start)
+        return min(times), encoded
+
+    def test_encode_speed(self):
+        # unrounded values take the 16 and 17 digit paths
+        values = np.random.RandomState(4).rand(400, 1000)
+        encoder = MatrixJSONEncoder()
+
+        encoder_time, encoded = self.best_time(
+                                        lambda: b''.join(encoder.iterencode_values(values)))
+        json_time, expected = self.best_time(lambda: json.dumps(values.tolist()).encode())
+
+        self.assertEqual(encoded, expected)
+        self.assertLess(encoder_time, json_time)
+
+    def test_encode_integer_speed(self):
+        # counts are written by json.dumps of ints, about as fast as encoding the int lists
+        values = np.random.RandomState(5).randint(0, 5000, (400, 1000)).astype(float)
+        encoder = MatrixJSONEncoder()
+
+        encoder_time, encoded = self.best_time(
+                                        lambda: b''.join(encoder.iterencode_values(values)))
+        json_time, expected = self.best_time(
+                                        lambda: json.dumps(values.astype(int).tolist()).encode())
+
+        self.assertEqual(encoded, expected)
+        self.assertLess(encoder_time, json_time * 1.5)
+
+    def test_profile_values(self):
+        # values as built by ProfileImporter, with None for missing data
+        values = [[0, 0.0003728801, None], [5.52315E-05, 0.0189196044, 12]]
+        encoded = json.loads(b''.join(self.encoder.iterencode_values(values)))
+
+        self.assertEqual(encoded, [[0.0, 0.0003728801, None], [5.52315E-05, 0.0189196044, 12.0]])
+
+        encoded = json.loads(b''.join(self.encoder.iterencode_values([[0, None], [3.0, 12]])))
+        self.assertEqual(encoded, [[0, None], [3, 12]])
+
+    def test_integer_values(self):
+        values = np.random.RandomState(2).randint(-1000, 1000, (40, 33)).astype(float)
+        values[3, 5] = np.nan
+        values[7, 0] = 2.0 ** 53 - 1
+        encoded = b''.join(self.encoder.iterencode_values(values)).decode()
+
+        expected = [[None if math.isnan(v) else int(v) for v in row] for row in values.tolist()]
+        self.assertEqual(encoded, json.dumps(expected))
+        self.assertEqual(self.encoder.values_to_list(values), expected)
+
+        float_encoder = MatrixJSONEncoder(chunk_size=64, detect_integers=False)
+        encoded = b''.join(float_encoder.iterencode_values(values)).decode()
+        self.assertEqual(encoded, json.dumps(values.tolist()).replace('NaN', 'null'))
+
+    def test_is_integral(self):
+        self.assertTrue(MatrixJSONEncoder.is_integral(np.array([[0.0, -3.0, np.nan]])))
+        self.assertFalse(MatrixJSONEncoder.is_integral(np.array([[0.0, 0.5]])))
+        self.assertFalse(MatrixJSONEncoder.is_integral(np.array([[1.0, np.inf]])))
+        self.assertFalse(MatrixJSONEncoder.is_integral(np.array([[2.0 ** 60]])))
+
+    def test_round_values(self):
+        values = np.array([[123456.789, 0.000123456, 1 / 3, 7.0, 0.0, np.nan],
+                           [1.23456e-30, -2.5e-23, 9.87654e40, 5e-324, -np.inf, 999.6]])
+        rounded = MatrixJSONEncoder.round_values(values, 3)
+
+        np.testing.assert_array_equal(rounded, [[123000.0, 0.000123, 0.333, 7.0, 0.0, np.nan],
+                                                [1.23e-30, -2.5e-23, 9.88e40, 5e-324, -np.inf,
+                                                 1000.0]])
+        # rounded values print with at most value_precision digits
+        self.assertEqual(repr(float(rounded[0, 2])), '0.333')
+        self.assertEqual(repr(float(rounded[1, 0])), '1.23e-30')
+
+        # values of any magnitude keep value_precision significant digits
+        values = np.random.RandomState(0).rand(20, 10) * 10.0 ** np.arange(-30, 20, 5)
+        np.testing.assert_allclose(MatrixJSONEncoder.round_values(values, 15),
+                                   [[float('{:.14e}'.format(v)) for v in row] for row in values],
+                                   rtol=1e-14, atol=0)
+
+    def test_non_numeric_values(self):
+        values = [['a', 1.0], ['b', 2.0]]
+        encoded = b''.join(self.encoder.iterencode_values(values)).decode()
+
+        self.assertEqual(encoded, json.dumps(values))
+
+    def test_empty_values(self):
+        for values in ([], [[]], [[], []]):
+            encoded = b''.join(self.encoder.iterencode_values(values)).decode()
+            self.assertEqual(encoded, json.dumps(values))
+
+    def test_dump_func_profile(self):
+        values = np.round(np.random.RandomState(1).rand(20, 7), 6)
+        func_profile_data = {'profile_category': 'community',
+                             'data': {'row_ids': ['r{}'.format(i) for i in range(20)],
+                                      'col_ids': ['c{}'.format(i) for i in range(7)],
+                                      'values': values},
+                             'base_object_ref': '1/2/3'}
+        expected = dict(func_profile_data)
+        expected['data'] = dict(func_profile_data['data'], values=values.tolist())
+
+        self.assertEqual(self.encoder.dumps(func_profile_data), json.dumps(expected).encode())
+        self.assertEqual(b''.join(self.encoder.iterencode(func_profile_data, sort_keys=True)),
+                         json.dumps(expected, sort_keys=True).encode())
+
+        output = io.BytesIO()
+        size = self.encoder.dump(func_profile_data, output)
+        self.assertEqual(size, len(output.getvalue()))
+        self.assertEqual(json.loads(output.getvalue()), json.loads(json.dumps(expected)))
+
+    def test_dump_values_list(self):
+        rng = np.random.RandomState(6)
+        counts = rng.randint(0, 100, (20, 7)).astype(float)
+        counts[2, 3] = np.nan
+        for values in (np.round(rng.rand(20, 7), 6), counts):
+            func_profile_data = {'data': {'row_ids': ['r'], 'values': values}}
+            list_data = {'data': {'row_ids': ['r'],
+                                  'values': self.encoder.values_to_list(values)}}
+
+            # lists from values_to_list encode to the same bytes as their matrix
+            self.assertEqual(b''.join(self.encoder.iterencode(list_data, sort_keys=True)),
+                             b''.join(self.encoder.iterencode(func_profile_data, sort_keys=True)))
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from FunctionalProfileUtil.Utils.MemoryBudget import MemoryBudget, current_rss
+
+
+class MemoryBudgetTest(unittest.TestCase):
+
+    def test_parse_size(self):
+        self.assertEqual(MemoryBudget.parse_size('4G'), 4 << 30)
+        self.assertEqual(MemoryBudget.parse_size('512 MiB'), 512 << 20)
+        self.assertEqual(MemoryBudget.parse_size('1.5k'), 1536)
+        self.assertEqual(MemoryBudget.parse_size('1048576'), 1 << 20)
+        self.assertEqual(MemoryBudget.parse_size(1024), 1024)
+        self.assertIsNone(MemoryBudget.parse_size(''))
+        self.assertIsNone(MemoryBudget.parse_size(None))
+
+        with self.assertRaisesRegex(ValueError, 'Invalid memory budget'):
+            MemoryBudget.parse_size('lots')
+
+    def test_project(self):
+        self.assertEqual(MemoryBudget.project('parse', 1000), 16000)
+        self.assertEqual(MemoryBudget.project('parse', 1000, numeric=False), 120000)
+        self.assertEqual(MemoryBudget.project('list_conversion', 1000, numeric=False), 0)
+
+    def test_budget(self):
+        self.assertGreater(current_rss(), 0)
+
+        unlimited = MemoryBudget()
+        self.assertTrue(unlimited.fits(1 << 50))
+        unlimited.require('parse', 1 << 50)
+
+        budget = MemoryBudget(current_rss() + (64 << 20))
+        self.assertTrue(budget.fits(1 << 20))
+        self.assertFalse(budget.fits(1 << 30))
+        with self.assertRaisesRegex(ValueError, 'for the report stage'):
+            budget.require('report', 1 << 30)
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from benchmark.LocalServices import LocalObjectStore
+from benchmark.MockCallbackServer import MockCallbackServer
+from installed_clients.baseclient import ServerError
+from installed_clients.DataFileUtilClient import DataFileUtil
+from installed_clients.WorkspaceClient import Workspace
+
+
+class MockCallbackServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.store = LocalObjectStore(os.path.join(self.work_dir, 'store'))
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_submit_and_check_job(self):
+        with MockCallbackServer(self.store, job_latency=0.2) as server:
+            dfu = DataFileUtil(server.url)
+            infos = dfu.save_objects({'id': 1, 'objects': [{'name': 'profile',
+                                                            'type': 'KBaseProfile.Profile',
+                                                            'data': {'values': [1, 2]}}]})
+            self.assertEqual(infos[0][1], 'profile')
+
+            ref = '{}/{}/{}'.format(infos[0][6], infos[0][0], infos[0][4])
+            data = dfu.get_objects({'object_refs': [ref]})['data'][0]['data']
+            self.assertEqual(data, {'values': [1, 2]})
+
+            file_path = os.path.join(self.work_dir, 'report.html')
+            with open(file_path, 'w') as report_file:
+                report_file.write('<html></html>')
+            shock_id = dfu.file_to_shock({'file_path': file_path})['shock_id']
+            download_dir = os.path.join(self.work_dir, 'download')
+            os.makedirs(download_dir)
+            downloaded = dfu.shock_to_file({'shock_id': shock_id,
+                                            'file_path': download_dir})['file_path']
+            self.assertTrue(os.path.isfile(downloaded))
+
+            self.assertEqual(server.calls['DataFileUtil.save_objects'], 1)
+
+    def test_call_method(self):
+        self.store.save_object({'name': 'base_matrix', 'type': 'KBaseMatrices.AmpliconMatrix'},
+                               {'data': {}})
+        with MockCallbackServer(self.store, token='token') as server:
+            ws = Workspace(server.url, token='token')
+            infos = ws.get_object_info3({'objects': [{'name': 'base_matrix'},
+                                                     {'name': 'missing'}]})['infos']
+            self.assertEqual(infos[0][1], 'base_matrix')
+            self.assertIsNone(infos[1])
+
+            with self.assertRaisesRegex(ServerError, 'Method not found'):
+                ws.get_objects2({'objects': []})
+
+            with self.assertRaisesRegex(ServerError, 'Authentication failed'):
+                Workspace(server.url, token='other').get_object_info3({'objects': []})
+
+    def test_failure_and_latency_injection(self):
+        with MockCallbackServer(self.store, fail_methods={'DataFileUtil.save_objects'},
+                                latency=0.1) as server:
+            with self.assertRaisesRegex(ServerError, 'injected failure'):
+                DataFileUtil(server.url).save_objects({'id': 1, 'objects': []})
+
+            start = time.perf_counter()
+            Workspace(server.url).get_object_info3({'objects': []})
+            self.assertGreaterEqual(time.perf_counter() - start, 0.1)
+
+        with MockCallbackServer(self.store, failure_rate=1.0) as server:
+            status, response = server.handle_request(json.dumps(
+                {'method': 'Workspace.get_object_info3', 'params': [{'objects': []}],
+                 'version': '1.1', 'id': '1'}))
+            self.assertEqual(status, 500)
+            self.assertEqual(response['error']['code'], -32500)
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from FunctionalProfileUtil.Utils.ImportPlanner import ImportPlanner
+from FunctionalProfileUtil.Utils.ImportScheduler import ImportScheduler
+from FunctionalProfileUtil.Utils.MemoryBudget import MemoryBudget
+from FunctionalProfileUtil.Utils.ProfileImporter import ProfileImporter
+
+
+class ProfileImporterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.profile_importer = ProfileImporter({'SDK_CALLBACK_URL': 'http://localhost:5000',
+                                                 'scratch': self.scratch,
+                                                 'KB_AUTH_TOKEN': 'token',
+                                                 'workspace-url': 'http://localhost/ws'})
+        self.profile_importer.dfu = mock.Mock()
+        self.profile_importer.dfu.get_objects.return_value = {'data': [{'data': {}}]}
+
+    def tearDown(self):
+        shutil.rmtree(self.scratch)
+
+    def test_invalid_value_precision(self):
+        params = {'workspace_id': 1,
+                  'func_profile_obj_name': 'profile',
+                  'base_object_ref': '1/2/3',
+                  'profile_type': 'amplicon',
+                  'profile_category': 'community',
+                  'profile_file_path': 'profile.tsv'}
+
+        for value_precision in [0, 16, 2.5, '3', True]:
+            with self.assertRaisesRegex(ValueError, 'value precision as an integer'):
+                self.profile_importer.import_func_profile(
+                                            dict(params, value_precision=value_precision))
+
+    def object_info(self, content_hash, obj_type='KBaseProfile.FunctionalProfile-1.0'):
+        return [7, 'profile', obj_type, '2020-01-01T00:00:00+0000', 3, 'user', 12345, 'ws',
+                'checksum', 100, {'content_hash': content_hash}]
+
+    def test_fetch_saved_profile(self):
+        ws = self.profile_importer.ws = mock.Mock()
+        ws.get_object_info3.return_value = {'infos': [self.object_info('hash')]}
+
+        self.assertEqual(self.profile_importer._fetch_saved_profile(12345, 'profile', 'hash'),
+                         '12345/7/3')
+        self.assertIsNone(self.profile_importer._fetch_saved_profile(12345, 'profile', 'other'))
+        self.assertIsNone(self.profile_importer._fetch_saved_profile(12345, 'profile', None))
+
+        # workspace ids as digit strings are ids, anything else a workspace name
+        self.profile_importer._fetch_saved_profile('12345', 'profile', 'hash')
+        self.profile_importer._fetch_saved_profile('my_workspace', 'profile', 'hash')
+        self.assertEqual([call[0][0]['objects'][0] for call in ws.get_object_info3.call_args_list],
+                         [{'wsid': 12345, 'name': 'profile'}] * 2 +
+                         [{'wsid': 12345, 'name': 'profile'},
+                          {'workspace': 'my_workspace', 'name': 'profile'}])
+
+        ws.get_object_info3.return_value = {'infos': [self.object_info('hash', 'KBaseReport')]}
+        self.assertIsNone(self.profile_importer._fetch_saved_profile(12345, 'profile', 'hash'))
+        ws.get_object_info3.return_value = {'infos': [None]}
+        self.assertIsNone(self.profile_importer._fetch_saved_profile(12345, 'profile', 'hash'))
+        ws.get_object_info3.side_effect = ValueError('workspace down')
+        self.assertIsNone(self.profile_importer._fetch_saved_profile(12345, 'profile', 'hash'))
+
+    def test_save_func_profile(self):
+        func_profile_data = {'profile_category': 'community',
+                             'data': {'row_ids': ['r1', 'r2'], 'col_ids': ['c1'],
+                                      'values': np.array([[0.5], [1.0]])},
+                             'base_object_ref': '1/2/3'}
+        content_hash = self.profile_importer._calculate_object_size(func_profile_data)[1]
+        ws = self.profile_importer.ws = mock.Mock()
+        dfu = self.profile_importer.dfu
+
+        # identical content is not saved again
+        ws.get_object_info3.return_value = {'infos': [self.object_info(content_hash)]}
+        self.assertEqual(self.profile_importer._save_func_profile('12345', func_profile_data,
+                                                                  'profile'), '12345/7/3')
+        dfu.save_objects.assert_not_called()
+
+        ws.get_object_info3.return_value = {'infos': [self.object_info('old_hash')]}
+        saved_info = self.object_info(content_hash)
+        saved_info[4] = 4
+        dfu.save_objects.return_value = [saved_info]
+        self.assertEqual(self.profile_importer._save_func_profile('12345', func_profile_data,
+                                                                  'profile'), '12345/7/4')
+        saved = dfu.save_objects.call_args[0][0]['objects'][0]
+        self.assertEqual(saved['meta'], {'content_hash': content_hash})
+        self.assertEqual(saved['data']['data']['values'], [[0.5], [1.0]])
+
+    def test_save_converts_values_once(self):
+        values = np.random.RandomState(0).randint(0, 100, (20, 7)).astype(float)
+        func_profile_data = {'profile_category': 'community',
+                             'data': {'row_ids': ['r{}'.format(i) for i in range(20)],
+                                      'col_ids': ['c{}'.format(i) for i in range(7)],
+                                      'values': values},
+                             'base_object_ref': '1/2/3'}
+        profile_importer = self.profile_importer
+        profile_importer.ws = mock.Mock()
+        profile_importer.ws.get_object_info3.return_value = {'infos': [None]}
+        profile_importer.dfu.save_objects.return_value = [self.object_info('hash')]
+        profile_importer.ws_large_data = mock.Mock()
+        profile_importer.ws_large_data.save_objects.return_value = [self.object_info('hash')]
+        encoder = profile_importer.json_encoder
+
+        with mock.patch.object(encoder, 'values_to_list', wraps=encoder.values_to_list) as \
+                values_to_list, \
+                mock.patch.object(encoder, 'iterencode_values',
+                                  wraps=encoder.iterencode_values) as iterencode_values:
+            profile_importer._save_func_profile(12345, func_profile_data, 'profile',
+                                                import_plan={'layout': 'inline'})
+            # the lists that get saved are the ones measured and hashed
+            self.assertEqual(values_to_list.call_count, 1)
+            iterencode_values.assert_not_called()
+            saved = profile_importer.dfu.save_objects.call_args[0][0]['objects'][0]
+            self.assertEqual(saved['data']['data']['values'], values.astype(int).tolist())
+
+            # objects planned larger stream the matrix
+            values_to_list.reset_mock()
+            with mock.patch.object(ProfileImporter, '_calculate_object_size',
+                                   return_value=(300 * 1024 * 1024, 'hash')):
+                profile_importer._save_func_profile(12345, func_profile_data, 'profile',
+                                                    import_plan={'layout': 'large_data'})
+            values_to_list.assert_not_called()
+            self.assertEqual(iterencode_values.call_count, 1)
+            profile_importer.ws_large_data.save_objects.assert_called_once()
+
+    def test_save_planned_layout(self):
+        func_profile_data = {'profile_category': 'community',
+                             'data': {'row_ids': ['r1', 'r2'], 'col_ids': ['c1'],
+                                      'values': np.array([[0.5], [1.0]])},
+                             'base_object_ref': '1/2/3'}
+        profile_importer = self.profile_importer
+        profile_importer.ws = mock.Mock()
+        profile_importer.ws.get_object_info3.return_value = {'infos': [None]}
+        profile_importer.dfu.save_objects.return_value = [self.object_info('hash')]
+
+        # an exact plan measured the whole file, its layout is not checked again
+        with mock.patch.object(ImportPlanner, 'choose_layout',
+                               wraps=ImportPlanner.choose_layout) as choose_layout:
+            profile_importer._save_func_profile(12345, func_profile_data, 'profile',
+                                                import_plan={'layout': 'inline', 'exact': True})
+            choose_layout.assert_not_called()
+
+            profile_importer._save_func_profile(12345, func_profile_data, 'profile',
+                                                import_plan={'layout': 'inline', 'exact': False})
+            choose_layout.assert_called_once()
+        self.assertEqual(profile_importer.dfu.save_objects.call_count, 2)
+
+    def test_save_blob_profile(self):
+        values = np.array([[0.5], [1.0]])
+        func_profile_data = {'profile_category': 'community',
+                             'data': {'row_ids': ['r1', 'r2'], 'col_ids': ['c1'],
+                                      'values': values},
+                             'base_object_ref': '1/2/3'}
+        self.profile_importer.ws = mock.Mock()
+        self.profile_importer.ws.get_object_info3.return_value = {'infos': [None]}
+        self.profile_importer.blob_store = mock.Mock()
+        self.profile_importer.blob_store.save_values.return_value = {
+                                        'values_handle_ref': 'KBH_1', 'values_format': 'npy.gz'}
+        dfu = self.profile_importer.dfu
+        dfu.save_objects.return_value = [self.object_info('hash')]
+        self.profile_importer.ws_large_data = mock.Mock()
+        self.profile_importer.ws_large_data.save_objects.return_value = [self.object_info('hash')]
+
+        # only objects beyond the 1GB WsLargeDataIO limit go to the blobstore
+        with mock.patch.object(ProfileImporter, '_calculate_object_size',
+                               return_value=(300 * 1024 * 1024, 'hash')):
+            self.profile_importer._save_func_profile(12345, func_profile_data, 'profile')
+        self.profile_importer.blob_store.save_values.assert_not_called()
+        self.profile_importer.ws_large_data.save_objects.assert_called_once()
+
+        with mock.patch.object(ProfileImporter, '_calculate_object_size',
+                               return_value=(2 * 1024 * 1024 * 1024, 'hash')):
+            self.profile_importer._save_func_profile(12345, func_profile_data, 'profile')
+
+        # values stays a required, empty list next to the handle
+        saved = dfu.save_objects.call_args[0][0]['objects'][0]['data']['data']
+        self.assertEqual(saved, {'row_ids': ['r1', 'r2'], 'col_ids': ['c1'], 'values': [],
+                                 'values_handle_ref': 'KBH_1', 'values_format': 'npy.gz'})
+        self.assertIs(func_profile_data['data']['values'], values)
+
+    def test_background_report(self):
+        params = {'workspace_id': 1,
+                  'func_profile_obj_name': 'profile',
+                  'base_object_ref': '1/2/3',
+                  'profile_type': 'amplicon',
+                  'profile_category': 'community',
+                  'profile_file_path': __file__,
+                  'build_report': 1,
+                  'background_report': 1}
+        profile_importer = self.profile_importer
+        profile_importer.import_planner = mock.Mock()
+        profile_importer.import_planner.plan.return_value = None
+        func_profile_data = {'data': {'row_ids': ['r1'], 'col_ids': ['c1'], 'values': [[1.0]]}}
+        report = {'report_name': 'report', 'report_ref': '1/3/1'}
+
+        with mock.patch.multiple(profile_importer,
+                                 _fetch_profile_file=mock.Mock(return_value=__file__),
+                                 _gen_func_profile=mock.Mock(return_value=func_profile_data),
+                                 _save_func_profile=mock.Mock(return_value='1/2/1'),
+                                 _gen_func_profile_report=mock.Mock(return_value=report)), \
+                mock.patch.object(profile_importer.import_scheduler, 'estimate',
+                                  wraps=profile_importer.import_scheduler.estimate) as estimate:
+            # background reports are disabled by default, the report is built inline
+            self.assertEqual(profile_importer.import_func_profile(dict(params)),
+                             dict(report, func_profile_ref='1/2/1'))
+
+            profile_importer.background_reports = True
+            result = profile_importer.import_func_profile(dict(params))
+            self.assertEqual(list(result), ['func_profile_ref', 'report_job_id'])
+            for _ in range(1000):
+                status = profile_importer.report_worker.get_status(result['report_job_id'])
+                if status['state'] == 'done':
+                    break
+                time.sleep(0.01)
+            self.assertEqual(status['report_ref'], '1/3/1')
+
+            # an inline report is admitted with its import, a background report on its own
+            self.assertEqual([call[1]['build_report'] for call in estimate.call_args_list],
+                             [1, False])
+
+    def test_report_over_budget(self):
+        params = {'workspace_id': 1,
+                  'func_profile_obj_name': 'profile',
+                  'base_object_ref': '1/2/3',
+                  'profile_type': 'amplicon',
+                  'profile_category': 'community',
+                  'profile_file_path': __file__,
+                  'build_report': 1}
+        profile_importer = self.profile_importer
+        profile_importer.import_planner = mock.Mock()
+        profile_importer.import_planner.plan.return_value = None
+        profile_importer.memory_budget.budget = 1
+        func_profile_data = {'data': {'row_ids': ['r1'], 'col_ids': ['c1'], 'values': [[1.0]]}}
+        save_func_profile = mock.Mock(return_value='1/2/1')
+        gen_func_profile_report = mock.Mock()
+
+        with mock.patch.multiple(profile_importer,
+                                 _fetch_profile_file=mock.Mock(return_value=__file__),
+                                 _gen_func_profile=mock.Mock(return_value=func_profile_data),
+                                 _save_func_profile=save_func_profile,
+                                 _gen_func_profile_report=gen_func_profile_report):
+            # the profile is saved, only the report that does not fit is skipped
+            result = profile_importer.import_func_profile(dict(params))
+            self.assertEqual(result['func_profile_ref'], '1/2/1')
+            self.assertRegex(result['report_error'], 'for the report stage')
+            save_func_profile.assert_called_once()
+            gen_func_profile_report.assert_not_called()
+
+            # a background report ends its job in the error state instead
+            profile_importer.background_reports = True
+            result = profile_importer.import_func_profile(dict(params, background_report=1))
+            self.assertEqual(list(result), ['func_profile_ref', 'report_job_id'])
+            for _ in range(1000):
+                status = profile_importer.report_worker.get_status(result['report_job_id'])
+                if status['state'] == 'error':
+                    break
+                time.sleep(0.01)
+            self.assertRegex(status['error'], 'for the report stage')
+            gen_func_profile_report.assert_not_called()
+
+    def test_background_report_admission(self):
+        params = {'workspace_id': 1,
+                  'func_profile_obj_name': 'profile',
+                  'base_object_ref': '1/2/3',
+                  'profile_type': 'amplicon',
+                  'profile_category': 'community',
+                  'profile_file_path': __file__,
+                  'build_report': 1,
+                  'background_report': 1}
+        profile_importer = self.profile_importer
+        profile_importer.background_reports = True
+        profile_importer.import_scheduler = ImportScheduler(self.scratch, memory_budget='1G')
+        profile_importer.import_planner = mock.Mock()
+        profile_importer.import_planner.plan.return_value = None
+        func_profile_data = {'data': {'row_ids': ['r1', 'r2'], 'col_ids': ['c1'],
+                                      'values': [[1.0], [2.0]]}}
+        report_started = threading.Event()
+        finish_report = threading.Event()
+
+        def gen_report(func_profile_ref, workspace_id):
+            report_started.set()
+            finish_report.wait(10)
+            return {'report_name': 'report', 'report_ref': '1/3/1'}
+
+        def ledger():
+            with open(profile_importer.import_scheduler.ledger_path) as ledger_file:
+                return list(json.load(ledger_file).values())
+
+        with mock.patch.multiple(profile_importer,
+                                 _fetch_profile_file=mock.Mock(return_value=__file__),
+                                 _gen_func_profile=mock.Mock(return_value=func_profile_data),
+                                 _save_func_profile=mock.Mock(return_value='1/2/1'),
+                                 _gen_func_profile_report=mock.Mock(side_effect=gen_report)):
+            result = profile_importer.import_func_profile(dict(params), user_id='user')
+            self.assertTrue(report_started.wait(10))
+
+            # the running report holds its own share of the host budget
+            tickets = ledger()
+            self.assertEqual([(ticket['state'], ticket['user_id'], ticket['memory'])
+                              for ticket in tickets],
+                             [('running', 'user', MemoryBudget.project('report', 2))])
+
+            finish_report.set()
+            for _ in range(1000):
+                status = profile_importer.report_worker.get_status(result['report_job_id'])
+                if status['state'] == 'done':
+                    break
+                time.sleep(0.01)
+            self.assertEqual(status['report_ref'], '1/3/1')
+            self.assertEqual(ledger(), [])
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from FunctionalProfileUtil.Utils.ProfileStats import ProfileStats, STAT_NAMES
+
+
+class ProfileStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.profile_stats = ProfileStats()
+        self.profile_stats.CHUNK_CELLS = 300
+
+        rng = np.random.RandomState(0)
+        self.values = rng.standard_normal((97, 31)) * 10 + 3
+        self.values[rng.rand(97, 31) < 0.1] = np.nan
+        self.values[4] = np.nan
+        self.values[:, 6] = np.nan
+        self.values[7, 8:] = np.nan  # single value row
+
+    def assertSameStats(self, stats, df):
+        expected = df.describe().T.reindex(columns=STAT_NAMES).values
+        np.testing.assert_allclose(stats, expected, rtol=1e-10, atol=1e-12)
+
+    def test_summarize(self):
+        row_stats, col_stats = self.profile_stats.summarize(self.values)
+
+        self.assertEqual(row_stats.shape, (97, len(STAT_NAMES)))
+        self.assertEqual(col_stats.shape, (31, len(STAT_NAMES)))
+        self.assertSameStats(row_stats, pd.DataFrame(self.values.T))
+        self.assertSameStats(col_stats, pd.DataFrame(self.values))
+
+    def test_sampled_quantiles(self):
+        self.profile_stats.QUANTILE_SAMPLE_SIZE = 8
+        values = np.tile(np.arange(64, dtype=float), (64, 1))
+
+        row_stats, col_stats = self.profile_stats.summarize(values)
+
+        np.testing.assert_allclose(row_stats[:, 5], 28.0)  # median of 0, 8, ..., 56
+        np.testing.assert_allclose(row_stats[:, 1], 31.5)  # mean stays exact
+        np.testing.assert_allclose(col_stats[:, 5], np.arange(64))
+
+    def test_empty_profile(self):
+        for values, n_rows, n_cols in [(np.empty((0, 5)), 0, 5), (np.empty((4, 0)), 4, 0),
+                                       ([], 0, 0)]:
+            row_stats, col_stats = self.profile_stats.summarize(values)
+
+            self.assertEqual(row_stats.shape, (n_rows, len(STAT_NAMES)))
+            self.assertEqual(col_stats.shape, (n_cols, len(STAT_NAMES)))
+            for stats in (row_stats, col_stats):
+                np.testing.assert_array_equal(stats[:, 0], 0)
+                self.assertTrue(np.isnan(stats[:, 1:]).all())
+
+    def test_non_numeric_values(self):
+        values = self.values.astype(object)
+        values[3, 2] = 'n/a'
+        values[5, 5] = None
+        values[8, 1] = '2.5'
+
+        row_stats, col_stats = self.profile_stats.summarize(values)
+
+        expected = self.values.copy()
+        expected[3, 2] = np.nan
+        expected[5, 5] = np.nan
+        expected[8, 1] = 2.5
+        self.assertSameStats(row_stats, pd.DataFrame(expected.T))
+        self.assertSameStats(col_stats, pd.DataFrame(expected))
+
+    def test_write_stats_pages(self):
+        self.profile_stats.PAGE_SIZE = 40
+        output_directory = tempfile.mkdtemp()
+        row_stats, _ = self.profile_stats.summarize(self.values)
+        ids = pd.Index(['row_{}'.format(i) for i in range(97)])
+
+        n_pages = self.profile_stats.write_stats_pages(row_stats, ids, output_directory,
+                                                       'row_stats')
+
+        self.assertEqual(n_pages, 3)
+        with open(os.path.join(output_directory, 'profile_stats', 'row_stats_2.json')) as f:
+            page = json.load(f)
+        self.assertEqual(page['ids'], ids[80:].tolist())
+        self.assertEqual(page['stat_names'], STAT_NAMES)
+        self.assertEqual(page['stats'][0][0], row_stats[80, 0])
+        with open(os.path.join(output_directory, 'profile_stats', 'row_stats_0.json')) as f:
+            self.assertEqual(json.load(f)['stats'][4], [0.0] + [None] * 7)
+        shutil.rmtree(output_directory)
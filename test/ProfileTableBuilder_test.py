@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from FunctionalProfileUtil.Utils.ProfileTableBuilder import ProfileTableBuilder
+
+
+class ProfileTableBuilderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_directory = tempfile.mkdtemp()
+
+        self.builder = ProfileTableBuilder()
+        self.builder.BLOCK_CELLS = 7 * 10
+
+        rng = np.random.RandomState(0)
+        self.values = rng.rand(45, 7)
+        self.values[3, 2] = np.nan
+        self.row_ids = ['row_{}'.format(i) for i in range(45)]
+        self.col_ids = ['col_{}'.format(i) for i in range(7)]
+
+    def tearDown(self):
+        shutil.rmtree(self.output_directory)
+
+    def test_build_table(self):
+        viewer_page = self.builder.build_table(self.values, self.row_ids, self.col_ids,
+                                               self.output_directory)
+        self.assertTrue(os.path.isfile(os.path.join(self.output_directory, viewer_page)))
+
+        data_dir = os.path.join(self.output_directory, 'profile_table')
+        with open(os.path.join(data_dir, 'table_index.json')) as index_file:
+            table_index = json.load(index_file)
+        self.assertEqual((table_index['n_rows'], table_index['n_cols']), (45, 7))
+        self.assertEqual(table_index['block_rows'], 10)
+        self.assertEqual(table_index['n_blocks'], 5)
+        self.assertEqual(table_index['col_ids'], self.col_ids)
+        self.assertEqual((table_index['row_stride'], table_index['col_stride']), (1, 1))
+        self.assertEqual(table_index['sort_rows'], 45)
+
+        blocks = list()
+        row_ids = list()
+        for block in range(table_index['n_blocks']):
+            block_path = os.path.join(data_dir, 'blocks', str(block))
+            blocks.append(np.fromfile(block_path + '.bin', dtype='<f4').reshape(-1, 7))
+            with open(block_path + '_ids.json') as ids_file:
+                row_ids.extend(json.load(ids_file))
+        self.assertEqual(len(blocks[-1]), 5)
+        self.assertEqual(row_ids, self.row_ids)
+        np.testing.assert_array_equal(np.concatenate(blocks), self.values.astype(np.float32))
+        # the blocks are the only copy of the values
+        self.assertEqual(sorted(os.listdir(data_dir)), ['blocks', 'table_index.json'])
+
+    def read_table(self):
+        data_dir = os.path.join(self.output_directory, 'profile_table')
+        with open(os.path.join(data_dir, 'table_index.json')) as index_file:
+            table_index = json.load(index_file)
+
+        blocks = [np.fromfile(os.path.join(data_dir, 'blocks', '{}.bin'.format(block)),
+                              dtype='<f4').reshape(-1, table_index['n_cols'])
+                  for block in range(table_index['n_blocks'])]
+        return table_index, np.concatenate(blocks)
+
+    def test_sampled_table(self):
+        self.builder.MAX_TABLE_CELLS = 7 * 15
+        self.builder.build_table(self.values, self.row_ids, self.col_ids, self.output_directory)
+
+        table_index, values = self.read_table()
+        self.assertEqual((table_index['n_rows'], table_index['n_cols']), (15, 7))
+        self.assertEqual((table_index['profile_rows'], table_index['profile_cols']), (45, 7))
+        self.assertEqual((table_index['row_stride'], table_index['col_stride']), (3, 1))
+        np.testing.assert_array_equal(values, self.values[::3].astype(np.float32))
+
+        shutil.rmtree(self.output_directory)
+        self.builder.MAX_TABLE_COLS = 3
+        self.builder.build_table(self.values, self.row_ids, self.col_ids, self.output_directory)
+
+        table_index, values = self.read_table()
+        self.assertEqual(table_index['col_ids'], ['col_0', 'col_3', 'col_6'])
+        self.assertEqual((table_index['row_stride'], table_index['col_stride']), (2, 3))
+        np.testing.assert_array_equal(values, self.values[::2, ::3].astype(np.float32))
+
+    def test_sort_rows(self):
+        # sorting and filtering gather columns from the leading blocks of MAX_SORT_CELLS values
+        self.builder.MAX_SORT_CELLS = 7 * 25
+        self.builder.build_table(self.values, self.row_ids, self.col_ids, self.output_directory)
+
+        table_index, values = self.read_table()
+        self.assertEqual(table_index['sort_rows'], 20)
+        self.assertEqual(table_index['n_rows'], 45)
+
+        shutil.rmtree(self.output_directory)
+        self.builder.MAX_SORT_CELLS = 1
+        self.builder.build_table(self.values, self.row_ids, self.col_ids, self.output_directory)
+        self.assertEqual(self.read_table()[0]['sort_rows'], 10)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from FunctionalProfileUtil.Utils.ReportPackager import ReportPackager
+
+
+class ReportPackagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.report_directory = os.path.join(self.scratch, 'report')
+        os.makedirs(os.path.join(self.report_directory, 'heatmap_tiles', '0'))
+
+    def tearDown(self):
+        shutil.rmtree(self.scratch)
+
+    def write(self, relative_path, content):
+        with open(os.path.join(self.report_directory, relative_path), 'wb') as f:
+            f.write(content)
+
+    def test_link_asset(self):
+        src = os.path.join(self.scratch, 'viewer.html')
+        with open(src, 'w') as f:
+            f.write('<html></html>')
+        dst = os.path.join(self.report_directory, 'viewer.html')
+
+        ReportPackager.link_asset(src, dst)
+        ReportPackager.link_asset(src, dst)
+
+        self.assertTrue(os.path.samefile(src, dst))
+
+    def test_pack(self):
+        self.write('report.html', b'<html>' + b'report ' * 1000 + b'</html>')
+        self.write(os.path.join('heatmap_tiles', '0', '0_0.bin'), bytes(range(256)) * 16)
+        self.write('values.npy.gz', gzip.compress(b'values ' * 1000))
+
+        zip_path = ReportPackager.pack(self.report_directory,
+                                       os.path.join(self.scratch, 'report.zip'))
+
+        with zipfile.ZipFile(zip_path) as report_zip:
+            infos = {info.filename: info for info in report_zip.infolist()}
+            self.assertEqual(sorted(infos), ['heatmap_tiles/0/0_0.bin', 'report.html',
+                                             'values.npy.gz'])
+            self.assertEqual(infos['report.html'].compress_type, zipfile.ZIP_DEFLATED)
+            self.assertEqual(infos['values.npy.gz'].compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(report_zip.read('heatmap_tiles/0/0_0.bin'),
+                             bytes(range(256)) * 16)
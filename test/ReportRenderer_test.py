@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from FunctionalProfileUtil.Utils.ReportRenderer import (ReportRenderer, ReportTab, ReportTemplate,
+                                                        get_template)
+
+
+class ReportRendererTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_directory)
+
+    def test_render_template(self):
+        template = ReportTemplate('<p>{{ title }}</p>{{body}}<br>{{ title }}')
+        self.assertEqual(template.slots, ['title', 'body', 'title'])
+
+        writer = io.StringIO()
+        template.render(writer, title='Profile', body=['<a>', (str(i) for i in range(3)),
+                                                       lambda w: w.write('</a>')])
+        self.assertEqual(writer.getvalue(), '<p>Profile</p><a>012</a><br>Profile')
+
+        with self.assertRaisesRegex(ValueError, 'Missing template values'):
+            template.render(io.StringIO(), title='Profile')
+
+    def test_get_template_cached(self):
+        self.assertIs(get_template('tab_button.html'), get_template('tab_button.html'))
+
+    def test_render_report(self):
+        tabs = [ReportTab('data_summary', 'Profile Statistics', 'stats_tab.html',
+                          {'n_rows': 3, 'n_cols': 2, 'row_stats_pages': 1,
+                           'col_stats_pages': 1}),
+                ReportTab('ProfileHeatmapViewer', 'Profile Heatmap', 'iframe_tab.html',
+                          {'page': 'heatmap_viewer.html'})]
+
+        report_path = ReportRenderer().render_report(
+                                        os.path.join(self.output_directory, 'report.html'), tabs)
+        with open(report_path) as report_file:
+            report = report_file.read()
+
+        self.assertNotIn('{{', report)
+        self.assertIn('''onclick="openTab(event, 'data_summary')" id="defaultOpen"''', report)
+        self.assertIn('''onclick="openTab(event, 'ProfileHeatmapViewer')">''', report)
+        self.assertIn('<h5>Profile Size: 3 x 2</h5>', report)
+        self.assertIn('<div id="ProfileHeatmapViewer" class="tabcontent">', report)
+        self.assertIn('src="heatmap_viewer.html"', report)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from FunctionalProfileUtil.Utils.ReportWorker import ReportWorker
+
+
+class ReportWorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.status_dir = tempfile.mkdtemp()
+        self.report_worker = ReportWorker(self.status_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.status_dir)
+
+    def wait_for(self, report_job_id):
+        for _ in range(1000):
+            status = self.report_worker.get_status(report_job_id)
+            if status['state'] in ('done', 'error'):
+                return status
+            time.sleep(0.01)
+
+        self.fail('report job {} did not finish'.format(report_job_id))
+
+    def test_report_job(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def build_report(ref):
+            started.set()
+            release.wait(10)
+            return {'report_name': 'report_' + ref, 'report_ref': '1/2/3'}
+
+        report_job_id = self.report_worker.submit(build_report, 'profile')
+        started.wait(10)
+        self.assertEqual(self.report_worker.get_status(report_job_id)['state'], 'running')
+
+        release.set()
+        self.assertEqual(self.wait_for(report_job_id), {'report_job_id': report_job_id,
+                                                        'state': 'done',
+                                                        'report_name': 'report_profile',
+                                                        'report_ref': '1/2/3'})
+
+    def test_failed_report_job(self):
+        def build_report():
+            raise ValueError('no heatmap')
+
+        status = self.wait_for(self.report_worker.submit(build_report))
+
+        self.assertEqual(status['state'], 'error')
+        self.assertEqual(status['error'], 'no heatmap')
+
+    def test_unknown_report_job(self):
+        with self.assertRaisesRegex(ValueError, 'Invalid report job id'):
+            self.report_worker.get_status('../../etc/passwd')
+        with self.assertRaisesRegex(ValueError, 'Unknown report job id'):
+            self.report_worker.get_status('e3d56478-0b33-427a-9d77-4e0133cc1281')
+
+    def test_prune_status(self):
+        report_job_id = self.wait_for(self.report_worker.submit(lambda: {}))['report_job_id']
+        status_path = os.path.join(self.status_dir, report_job_id + '.json')
+        os.utime(status_path, (1, 1))
+
+        report_worker = ReportWorker(self.status_dir)
+        new_report_job_id = self.wait_for(report_worker.submit(lambda: {}))['report_job_id']
+
+        self.assertEqual(os.listdir(self.status_dir), [new_report_job_id + '.json'])
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from FunctionalProfileUtil.Utils.RequestProfiler import RequestProfiler
+
+
+def busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += 1
+    return total
+
+
+def slow_import(params, user_id=None):
+    busy_loop(0.2)
+    return {'params': params, 'user_id': user_id}
+
+
+class RequestProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.profiler = RequestProfiler(self.profile_dir, allowed_users='slow_user, other_user')
+
+    def tearDown(self):
+        shutil.rmtree(self.profile_dir)
+
+    def profile_files(self):
+        profiles = os.listdir(self.profile_dir)
+        self.assertEqual(len(profiles), 1)
+        profile_path = os.path.join(self.profile_dir, profiles[0])
+        files = dict()
+        for file_name in os.listdir(profile_path):
+            with open(os.path.join(profile_path, file_name), 'rb') as profile_file:
+                files[file_name] = profile_file.read().decode('utf8', 'replace')
+        return profiles[0], files
+
+    def test_wanted(self):
+        self.assertTrue(self.profiler.wanted({'user_id': 'slow_user'}))
+        self.assertTrue(self.profiler.wanted({'user_id': 'user',
+                                              'rpc_context': {'profile': 1}}))
+        self.assertFalse(self.profiler.wanted({'user_id': 'user', 'rpc_context': {}}))
+        self.assertFalse(RequestProfiler(self.profile_dir).wanted({'user_id': None}))
+
+        with self.assertRaisesRegex(ValueError, 'Invalid profiler'):
+            RequestProfiler(self.profile_dir, mode='tracing')
+
+    def test_not_profiled(self):
+        with mock.patch('FunctionalProfileUtil.Utils.RequestProfiler.StackSampler') as sampler:
+            result = self.profiler.run({'user_id': 'user'}, 'import_func_profile', slow_import,
+                                       {'a': 1}, user_id='user')
+        self.assertEqual(result, {'params': {'a': 1}, 'user_id': 'user'})
+        sampler.assert_not_called()
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+    def test_sampling_profile(self):
+        self.profiler.SAMPLE_INTERVAL = 0.002
+        result = self.profiler.run({'user_id': 'slow_user'}, 'import_func_profile', slow_import,
+                                   {'a': 1}, user_id='slow_user')
+        self.assertEqual(result['user_id'], 'slow_user')
+
+        profile_name, files = self.profile_files()
+        self.assertTrue(profile_name.startswith('import_func_profile_slow_user_'))
+        self.assertEqual(sorted(files), ['stacks.folded', 'top_functions.txt'])
+
+        stacks = files['stacks.folded'].splitlines()
+        self.assertTrue(stacks)
+        for line in stacks:
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+        self.assertTrue(any('slow_import (test/RequestProfiler_test.py:20);busy_loop' in line
+                            for line in stacks))
+        self.assertIn('busy_loop (test/RequestProfiler_test.py:12)',
+                      files['top_functions.txt'].splitlines()[3])
+
+    def test_deterministic_profile(self):
+        profiler = RequestProfiler(self.profile_dir, mode='deterministic')
+        with self.assertRaisesRegex(KeyError, 'missing'):
+            profiler.run({'rpc_context': {'profile': 1}}, 'import_func_profile',
+                         lambda: {}['missing'])
+
+        profile_name, files = self.profile_files()
+        self.assertTrue(profile_name.startswith('import_func_profile_anonymous_'))
+        self.assertEqual(sorted(files), ['profile.pstats', 'top_functions.txt'])
+        self.assertIn('function calls', files['top_functions.txt'])
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import unittest
+import zlib
+
+from FunctionalProfileUtil.Utils.ResponseEncoder import (RequestTooLarge, ResponseEncoder,
+                                                         iterencode_json, negotiate_encoding,
+                                                         read_request_body)
+
+
+class ChunkedInput(io.BytesIO):
+
+    def __init__(self, data):
+        super(ChunkedInput, self).__init__(data)
+        self.read_sizes = list()
+
+    def read(self, size=-1):
+        self.read_sizes.append(size)
+        return super(ChunkedInput, self).read(size)
+
+
+class ResponseEncoderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = ResponseEncoder()
+        self.encoder.CHUNK_SIZE = 1000
+        self.encoder.BUFFER_SIZE = 10000
+
+    def body(self, n_values):
+        result = {'result': [{'value_{}'.format(i): i} for i in range(n_values)]}
+        return json.JSONEncoder().iterencode(result), json.dumps(result).encode('utf8')
+
+    def test_read_request_body(self):
+        body = b'x' * 2500
+        wsgi_input = ChunkedInput(body)
+        environ = {'CONTENT_LENGTH': '2500', 'wsgi.input': wsgi_input}
+        self.assertEqual(read_request_body(environ, 10000, chunk_size=1000), body)
+        self.assertEqual(wsgi_input.read_sizes, [1000, 1000, 500])
+
+        self.assertEqual(read_request_body({'wsgi.input': ChunkedInput(body)}, 10000), b'')
+
+        wsgi_input = ChunkedInput(body)
+        with self.assertRaisesRegex(RequestTooLarge, 'exceeds the limit of 1000 bytes'):
+            read_request_body({'CONTENT_LENGTH': '2500', 'wsgi.input': wsgi_input}, 1000)
+        self.assertEqual(wsgi_input.read_sizes, [])
+
+    def test_negotiate_encoding(self):
+        self.assertIsNone(negotiate_encoding(None))
+        self.assertIsNone(negotiate_encoding('identity'))
+        self.assertEqual(negotiate_encoding('gzip, deflate'), 'gzip')
+        self.assertEqual(negotiate_encoding('deflate, gzip;q=0.5'), 'deflate')
+        self.assertEqual(negotiate_encoding('*'), 'gzip')
+        self.assertIsNone(negotiate_encoding('gzip;q=0, deflate;q=0'))
+        self.assertEqual(negotiate_encoding('GZIP;q=0.8, br'), 'gzip')
+
+    def test_small_response(self):
+        headers, body = self.encoder.encode(['{"result": []}'], 'gzip')
+        self.assertEqual(body, [b'{"result": []}'])
+        self.assertEqual(dict(headers)['content-length'], '14')
+        self.assertNotIn('content-encoding', dict(headers))
+
+    def test_buffered_response(self):
+        chunks, expected = self.body(100)
+        headers, body = self.encoder.encode(chunks, 'gzip')
+        headers = dict(headers)
+        self.assertEqual(headers['content-encoding'], 'gzip')
+        self.assertEqual(headers['content-length'], str(len(body[0])))
+        self.assertEqual(zlib.decompress(body[0], 16 + zlib.MAX_WBITS), expected)
+
+        headers, body = self.encoder.encode(self.body(100)[0])
+        self.assertEqual(body, [expected])
+
+    def test_streamed_response(self):
+        chunks, expected = self.body(5000)
+        headers, body = self.encoder.encode(chunks, 'deflate')
+        headers = dict(headers)
+        self.assertEqual(headers['content-encoding'], 'deflate')
+        self.assertNotIn('content-length', headers)
+        body = list(body)
+        self.assertGreater(len(body), 1)
+        self.assertEqual(zlib.decompress(b''.join(body)), expected)
+
+        headers, body = self.encoder.encode(self.body(5000)[0])
+        body = list(body)
+        self.assertNotIn('content-length', dict(headers))
+        self.assertTrue(all(len(chunk) < 2 * self.encoder.CHUNK_SIZE for chunk in body))
+        self.assertEqual(b''.join(body), expected)
+
+    def test_iterencode_json(self):
+        result = {'func_profile_ref': '1/2/3', 'values': [[0.5, None], [1, 2]], 'tags': set(),
+                  'empty': {}, 'ids': list(range(5000))}
+        response = {'version': '1.1', 'result': [result], 'id': '12345'}
+
+        class SetEncoder(json.JSONEncoder):
+            def default(self, obj):
+                return sorted(obj)
+
+        chunks = list(iterencode_json(response, cls=SetEncoder))
+        self.assertEqual(''.join(chunks), json.dumps(response, cls=SetEncoder))
+        # every value of the result is one piece encoded by json.dumps
+        self.assertIn(json.dumps(result['ids']), chunks)
+        self.assertIn(json.dumps(result['values']), chunks)
+        for obj in [[], {}, 'text', [{1: 'a'}], (1, 2)]:
+            self.assertEqual(''.join(iterencode_json(obj)), json.dumps(obj))
+
+        # large pieces are streamed in slices of CHUNK_SIZE
+        headers, body = self.encoder.encode(iterencode_json(response, cls=SetEncoder))
+        body = list(body)
+        self.assertNotIn('content-length', dict(headers))
+        self.assertTrue(all(len(chunk) <= self.encoder.CHUNK_SIZE for chunk in body))
+        self.assertEqual(b''.join(body), json.dumps(response, cls=SetEncoder).encode('utf8'))
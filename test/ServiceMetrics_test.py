@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from FunctionalProfileUtil.Utils.ServiceMetrics import (CACHE_REQUESTS, CLIENT_CALL_SECONDS,
+                                                        REQUESTS, REQUESTS_IN_FLIGHT,
+                                                        STAGE_BYTES, MetricsRegistry,
+                                                        record_cache, track_request)
+from FunctionalProfileUtil.Utils.StageTracer import StageTracer
+
+
+class Client:
+
+    def get_objects(self, params):
+        return params
+
+    def save_objects(self, params):
+        raise ValueError('save failed')
+
+
+class ServiceMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_render(self):
+        registry = MetricsRegistry()
+        requests = registry.counter('test_requests_total', 'requests', ['method'])
+        requests.labels('import "profile"\n').inc()
+        requests.labels('status').inc(2)
+        registry.gauge('test_in_flight', 'in flight').inc()
+        latency = registry.histogram('test_seconds', 'latency', buckets=(0.1, 1))
+        for value in [0.05, 0.5, 0.7, 3]:
+            latency.observe(value)
+        self.assertIs(registry.counter('test_requests_total', 'requests', ['method']), requests)
+
+        text = registry.render()
+        for line in ['# TYPE functional_profile_util_test_requests_total counter',
+                     r'functional_profile_util_test_requests_total{method="import \"profile\"\n"} '
+                     '1.0',
+                     'functional_profile_util_test_requests_total{method="status"} 2.0',
+                     'functional_profile_util_test_in_flight 1.0',
+                     '# TYPE functional_profile_util_test_seconds histogram',
+                     'functional_profile_util_test_seconds_bucket{le="0.1"} 1.0',
+                     'functional_profile_util_test_seconds_bucket{le="1.0"} 3.0',
+                     'functional_profile_util_test_seconds_bucket{le="+Inf"} 4.0',
+                     'functional_profile_util_test_seconds_sum 4.25',
+                     'functional_profile_util_test_seconds_count 4.0']:
+            self.assertIn(line, text.split('\n'))
+
+        with self.assertRaisesRegex(ValueError, 'expects labels'):
+            requests.labels()
+
+        metrics_path = os.path.join(self.work_dir, 'metrics.prom')
+        registry.write(metrics_path)
+        with open(metrics_path) as metrics_file:
+            self.assertEqual(metrics_file.read(), text)
+
+    def test_multiprocess(self):
+        metrics_dir = os.path.join(self.work_dir, 'metrics')
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+
+        # three workers of one service, the first one has exited. this process renders
+        for pid, n_requests in [(exited.pid, 4), (os.getppid(), 2), (os.getpid(), 1)]:
+            registry = MetricsRegistry()
+            registry.set_multiprocess_dir(metrics_dir)
+            registry.counter('test_requests_total', 'requests', ['method']).labels(
+                'import').inc(n_requests)
+            registry.gauge('test_in_flight', 'in flight').inc(n_requests)
+            registry.histogram('test_seconds', 'latency', buckets=(1,)).observe(n_requests)
+            with mock.patch('os.getpid', return_value=pid):
+                registry.flush()
+        self.assertEqual(len(os.listdir(metrics_dir)), 3)
+
+        text = registry.render().split('\n')
+        for line in ['functional_profile_util_test_requests_total{method="import"} 7.0',
+                     'functional_profile_util_test_in_flight 3.0',
+                     'functional_profile_util_test_seconds_bucket{le="1.0"} 1.0',
+                     'functional_profile_util_test_seconds_bucket{le="+Inf"} 3.0',
+                     'functional_profile_util_test_seconds_sum 7.0',
+                     'functional_profile_util_test_seconds_count 3.0']:
+            self.assertIn(line, text)
+        self.assertEqual(len([line for line in text if 'test_in_flight' in line]), 3)
+
+        MetricsRegistry().set_multiprocess_dir(metrics_dir, clear=True)
+        self.assertEqual(os.listdir(metrics_dir), [])
+
+    def test_track_request(self):
+        ok = REQUESTS.labels('test.method', 'ok').value
+        error = REQUESTS.labels('test.method', 'error').value
+
+        with track_request('test.method'):
+            self.assertEqual(REQUESTS_IN_FLIGHT.labels('test.method').value, 1)
+        with self.assertRaises(ValueError):
+            with track_request('test.method'):
+                raise ValueError('failed')
+
+        self.assertEqual(REQUESTS_IN_FLIGHT.labels('test.method').value, 0)
+        self.assertEqual(REQUESTS.labels('test.method', 'ok').value, ok + 1)
+        self.assertEqual(REQUESTS.labels('test.method', 'error').value, error + 1)
+
+    def test_traced_metrics(self):
+        parsed = STAGE_BYTES.labels('test_parse').value
+        hits = CACHE_REQUESTS.labels('test_cache', 'hit').value
+        tracer = StageTracer(os.path.join(self.work_dir, 'traces'))
+        client = tracer.trace_client(Client(), 'TestService')
+
+        with tracer.trace('test_import'):
+            with tracer.span('test_parse') as span:
+                span.add_bytes(100)
+            client.get_objects({})
+            with self.assertRaises(ValueError):
+                client.save_objects({})
+        record_cache('test_cache', True)
+
+        self.assertEqual(STAGE_BYTES.labels('test_parse').value, parsed + 100)
+        self.assertEqual(CACHE_REQUESTS.labels('test_cache', 'hit').value, hits + 1)
+        samples = {(name, tuple(labels)): value for name, labels, value
+                   in CLIENT_CALL_SECONDS.samples()}
+        count_name = CLIENT_CALL_SECONDS.name + '_count'
+        self.assertGreaterEqual(samples[(count_name, (('service', 'TestService'),
+                                                      ('method', 'get_objects'),
+                                                      ('status', 'ok')))], 1)
+        self.assertGreaterEqual(samples[(count_name, (('service', 'TestService'),
+                                                      ('method', 'save_objects'),
+                                                      ('status', 'error')))], 1)
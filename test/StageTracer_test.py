@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from FunctionalProfileUtil.Utils.StageTracer import StageTracer, traced
+
+
+class FakeClient:
+
+    def save_objects(self, params):
+        return [params]
+
+    def fail(self):
+        raise RuntimeError('service down')
+
+
+class TracedImporter:
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    @traced('import')
+    def run(self):
+        with self.tracer.span('parse_file') as span:
+            span.add_bytes(100)
+        self.save()
+
+    @traced('save')
+    def save(self):
+        return 'saved'
+
+
+class StageTracerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.trace_dir = tempfile.mkdtemp()
+        self.tracer = StageTracer(self.trace_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.trace_dir)
+
+    def load_traces(self):
+        traces = list()
+        for trace_name in sorted(os.listdir(self.trace_dir)):
+            with open(os.path.join(self.trace_dir, trace_name)) as trace_file:
+                traces.append(json.load(trace_file))
+        return traces
+
+    def test_nested_spans(self):
+        TracedImporter(self.tracer).run()
+
+        traces = self.load_traces()
+        self.assertEqual(len(traces), 1)
+        spans = traces[0]['spans']
+        self.assertEqual([span['name'] for span in spans], ['import', 'parse_file', 'save'])
+        self.assertEqual([span['parent_id'] for span in spans], [None, 0, 0])
+        self.assertEqual(spans[1]['bytes'], 100)
+        for span in spans:
+            self.assertGreaterEqual(span['wall_time'], 0)
+            self.assertGreaterEqual(span['cpu_time'], 0)
+            self.assertGreater(span['peak_rss'], 0)
+            self.assertIsNone(span['error'])
+
+    def test_traced_client(self):
+        client = self.tracer.trace_client(FakeClient(), 'Workspace')
+
+        with self.assertRaisesRegex(RuntimeError, 'service down'):
+            with self.tracer.trace('import'):
+                self.assertEqual(client.save_objects({'id': 1}), [{'id': 1}])
+                client.fail()
+
+        spans = self.load_traces()[0]['spans']
+        self.assertEqual([span['name'] for span in spans],
+                         ['import', 'Workspace.save_objects', 'Workspace.fail'])
+        self.assertEqual(spans[1]['attributes'], {'kind': 'client'})
+        self.assertEqual(spans[2]['error'], 'RuntimeError: service down')
+        self.assertEqual(spans[0]['error'], 'RuntimeError: service down')
+
+    def test_spans_outside_trace(self):
+        with self.tracer.span('parse_file') as span:
+            span.add_bytes(10)
+        self.assertEqual(span.bytes, 10)
+        self.assertEqual(os.listdir(self.trace_dir), [])
+
+    def test_trace_per_thread(self):
+        importer = TracedImporter(self.tracer)
+        with self.tracer.trace('import'):
+            # a background thread starts its own trace
+            thread = threading.Thread(target=importer.save)
+            thread.start()
+            thread.join()
+
+        self.assertEqual(sorted(trace['name'] for trace in self.load_traces()),
+                         ['import', 'save'])
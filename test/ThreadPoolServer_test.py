@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import signal
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Process
+
+import requests
+
+from FunctionalProfileUtil.Utils.ThreadPoolServer import (ThreadPoolServer, _busy_app,
+                                                          serve_until_signal)
+
+
+def slow_app(environ, start_response):
+    body = environ['wsgi.input'].read(int(environ.get('CONTENT_LENGTH') or 0))
+    time.sleep(float(body or 0))
+    start_response('200 OK', [('content-type', 'text/plain')])
+    return [threading.current_thread().name.encode()]
+
+
+class ThreadPoolServerTest(unittest.TestCase):
+
+    def start(self, **kwargs):
+        httpd = ThreadPoolServer(('localhost', 0), slow_app, **kwargs)
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(httpd.server_close)
+        self.addCleanup(httpd.shutdown)
+        return 'http://localhost:{}'.format(httpd.server_address[1])
+
+    def test_concurrent_requests(self):
+        url = self.start(threads=4, max_queue=0)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(4) as executor:
+            responses = list(executor.map(lambda _: requests.post(url, data='0.3'), range(4)))
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertEqual(len({response.text for response in responses}), 4)
+
+    def test_queue_limit(self):
+        url = self.start(threads=1, max_queue=1)
+
+        with ThreadPoolExecutor(3) as executor:
+            running = executor.submit(requests.post, url, data='0.5')
+            time.sleep(0.1)
+            queued = executor.submit(requests.post, url, data='0')
+            time.sleep(0.1)
+            rejected = requests.post(url, data='0')
+
+        self.assertEqual(rejected.status_code, 503)
+        self.assertEqual(rejected.json()['error']['name'], 'Server busy')
+        self.assertEqual(running.result().status_code, 200)
+        self.assertEqual(queued.result().status_code, 200)
+
+        with self.assertRaisesRegex(ValueError, 'Invalid server pool'):
+            ThreadPoolServer(('localhost', 0), slow_app, threads=0)
+
+    def test_busy_response(self):
+        for content_length, max_body_size, read in [('2500', 1000, 0), ('2500', 5000, 2500),
+                                                    ('2500', None, 2500), ('x', 1000, 0)]:
+            wsgi_input = io.BytesIO(b'x' * 2500)
+            statuses = list()
+            body = _busy_app({'CONTENT_LENGTH': content_length, 'wsgi.input': wsgi_input},
+                             lambda status, headers: statuses.append(status),
+                             max_body_size=max_body_size, chunk_size=1000)
+
+            self.assertEqual(wsgi_input.tell(), read)
+            self.assertEqual(statuses, ['503 Service Unavailable'])
+            self.assertIn(b'Server busy', body[0])
+
+    def test_graceful_shutdown(self):
+        httpd = ThreadPoolServer(('localhost', 0), slow_app, threads=2)
+        url = 'http://localhost:{}'.format(httpd.server_address[1])
+        process = Process(target=serve_until_signal, args=(httpd,))
+        process.start()
+        httpd.socket.close()
+
+        with ThreadPoolExecutor(1) as executor:
+            in_flight = executor.submit(requests.post, url, data='0.5')
+            time.sleep(0.2)
+            os.kill(process.pid, signal.SIGTERM)
+            self.assertEqual(in_flight.result().status_code, 200)
+
+        process.join(5)
+        self.assertEqual(process.exitcode, 0)
+        with self.assertRaises(requests.ConnectionError):
+            requests.post(url, data='0')
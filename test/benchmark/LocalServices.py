@@ -0,0 +1,166 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+
+class LocalObjectStore:
+    """
+    LocalObjectStore: in memory workspace objects and an on disk file store shared by the local
+                      service stand-ins
+    """
+
+    def __init__(self, store_dir, workspace_id=1):
+        self.store_dir = store_dir
+        self.workspace_id = workspace_id
+        self.objects = dict()
+        self.files = dict()
+        # the mock callback server saves objects from several request threads
+        self._lock = threading.Lock()
+        os.makedirs(store_dir, exist_ok=True)
+
+    def save_object(self, obj, data):
+        with self._lock:
+            obj_id = len(self.objects) + 1
+            info = [obj_id, obj['name'], obj['type'], time.strftime('%Y-%m-%dT%H:%M:%S+0000'),
+                    1, 'benchmark', self.workspace_id, 'benchmark_workspace', '', 0,
+                    obj.get('meta') or {}]
+            self.objects['{}/{}/1'.format(self.workspace_id, obj_id)] = (data, info)
+        return info
+
+    def add_base_matrix(self, row_ids, col_ids):
+        """
+        add_base_matrix: save a matrix holding the profile ids, returns its ref
+        """
+        info = self.save_object({'name': 'base_matrix', 'type': 'KBaseMatrices.AmpliconMatrix'},
+                                {'data': {'row_ids': row_ids, 'col_ids': col_ids}})
+        return '{}/{}/{}'.format(info[6], info[0], info[4])
+
+    def add_file(self, file_path):
+        shock_id = str(uuid.uuid4())
+        stored_path = os.path.join(self.store_dir, shock_id)
+        if os.path.isdir(file_path):
+            stored_path = shutil.make_archive(stored_path, 'zip', file_path)
+        else:
+            shutil.copyfile(file_path, stored_path)
+        self.files[shock_id] = stored_path
+        return shock_id, stored_path
+
+
+class LocalDataFileUtil:
+
+    def __init__(self, store):
+        self.store = store
+
+    def get_objects(self, params):
+        return {'data': [{'data': self.store.objects[ref][0], 'info': self.store.objects[ref][1]}
+                         for ref in params['object_refs']]}
+
+    def save_objects(self, params):
+        # round trip through JSON like the workspace does
+        return [self.store.save_object(obj, json.loads(json.dumps(obj['data'])))
+                for obj in params['objects']]
+
+    def file_to_shock(self, params):
+        shock_id, stored_path = self.store.add_file(params['file_path'])
+        return {'shock_id': shock_id,
+                'handle': {'hid': 'KBH_' + shock_id, 'id': shock_id},
+                'size': os.path.getsize(stored_path)}
+
+    def shock_to_file(self, params):
+        shock_id = params.get('shock_id') or params['handle_id'][len('KBH_'):]
+        stored_path = self.store.files[shock_id]
+        file_path = params['file_path']
+        if os.path.isdir(file_path):
+            file_path = os.path.join(file_path, os.path.basename(stored_path))
+        shutil.copyfile(stored_path, file_path)
+        return {'file_path': file_path}
+
+    def download_staging_file(self, params):
+        return {'copy_file_path': params['staging_file_subdir_path']}
+
+
+class LocalWsLargeDataIO:
+
+    def __init__(self, store):
+        self.store = store
+
+    def save_objects(self, params):
+        infos = list()
+        for obj in params['objects']:
+            with open(obj['data_json_file']) as data_file:
+                infos.append(self.store.save_object(obj, json.load(data_file)))
+        return infos
+
+
+class LocalWorkspace:
+
+    def __init__(self, store):
+        self.store = store
+
+    def get_object_info3(self, params):
+        infos = list()
+        for obj_spec in params['objects']:
+            matches = [info for data, info in list(self.store.objects.values())
+                       if info[1] == obj_spec.get('name')]
+            infos.append(matches[-1] if matches else None)
+        return {'infos': infos, 'paths': [None] * len(infos)}
+
+
+class LocalKBaseReport:
+
+    def __init__(self, store):
+        self.store = store
+
+    def create_extended_report(self, params):
+        info = self.store.save_object({'name': params['report_object_name'],
+                                       'type': 'KBaseReport.Report'}, params)
+        return {'name': info[1], 'ref': '{}/{}/{}'.format(info[6], info[0], info[4])}
+
+
+class LocalSampleService:
+
+    def __init__(self):
+        self.samples = dict()
+
+    def create_sample(self, params):
+        sample = dict(params['sample'])
+        sample_id = sample.get('id') or str(uuid.uuid4())
+        versions = self.samples.setdefault(sample_id, list())
+        versions.append(dict(sample, id=sample_id, version=len(versions) + 1))
+        return {'id': sample_id, 'version': len(versions)}
+
+    def get_sample(self, params):
+        versions = self.samples.get(params['id'])
+        if not versions:
+            raise ValueError('Sample service error code 50010 No such sample: {}'.format(
+                                                                                params['id']))
+        return versions[(params.get('version') or len(versions)) - 1]
+
+
+class LocalServiceWizard:
+
+    def __init__(self, service_url):
+        self.service_url = service_url
+
+    def get_service_status(self, params):
+        # every dynamic service is served at the same local url
+        return {'module_name': params['module_name'], 'version': params.get('version'),
+                'url': self.service_url, 'status': 'active', 'up': 1}
+
+
+def install_local_services(importer, store):
+    """
+    install_local_services: point the service clients of importer at the local stand-ins
+
+    returns a KBaseReport client factory to patch into the ProfileImporter module
+    """
+    tracer = importer.tracer
+    importer.dfu = tracer.trace_client(LocalDataFileUtil(store), 'DataFileUtil')
+    importer.ws_large_data = tracer.trace_client(LocalWsLargeDataIO(store), 'WsLargeDataIO')
+    importer.ws = tracer.trace_client(LocalWorkspace(store), 'Workspace')
+    importer.blob_store.dfu = importer.dfu
+
+    return lambda *args, **kwargs: LocalKBaseReport(store)
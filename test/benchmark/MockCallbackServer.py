@@ -0,0 +1,237 @@
+"""
+MockCallbackServer: local stand-in for the SDK callback server
+
+serves DataFileUtil, WsLargeDataIO, KBaseReport, GenericsAPI (no methods), Workspace,
+SampleService and ServiceWizard over JSON-RPC 1.1 on one url, including the
+_<method>_submit/_check_job protocol of BaseClient.run_job, backed by the local object and
+file store of LocalServices. request latency, job run time and failures can be injected.
+
+run standalone from the test directory and point SDK_CALLBACK_URL and workspace-url at it:
+
+    PYTHONPATH=../lib python -m benchmark.MockCallbackServer --port 9999 --latency 0.05
+"""
+import argparse
+import json
+import logging
+import random
+import re
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from benchmark.LocalServices import (LocalDataFileUtil, LocalKBaseReport, LocalObjectStore,
+                                     LocalSampleService, LocalServiceWizard, LocalWorkspace,
+                                     LocalWsLargeDataIO)
+
+SUBMIT_METHOD = re.compile(r'^(\w+)\._(\w+)_submit$')
+CHECK_JOB_METHOD = re.compile(r'^(\w+)\._check_job$')
+
+
+class InjectedFailure(Exception):
+    pass
+
+
+class JSONRPCError(Exception):
+
+    def __init__(self, code, message, error=''):
+        super(JSONRPCError, self).__init__(message)
+        self.code = code
+        self.message = message
+        self.error = error
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('content-length', 0)))
+        status, response = self.server.mock.handle_request(body,
+                                                           self.headers.get('AUTHORIZATION'))
+        payload = json.dumps(response).encode()
+
+        self.send_response(status)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logging.debug('mock callback server: ' + format, *args)
+
+
+class MockCallbackServer:
+    """
+    MockCallbackServer: threaded JSON-RPC 1.1 server dispatching to the local service stand-ins
+
+    latency: seconds added to every request
+    job_latency: seconds a submitted job runs before its result is available
+    failure_rate: probability that a call (or submitted job) fails with a server error
+    fail_methods: methods that always fail, e.g. {'DataFileUtil.save_objects'}
+    token: if set, requests must carry it in the AUTHORIZATION header
+    """
+
+    def __init__(self, store, host='127.0.0.1', port=0, latency=0.0, job_latency=0.0,
+                 failure_rate=0.0, fail_methods=(), token=None, seed=0):
+        self.store = store
+        self.latency = latency
+        self.job_latency = job_latency
+        self.failure_rate = failure_rate
+        self.fail_methods = set(fail_methods)
+        self.token = token
+
+        self.calls = Counter()
+        self.jobs = dict()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self._server = _ThreadingHTTPServer((host, port), _RequestHandler)
+        self._server.mock = self
+        self._thread = None
+
+        self.services = {'DataFileUtil': LocalDataFileUtil(store),
+                         'WsLargeDataIO': LocalWsLargeDataIO(store),
+                         'KBaseReport': LocalKBaseReport(store),
+                         'GenericsAPI': object(),
+                         'Workspace': LocalWorkspace(store),
+                         'SampleService': LocalSampleService(),
+                         'ServiceWizard': LocalServiceWizard(self.url)}
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='mock_callback_server', daemon=True)
+        self._thread.start()
+        logging.info('mock callback server listening on {}'.format(self.url))
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _inject_failure(self, method):
+        with self._lock:
+            self.calls[method] += 1
+            fail = method in self.fail_methods or self._random.random() < self.failure_rate
+        if fail:
+            raise InjectedFailure('injected failure of {}'.format(method))
+
+    def _dispatch(self, method, params):
+        module_name, _, method_name = method.partition('.')
+        service = self.services.get(module_name)
+        service_method = getattr(service, method_name, None) if service is not None else None
+        if method_name.startswith('_') or not callable(service_method):
+            raise JSONRPCError(-32601, 'Method not found: {}'.format(method))
+
+        self._inject_failure(method)
+        return [service_method(*params)]
+
+    def _run_job(self, job_id, method, params):
+        time.sleep(self.job_latency)
+        job = {'finished': 1}
+        try:
+            job['result'] = self._dispatch(method, params)
+        except Exception as e:
+            job['error'] = {'name': 'JSONRPCError', 'code': getattr(e, 'code', -32500),
+                            'message': str(e), 'error': traceback.format_exc()}
+        self.jobs[job_id] = job
+
+    def _submit(self, method, params):
+        job_id = str(uuid.uuid4())
+        self.jobs[job_id] = {'finished': 0}
+        threading.Thread(target=self._run_job, args=(job_id, method, params),
+                         daemon=True).start()
+        return [job_id]
+
+    def _check_job(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise JSONRPCError(-32602, 'Unknown job id: {}'.format(job_id))
+        if job.get('error'):
+            # surfaces as a ServerError in BaseClient.run_job
+            error = job['error']
+            raise JSONRPCError(error['code'], error['message'], error['error'])
+        return [job]
+
+    def call(self, method, params):
+        """
+        call: result list of a JSON-RPC method call
+        """
+        submit = SUBMIT_METHOD.match(method)
+        if submit:
+            return self._submit('{}.{}'.format(*submit.groups()), params)
+        if CHECK_JOB_METHOD.match(method):
+            return self._check_job(*params)
+        return self._dispatch(method, params)
+
+    def handle_request(self, body, token=None):
+        """
+        handle_request: (HTTP status, JSON-RPC 1.1 response) of a request body
+        """
+        time.sleep(self.latency)
+
+        request_id = None
+        try:
+            request = json.loads(body)
+            request_id = request.get('id')
+            if self.token and token != self.token:
+                raise JSONRPCError(-32400, 'Authentication failed: invalid token')
+            result = self.call(request['method'], request.get('params') or [])
+        except Exception as e:
+            if isinstance(e, JSONRPCError):
+                code, message, error = e.code, e.message, e.error or traceback.format_exc()
+            else:
+                code, message, error = -32500, str(e), traceback.format_exc()
+            return 500, {'version': '1.1', 'id': request_id,
+                         'error': {'name': 'JSONRPCError', 'code': code, 'message': message,
+                                   'error': error}}
+
+        return 200, {'version': '1.1', 'id': request_id, 'result': result}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='local mock SDK callback server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--store-dir', help='file store directory, a temporary one by default')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--job-latency', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--fail-method', action='append', default=[])
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(created)s %(levelname)s: %(message)s', level=logging.INFO)
+    store = LocalObjectStore(args.store_dir or tempfile.mkdtemp(prefix='mock_callback_store_'))
+    server = MockCallbackServer(store, host=args.host, port=args.port, latency=args.latency,
+                                job_latency=args.job_latency, failure_rate=args.failure_rate,
+                                fail_methods=args.fail_method)
+    with server:
+        print('serving on {} (file store {})'.format(server.url, store.store_dir))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
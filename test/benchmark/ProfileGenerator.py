@@ -0,0 +1,147 @@
+import gzip
+import os
+import zipfile
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+FORMATS = ['tsv', 'csv', 'xlsx', 'tsv.gz']
+DENSITIES = {'dense': 1.0, 'sparse': 0.05}
+SEPARATORS = {'tsv': '\t', 'csv': ',', 'tsv.gz': '\t'}
+
+XLSX_PARTS = {
+    '[Content_Types].xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" '
+        'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>',
+    '_rels/.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" Type="http://schemas.openxmlformats'
+        '.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>',
+    'xl/workbook.xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="data" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>',
+    'xl/_rels/workbook.xml.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" Type="http://schemas.'
+        'openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>',
+}
+
+
+def _column_name(col):
+    name = ''
+    col += 1
+    while col:
+        col, remainder = divmod(col - 1, 26)
+        name = chr(ord('A') + remainder) + name
+    return name
+
+
+class ProfileGenerator:
+    """
+    ProfileGenerator: synthetic functional profiles written in the file formats the importer
+                      accepts
+
+    dense profiles hold a log-normal abundance in every cell, sparse profiles hold zeros in all
+    but a fraction of the cells. files are written in row chunks, so the generated profile size
+    is not bounded by memory.
+    """
+
+    CHUNK_CELLS = 1 << 20
+
+    def __init__(self, output_dir, seed=0):
+        self.output_dir = output_dir
+        self.seed = seed
+
+    @staticmethod
+    def ids(n_rows, n_cols):
+        """
+        ids: (row ids, column ids) of a generated profile
+        """
+        return (['func_{}'.format(i) for i in range(n_rows)],
+                ['sample_{}'.format(j) for j in range(n_cols)])
+
+    def _value_chunks(self, n_rows, n_cols, density):
+        rng = np.random.RandomState(self.seed)
+        chunk_rows = max(1, self.CHUNK_CELLS // n_cols)
+        for start in range(0, n_rows, chunk_rows):
+            shape = (min(chunk_rows, n_rows - start), n_cols)
+            values = np.round(rng.lognormal(mean=2.0, sigma=1.5, size=shape), 4)
+            if density < 1:
+                values[rng.rand(*shape) >= density] = 0
+            yield start, values
+
+    def _write_text(self, file_path, n_rows, n_cols, density, file_format):
+        row_ids, col_ids = self.ids(n_rows, n_cols)
+        sep = SEPARATORS[file_format]
+        opener = gzip.open if file_format.endswith('.gz') else open
+
+        with opener(file_path, 'wt') as profile_file:
+            profile_file.write(sep.join(['ID'] + col_ids) + '\n')
+            for start, values in self._value_chunks(n_rows, n_cols, density):
+                for offset, row in enumerate(values):
+                    profile_file.write(row_ids[start + offset] + sep +
+                                       sep.join(map(repr, row.tolist())) + '\n')
+
+    def _write_xlsx(self, file_path, n_rows, n_cols, density):
+        row_ids, col_ids = self.ids(n_rows, n_cols)
+        col_names = [_column_name(col) for col in range(n_cols + 1)]
+
+        def string_cell(ref, text):
+            return '<c r="{}" t="inlineStr"><is><t>{}</t></is></c>'.format(ref, escape(text))
+
+        with zipfile.ZipFile(file_path, 'w', zipfile.ZIP_DEFLATED) as xlsx:
+            for part_name, part in XLSX_PARTS.items():
+                xlsx.writestr(part_name, part)
+
+            with xlsx.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+                sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                            b'<worksheet xmlns="http://schemas.openxmlformats.org/'
+                            b'spreadsheetml/2006/main"><sheetData>')
+                header = [string_cell('A1', 'ID')] + [
+                    string_cell('{}1'.format(col_names[j + 1]), col_id)
+                    for j, col_id in enumerate(col_ids)]
+                sheet.write('<row r="1">{}</row>'.format(''.join(header)).encode())
+
+                for start, values in self._value_chunks(n_rows, n_cols, density):
+                    for offset, row in enumerate(values):
+                        excel_row = start + offset + 2
+                        cells = [string_cell('A{}'.format(excel_row), row_ids[start + offset])]
+                        cells.extend(
+                            '<c r="{}{}"><v>{!r}</v></c>'.format(col_names[j + 1], excel_row,
+                                                                 value)
+                            for j, value in enumerate(row.tolist()))
+                        sheet.write(
+                            '<row r="{}">{}</row>'.format(excel_row, ''.join(cells)).encode())
+                sheet.write(b'</sheetData></worksheet>')
+
+    def generate(self, n_rows, n_cols, density='dense', file_format='tsv'):
+        """
+        generate: write a profile of n_rows functions x n_cols samples, returns the file path
+        """
+        if file_format not in FORMATS:
+            raise ValueError('Unsupported profile format: {}'.format(file_format))
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        file_path = os.path.join(self.output_dir, 'profile_{}x{}_{}.{}'.format(
+                                                            n_rows, n_cols, density, file_format))
+        if file_format == 'xlsx':
+            self._write_xlsx(file_path, n_rows, n_cols, DENSITIES[density])
+        else:
+            self._write_text(file_path, n_rows, n_cols, DENSITIES[density], file_format)
+
+        return file_path
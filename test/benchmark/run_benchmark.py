@@ -0,0 +1,250 @@
+"""
+run_benchmark: end to end ProfileImporter benchmark on synthetic profiles against local service
+               stand-ins
+
+run from the test directory:
+
+    PYTHONPATH=../lib python -m benchmark.run_benchmark --grid quick
+    PYTHONPATH=../lib python -m benchmark.run_benchmark --grid full --formats tsv,tsv.gz
+    PYTHONPATH=../lib python -m benchmark.run_benchmark --grid quick --save-baselines
+    PYTHONPATH=../lib python -m benchmark.run_benchmark --callback-server --latency 0.02
+
+every case runs in a fresh process so its peak memory is its own. cases slower or larger than
+their baseline by more than the tolerance are reported as regressions (exit status 1).
+with --callback-server the importer talks to the real SDK clients over HTTP served by a
+MockCallbackServer instead of calling the in process stand-ins.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+
+import mock
+
+from benchmark.LocalServices import LocalObjectStore, install_local_services
+from benchmark.MockCallbackServer import MockCallbackServer
+from benchmark.ProfileGenerator import DENSITIES, FORMATS, ProfileGenerator
+
+GRIDS = {'quick': [(200, 20), (2000, 100)],
+         'full': [(200, 20), (2000, 100), (20000, 200), (100000, 100)]}
+MAX_XLSX_CELLS = 1 << 21  # larger excel profiles take minutes to write and parse
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+TIME_TOLERANCE = 1.5
+MEMORY_TOLERANCE = 1.25
+
+
+def case_name(case):
+    return '{}x{}_{}_{}'.format(case['n_rows'], case['n_cols'], case['density'],
+                                case['file_format'])
+
+
+def aggregate_stages(trace_dir):
+    """
+    aggregate_stages: wall time, CPU time, bytes and peak RSS per stage name over all traces
+    """
+    stages = dict()
+    for trace_name in sorted(os.listdir(trace_dir)):
+        with open(os.path.join(trace_dir, trace_name)) as trace_file:
+            spans = json.load(trace_file)['spans']
+        for span in spans:
+            stage = stages.setdefault(span['name'], {'calls': 0, 'wall_time': 0.0,
+                                                     'cpu_time': 0.0, 'bytes': 0,
+                                                     'peak_rss': 0})
+            stage['calls'] += 1
+            stage['wall_time'] += span['wall_time']
+            stage['cpu_time'] += span['cpu_time']
+            stage['bytes'] += span['bytes']
+            stage['peak_rss'] = max(stage['peak_rss'], span['peak_rss'])
+
+    return stages
+
+
+def run_case(case):
+    """
+    run_case: import the profile of case with a report, returns the measurements
+    """
+    from FunctionalProfileUtil.Utils import ProfileImporter as profile_importer
+
+    # the importer only configures logging if nothing else did
+    logging.basicConfig(format='%(created)s %(levelname)s: %(message)s',
+                        level=logging.INFO if case.get('verbose') else logging.WARNING)
+
+    work_dir = tempfile.mkdtemp(dir=case['work_dir'])
+    scratch = os.path.join(work_dir, 'scratch')
+    os.makedirs(scratch)
+
+    store = LocalObjectStore(os.path.join(work_dir, 'store'))
+    row_ids, col_ids = ProfileGenerator.ids(case['n_rows'], case['n_cols'])
+    base_object_ref = store.add_base_matrix(row_ids, col_ids)
+
+    server = None
+    if case.get('callback_server'):
+        server = MockCallbackServer(store, latency=case.get('latency', 0.0)).start()
+    importer = profile_importer.ProfileImporter(
+        {'SDK_CALLBACK_URL': server.url if server else 'http://localhost:1',
+         'scratch': scratch,
+         'KB_AUTH_TOKEN': '',
+         'workspace-url': server.url if server else 'http://localhost:2'})
+    if server:
+        report_patch = contextlib.suppress()
+    else:
+        report_patch = mock.patch.object(profile_importer, 'KBaseReport',
+                                         install_local_services(importer, store))
+
+    params = {'workspace_id': store.workspace_id,
+              'func_profile_obj_name': 'benchmark_profile',
+              'base_object_ref': base_object_ref,
+              'profile_file_path': case['file_path'],
+              'profile_type': 'amplicon',
+              'profile_category': 'community',
+              'build_report': 1}
+
+    error = None
+    start = time.perf_counter()
+    try:
+        with report_patch:
+            importer.import_func_profile(params)
+    except Exception:
+        error = traceback.format_exc(limit=3)
+    latency = time.perf_counter() - start
+    if server:
+        server.stop()
+
+    file_bytes = os.path.getsize(case['file_path'])
+    result = dict(case)
+    result.update({'case': case_name(case),
+                   'file_bytes': file_bytes,
+                   'latency': latency,
+                   'throughput': file_bytes / latency / (1 << 20),
+                   'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                   'stages': aggregate_stages(os.path.join(scratch, 'traces')),
+                   'error': error})
+    shutil.rmtree(work_dir)
+
+    return result
+
+
+def build_cases(grid, densities, formats, work_dir, verbose=False, callback_server=False,
+                latency=0.0):
+    generator = ProfileGenerator(os.path.join(work_dir, 'profiles'))
+    cases = list()
+    for n_rows, n_cols in GRIDS[grid]:
+        for density in densities:
+            for file_format in formats:
+                if file_format == 'xlsx' and n_rows * n_cols > MAX_XLSX_CELLS:
+                    continue
+                cases.append({'n_rows': n_rows, 'n_cols': n_cols, 'density': density,
+                              'file_format': file_format, 'work_dir': work_dir,
+                              'verbose': verbose,
+                              'callback_server': callback_server, 'latency': latency,
+                              'file_path': generator.generate(n_rows, n_cols, density,
+                                                              file_format)})
+    return cases
+
+
+def run_cases(cases):
+    # a fresh spawned interpreter per case keeps peak memory measurements independent
+    context = multiprocessing.get_context('spawn')
+    results = list()
+    with context.Pool(processes=1, maxtasksperchild=1) as pool:
+        for result in pool.imap(run_case, cases):
+            print_result(result)
+            results.append(result)
+    return results
+
+
+def print_result(result):
+    if result['error']:
+        print('{:<32} FAILED\n{}'.format(result['case'], result['error']))
+        return
+
+    print('{:<32} {:>9.1f} MB {:>8.2f} s {:>8.2f} MB/s {:>9.1f} MB peak'.format(
+            result['case'], result['file_bytes'] / (1 << 20), result['latency'],
+            result['throughput'], result['peak_rss'] / (1 << 20)))
+    stages = sorted(result['stages'].items(), key=lambda item: -item[1]['wall_time'])
+    for name, stage in stages[1:6]:
+        print('    {:<40} {:>8.3f} s {:>8.3f} s cpu {:>9.1f} MB peak'.format(
+                    name, stage['wall_time'], stage['cpu_time'], stage['peak_rss'] / (1 << 20)))
+
+
+def check_baselines(results, baselines):
+    """
+    check_baselines: messages of the results slower or larger than their baselines
+    """
+    regressions = list()
+    for result in results:
+        baseline = baselines.get(result['case'])
+        if result['error']:
+            regressions.append('{} failed'.format(result['case']))
+        if not baseline or result['error']:
+            continue
+        if result['latency'] > baseline['latency'] * TIME_TOLERANCE:
+            regressions.append('{} latency {:.2f} s, baseline {:.2f} s'.format(
+                                        result['case'], result['latency'], baseline['latency']))
+        if result['peak_rss'] > baseline['peak_rss'] * MEMORY_TOLERANCE:
+            regressions.append('{} peak memory {:.1f} MB, baseline {:.1f} MB'.format(
+                                        result['case'], result['peak_rss'] / (1 << 20),
+                                        baseline['peak_rss'] / (1 << 20)))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ProfileImporter benchmark')
+    parser.add_argument('--grid', choices=sorted(GRIDS), default='quick')
+    parser.add_argument('--densities', default=','.join(DENSITIES))
+    parser.add_argument('--formats', default=','.join(FORMATS))
+    parser.add_argument('--baselines', default=BASELINE_PATH)
+    parser.add_argument('--save-baselines', action='store_true',
+                        help='store the results as the new baselines')
+    parser.add_argument('--output', help='write all measurements as JSON to this file')
+    parser.add_argument('--verbose', action='store_true', help='show the importer log')
+    parser.add_argument('--callback-server', action='store_true',
+                        help='call the services over HTTP through a local mock callback server')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds the mock callback server adds to every request')
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix='profile_benchmark_')
+    try:
+        cases = build_cases(args.grid, args.densities.split(','), args.formats.split(','),
+                            work_dir, verbose=args.verbose,
+                            callback_server=args.callback_server, latency=args.latency)
+        results = run_cases(cases)
+    finally:
+        shutil.rmtree(work_dir)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=1)
+
+    baselines = dict()
+    if os.path.isfile(args.baselines):
+        with open(args.baselines) as baseline_file:
+            baselines = json.load(baseline_file)
+
+    if args.save_baselines:
+        baselines.update({result['case']: {'latency': round(result['latency'], 3),
+                                           'peak_rss': result['peak_rss']}
+                          for result in results if not result['error']})
+        with open(args.baselines, 'w') as baseline_file:
+            json.dump(baselines, baseline_file, indent=1, sort_keys=True)
+        print('saved baselines to {}'.format(args.baselines))
+        return 0
+
+    regressions = check_baselines(results, baselines)
+    for regression in regressions:
+        print('REGRESSION: {}'.format(regression))
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())